@@ -6,10 +6,12 @@ Extracts models for a prognosis app.
 @copyright: The Broad Institute of MIT and Harvard 2015
 """
 
-import os, argparse
+import sys, os, argparse
 import pandas as pd
 import numpy as np
 import shutil
+sys.path.append(os.path.abspath('./utils'))
+from splits import load_stacked
 
 parser = argparse.ArgumentParser()
 parser.add_argument("-d", "--dir", nargs=1, default=["test"],
@@ -59,7 +61,7 @@ for fn in ranking_files:
                          rfile.write(str(f1_mean) + " " + str(f1_std) + "\n")
 
                      shutil.copy(par_file, os.path.join(dir, predictor + "-params"))
-                     df = pd.read_csv(train_file, delimiter=",", na_values="?")
+                     df = load_stacked(train_file)
                      M = df.shape[0]
                      N = df.shape[1]
                      names = list(df.columns)
@@ -24,6 +24,8 @@ parser.add_argument("-j", "--clean_jobs", action="store_true",
                     help="clean jobs folder")
 parser.add_argument("-o", "--clean_out", action="store_true",
                         help="clean out folder")
+parser.add_argument("-k", "--clean_cache", action="store_true",
+                    help="clean cache folder")
 parser.add_argument("-a", "--clean_all", action="store_true",
                     help="clean all folders")
 args = parser.parse_args()
@@ -38,6 +40,9 @@ if args.clean_jobs or args.clean_all:
 if args.clean_out or args.clean_all:
     print "Cleaning out folder..."
     delete(glob.glob(os.path.join(base, "out") + "/*"))
+if args.clean_cache or args.clean_all:
+    print "Cleaning cache folder..."
+    delete(glob.glob(os.path.join(base, "cache") + "/*"))
 
 print "Cleaning temp folder..."
 delete(glob.glob(os.path.join(base, "temp") + "/*"))
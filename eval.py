@@ -4,6 +4,8 @@ from matplotlib import pyplot as plt
 from importlib import import_module
 from scipy.interpolate import interp1d
 from sklearn.metrics import roc_curve, roc_auc_score
+sys.path.append(os.path.abspath('./utils'))
+from splits import testing_files, frame_exists
 
 label_file = "./data/outcome.txt"
 target_names = []
@@ -14,7 +16,7 @@ with open(label_file, "rb") as vfile:
         target_names.append(line.split(',')[1])
 
 def avg_cal_dis(dir, module):
-    test_files = glob.glob(dir + "/testing-data-*.csv")
+    test_files = testing_files(dir)
     print "Calculating Calibration/Discrimination for " + module.title() + "..."
 #     count = 0
     total_cal = []
@@ -25,7 +27,7 @@ def avg_cal_dis(dir, module):
         id = testfile[start_idx:stop_idx]
         pfile = dir + "/" + module.prefix() + "-params-" + str(id)
         trainfile = dir + "/training-data-completed-" + str(id) + ".csv"
-        if os.path.exists(testfile) and os.path.exists(pfile) and os.path.exists(trainfile):
+        if frame_exists(testfile) and os.path.exists(pfile) and frame_exists(trainfile):
 #             count = count + 1
             print "Calibration/Discrimination for test set " + id + " ----------------------------------"
             cal, dis = module.eval(testfile, trainfile, pfile, 1)
@@ -47,7 +49,7 @@ def avg_cal_dis(dir, module):
     print "Discrimination: " + str(std_dis)
 
 def cal_plots(dir, module):
-    test_files = glob.glob(dir + "/testing-data-*.csv")
+    test_files = testing_files(dir)
     print "Calculating calibration plots for " + module.title() + "..."
     for testfile in test_files:
         start_idx = testfile.find(dir + "/testing-data-") + len(dir + "/testing-data-")
@@ -55,7 +57,7 @@ def cal_plots(dir, module):
         id = testfile[start_idx:stop_idx]
         pfile = dir + "/" + module.prefix() + "-params-" + str(id)
         trainfile = dir + "/training-data-completed-" + str(id) + ".csv"
-        if os.path.exists(testfile) and os.path.exists(pfile) and os.path.exists(trainfile):
+        if frame_exists(testfile) and os.path.exists(pfile) and frame_exists(trainfile):
             print "Calibration for test set " + id + " ----------------------------------"
             out_file = "./out/calstats-" + id + ".txt"
             plot_file = "./out/calplot-" + id + ".pdf"
@@ -64,7 +66,7 @@ def cal_plots(dir, module):
     print "Saved calibration plot and Hosmer-Lemeshow goodness of fit for " + module.title() + " in out folder."
 
 def avg_report(dir, module):
-    test_files = glob.glob(dir + "/testing-data-*.csv")
+    test_files = testing_files(dir)
     print "Calculating average report for " + module.title() + "..."
     count = 0
     total_prec = []
@@ -76,7 +78,7 @@ def avg_report(dir, module):
         id = testfile[start_idx:stop_idx]
         pfile = dir + "/" + module.prefix() + "-params-" + str(id)
         trainfile = dir + "/training-data-completed-" + str(id) + ".csv"
-        if os.path.exists(testfile) and os.path.exists(pfile) and os.path.exists(trainfile):
+        if frame_exists(testfile) and os.path.exists(pfile) and frame_exists(trainfile):
             count = count + 1
             print "Report for test set " + id + " ----------------------------------"
             p, r, f, _ = module.eval(testfile, trainfile, pfile, 3)
@@ -116,7 +118,7 @@ def avg_report(dir, module):
     print "Total,"+str(tot_prec_mean)+","+str(tot_rec_mean)+","+str(tot_f1_mean)+","+str(tot_prec_std)+","+str(tot_rec_std)+","+str(tot_f1_std)
 
 def roc_plots(dir, module):
-    test_files = glob.glob(dir + "/testing-data-*.csv")
+    test_files = testing_files(dir)
     print "Calculating ROC curves for " + module.title() + "..."
     count = 0
     all_prob = []
@@ -132,7 +134,7 @@ def roc_plots(dir, module):
         id = testfile[start_idx:stop_idx]
         pfile = dir + "/" + module.prefix() + "-params-" + str(id)
         trainfile = dir + "/training-data-completed-" + str(id) + ".csv"
-        if os.path.exists(testfile) and os.path.exists(pfile) and os.path.exists(trainfile):
+        if frame_exists(testfile) and os.path.exists(pfile) and frame_exists(trainfile):
             print "Report for test set " + id + " ----------------------------------"
             fpr, tpr, auc = module.eval(testfile, trainfile, pfile, 4, pltshow=False)       
             p, y = module.pred(testfile, trainfile, pfile)
@@ -182,7 +184,7 @@ def roc_plots(dir, module):
     print "Saved aggregated ROC data to ./out/roc.csv"
 
 def avg_conf_mat(dir, module):
-    test_files = glob.glob(dir + "/testing-data-*.csv")
+    test_files = testing_files(dir)
     print "Calculating average report for " + module.title() + "..."
     count = 0
     total_n_hit = 0
@@ -195,7 +197,7 @@ def avg_conf_mat(dir, module):
         id = testfile[start_idx:stop_idx]
         pfile = dir + "/" + module.prefix() + "-params-" + str(id)
         trainfile = dir + "/training-data-completed-" + str(id) + ".csv"
-        if os.path.exists(testfile) and os.path.exists(pfile) and os.path.exists(trainfile):
+        if frame_exists(testfile) and os.path.exists(pfile) and frame_exists(trainfile):
             count = count + 1
             print "Confusion matrix for test set " + id + " ------------------------------"
             n_hit, n_false_alarm, n_miss, n_correct_rej = module.eval(testfile, trainfile, pfile, 5)
@@ -215,7 +217,7 @@ def avg_conf_mat(dir, module):
     print "{:25s} {:2.2f}{:17s}{:2.2f}".format("Predicted " + target_names[0], avg_n_miss,"", avg_n_correct_rej) 
 
 def list_misses(dir, module):
-    test_files = glob.glob(dir + "/testing-data-*.csv")
+    test_files = testing_files(dir)
     print "Miss-classifications for predictor " + module.title() + "..."
     count = 0
     for testfile in test_files:
@@ -224,7 +226,7 @@ def list_misses(dir, module):
         id = testfile[start_idx:stop_idx]
         pfile = dir + "/" + module.prefix() + "-params-" + str(id)
         trainfile = dir + "/training-data-completed-" + str(id) + ".csv"
-        if os.path.exists(testfile) and os.path.exists(pfile) and os.path.exists(trainfile):
+        if frame_exists(testfile) and os.path.exists(pfile) and frame_exists(trainfile):
             idx = module.miss(testfile, trainfile, pfile)
             count += len(idx)
     print "********************************************"
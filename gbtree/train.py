@@ -0,0 +1,218 @@
+"""
+Trains gradient boosted trees with binary output. Each tree is fit to the gradient and
+hessian of the logistic loss (Newton boosting), and the missing values are not imputed: every
+split learns the side where the rows with a missing value in its variable go, choosing the
+one with the largest gain. This predictor can be trained on the training sets with missing
+values, created with the imputation method none.
+
+Chen, T., Guestrin, C. (2016). XGBoost: A Scalable Tree Boosting System. Proceedings of the
+22nd ACM SIGKDD International Conference on Knowledge Discovery and Data Mining, 785-794
+
+@copyright: The Broad Institute of MIT and Harvard 2015
+"""
+
+import sys, os, argparse
+import numpy as np
+import pickle
+from utils import sigmoid, tree_values
+sys.path.append(os.path.abspath('./utils'))
+from evaluate import design_matrix
+from splits import load_weights, save_ensemble
+
+def prefix():
+    return "gbtree"
+
+def title():
+    return "Gradient Boosted Trees"
+
+def handles_missing():
+    return True
+
+"""Returns the best split of the rows of a node by the values x of one variable, as a tuple
+with the gain, the threshold and True if the missing values go to the left child, or None if
+the variable cannot split the rows
+
+: param x: values of the variable in the rows of the node, with NaN in the missing values
+: param g: gradient of the loss at each row
+: param h: hessian of the loss at each row
+: param reg_lambda: L2 regularization of the leaf values
+: param min_child_weight: minimum sum of the hessian in each child
+"""
+def best_split(x, g, h, reg_lambda, min_child_weight):
+    mis = np.isnan(x)
+    obs = ~mis
+    order = np.argsort(x[obs])
+    xs = x[obs][order]
+    # Candidate thresholds between consecutive distinct values
+    cand = np.nonzero(xs[:-1] < xs[1:])[0]
+    if not len(cand): return None
+
+    G = g.sum()
+    H = h.sum()
+    GL = np.cumsum(g[obs][order])[cand]
+    HL = np.cumsum(h[obs][order])[cand]
+    parent = G * G / (H + reg_lambda)
+    best = None
+    for missing_left in ([True, False] if mis.any() else [True]):
+        gl = GL + g[mis].sum() if missing_left else GL
+        hl = HL + h[mis].sum() if missing_left else HL
+        gain = gl * gl / (hl + reg_lambda) + (G - gl) ** 2 / (H - hl + reg_lambda) - parent
+        gain[np.logical_or(hl < min_child_weight, H - hl < min_child_weight)] = -np.inf
+        k = np.argmax(gain)
+        if best is None or best[0] < gain[k]:
+            # Without missing values in the node, they follow the child with more weight
+            side = missing_left if mis.any() else H - hl[k] <= hl[k]
+            best = (gain[k], (xs[cand[k]] + xs[cand[k] + 1]) / 2, side)
+    return best if np.isfinite(best[0]) else None
+
+"""Adds a leaf to the tree, returning its index
+
+: param tree: dictionary with the lists of the tree
+: param value: value added to the log-odds of the rows in the leaf
+"""
+def add_leaf(tree, value):
+    tree["variable"].append(-1)
+    tree["threshold"].append(0.0)
+    tree["missing_left"].append(True)
+    tree["left"].append(0)
+    tree["right"].append(0)
+    tree["value"].append(value)
+    return len(tree["value"]) - 1
+
+"""Fits a regression tree to the gradient and hessian of the loss, splitting the nodes while
+the gain is larger than min_gain, up to the given depth
+
+: param X: design matrix, with NaN in the missing values
+: param g: gradient of the loss at each row
+: param h: hessian of the loss at each row
+: param max_depth: maximum depth of the tree
+: param learning_rate: factor applied to the values of the leaves
+: param reg_lambda: L2 regularization of the leaf values
+: param min_child_weight: minimum sum of the hessian in each child
+: param min_gain: minimum gain of a split
+"""
+def build_tree(X, g, h, max_depth, learning_rate, reg_lambda, min_child_weight, min_gain):
+    tree = {"variable":[], "threshold":[], "missing_left":[], "left":[], "right":[], "value":[]}
+    all_rows = np.arange(len(X))
+    stack = [(add_leaf(tree, -learning_rate * g.sum() / (h.sum() + reg_lambda)), all_rows, 0)]
+    while stack:
+        node, rows, depth = stack.pop()
+        if depth == max_depth: continue
+        best = None
+        for j in range(0, X.shape[1]):
+            split = best_split(X[rows, j], g[rows], h[rows], reg_lambda, min_child_weight)
+            if split is not None and min_gain < split[0] and (best is None or best[1] < split[0]):
+                best = (j, split[0], split[1], split[2])
+        if best is None: continue
+
+        j, gain, threshold, missing_left = best
+        x = X[rows, j]
+        go_left = np.isnan(x) if missing_left else np.zeros(len(x), dtype=bool)
+        go_left[~np.isnan(x)] = x[~np.isnan(x)] < threshold
+        tree["variable"][node] = j
+        tree["threshold"][node] = threshold
+        tree["missing_left"][node] = missing_left
+        for child, sel in [("left", go_left), ("right", ~go_left)]:
+            crows = rows[sel]
+            tree[child][node] = add_leaf(tree, -learning_rate * g[crows].sum() / (h[crows].sum() + reg_lambda))
+            stack.append((tree[child][node], crows, depth + 1))
+
+    for key in tree: tree[key] = np.array(tree[key])
+    tree["depth"] = max_depth
+    return tree
+
+"""
+Trains the gradient boosted trees given the specified parameters
+
+: param train_filename: name of file containing training set, the missing values can be kept
+: param param_filename: name of file to store resulting parameters
+: param kwparams: custom arguments for the trees: num_trees, learning_rate, max_depth,
+                  min_child_weight, reg_lambda (L2 regularization of the leaf values),
+                  min_gain (minimum gain of a split), subsample (fraction of the rows used to
+                  fit each tree), seed
+"""
+def train(train_filename, param_filename, **kwparams):
+    num_trees = int(kwparams["num_trees"]) if "num_trees" in kwparams else 100
+    learning_rate = float(kwparams["learning_rate"]) if "learning_rate" in kwparams else 0.1
+    max_depth = int(kwparams["max_depth"]) if "max_depth" in kwparams else 3
+    min_child_weight = float(kwparams["min_child_weight"]) if "min_child_weight" in kwparams else 1.0
+    reg_lambda = float(kwparams["reg_lambda"]) if "reg_lambda" in kwparams else 1.0
+    min_gain = float(kwparams["min_gain"]) if "min_gain" in kwparams else 0.0
+    subsample = float(kwparams["subsample"]) if "subsample" in kwparams else 1.0
+    rng = np.random.RandomState(int(kwparams["seed"])) if "seed" in kwparams else np.random
+
+    # Separating target from inputs
+    if "norm_file" in kwparams:
+        # Variables normalized with their ranges in another training file
+        X, y = design_matrix(train_filename, kwparams["norm_file"])
+    else:
+        X, y = design_matrix(train_filename=train_filename)
+    y = y.astype(np.float64)
+    # Rows of imputed training sets can stand for several identical rows
+    w = load_weights(train_filename)
+
+    print "Training Gradient Boosted Trees..."
+    mean = np.clip(np.dot(w, y) / w.sum(), 1e-6, 1 - 1e-6)
+    model = {"base":np.log(mean / (1 - mean)), "trees":[]}
+    f = np.repeat(model["base"], len(X))
+    for t in range(0, num_trees):
+        p = sigmoid(f)
+        g = w * (p - y)
+        h = w * p * (1 - p)
+        if subsample < 1:
+            # Rows left out of this tree don't contribute to its splits or leaf values
+            out = subsample <= rng.random_sample(len(X))
+            g = np.where(out, 0, g)
+            h = np.where(out, 0, h)
+        tree = build_tree(X, g, h, max_depth, learning_rate, reg_lambda, min_child_weight, min_gain)
+        model["trees"].append(tree)
+        f += tree_values(tree, X)
+
+    p = np.clip(sigmoid(f), 1e-12, 1 - 1e-12)
+    loss = -np.dot(w, y * np.log(p) + (1 - y) * np.log(1 - p)) / w.sum()
+    print "Training loss after", num_trees, "trees:", loss
+
+    # Pickle and save
+    f = open(param_filename, 'wb')
+    pickle.dump(model, f)
+
+    print "Done."
+
+"""
+Pools the models trained on each imputed dataset into an ensemble that averages their
+predicted probabilities, saved as a list of models
+
+: param train_files: training files of the imputed datasets
+: param param_files: parameter files of the models trained on them
+: param param_filename: name of file to store the pooled models
+: param kwparams: custom arguments used to train the models
+"""
+def pool(train_files, param_files, param_filename, **kwparams):
+    print "Pooled", save_ensemble(param_files, param_filename), "models"
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-t", "--train", nargs=1, default=["./models/test/training-data-completed.csv"],
+                        help="File containing training set")
+    parser.add_argument("-p", "--param", nargs=1, default=["./models/test/gbtree-params"],
+                        help="Output file to save the parameters of the trees")
+    parser.add_argument("-n", "--num_trees", nargs=1, type=int, default=[100],
+                        help="Number of trees")
+    parser.add_argument("-r", "--learning_rate", nargs=1, type=float, default=[0.1],
+                        help="Factor applied to the values of the leaves of each tree")
+    parser.add_argument("-d", "--max_depth", nargs=1, type=int, default=[3],
+                        help="Maximum depth of the trees")
+    parser.add_argument("-w", "--min_child_weight", nargs=1, type=float, default=[1.0],
+                        help="Minimum sum of the hessian of the loss in each child of a split")
+    parser.add_argument("-l", "--reg_lambda", nargs=1, type=float, default=[1.0],
+                        help="L2 regularization of the values of the leaves")
+    parser.add_argument("-s", "--subsample", nargs=1, type=float, default=[1.0],
+                        help="Fraction of the rows used to fit each tree")
+    args = parser.parse_args()
+    train(args.train[0], args.param[0],
+          num_trees=str(args.num_trees[0]),
+          learning_rate=str(args.learning_rate[0]),
+          max_depth=str(args.max_depth[0]),
+          min_child_weight=str(args.min_child_weight[0]),
+          reg_lambda=str(args.reg_lambda[0]),
+          subsample=str(args.subsample[0]))
@@ -0,0 +1,58 @@
+"""
+Utility functions for the gradient boosted trees. Each tree is stored as arrays indexed by
+node: the variable and threshold of the split (variable -1 for leaves), the children, the
+side taken by the missing values, and the value added to the log-odds at the leaves.
+
+@copyright: The Broad Institute of MIT and Harvard 2015
+"""
+
+import numpy as np
+import pickle
+
+def sigmoid(v):
+    return 1 / (1 + np.exp(-v))
+
+"""Returns the contribution of a tree to the log-odds of each row of X. A row with a missing
+value in the variable of a split goes to the side learned for the missing values of that split
+
+:param tree: dictionary with the arrays of the tree
+:param X: design matrix, with NaN in the missing values
+"""
+def tree_values(tree, X):
+    node = np.zeros(len(X), dtype=int)
+    rows = np.arange(len(X))
+    for depth in range(0, tree["depth"]):
+        var = tree["variable"][node]
+        internal = 0 <= var
+        if not internal.any(): break
+        x = X[rows, np.maximum(var, 0)]
+        missing = np.isnan(x)
+        left = np.where(missing, tree["missing_left"][node], np.where(missing, 0, x) < tree["threshold"][node])
+        node = np.where(internal, np.where(left, tree["left"][node], tree["right"][node]), node)
+    return tree["value"][node]
+
+"""Returns the log-odds of each row of X given by the model
+
+:param model: dictionary with the base score and the list of trees
+:param X: design matrix, with NaN in the missing values
+"""
+def log_odds(model, X):
+    f = np.repeat(model["base"], len(X))
+    for tree in model["trees"]:
+        f += tree_values(tree, X)
+    return f
+
+"""Return a function that gives a prediction from a design matrix row
+"""
+def gen_predictor(params_filename="./models/test/gbtree-params"):
+    model = pickle.load(open(params_filename, "rb"))
+
+    def predictor(X):
+        # Pooled models are saved as a list, and their probabilities averaged
+        if isinstance(model, list):
+            probs = np.mean([sigmoid(log_odds(m, X)) for m in model], axis=0)
+        else:
+            probs = sigmoid(log_odds(model, X))
+        return probs.tolist()
+
+    return predictor
@@ -4,10 +4,115 @@ Create training and test sets with optional imputation.
 @copyright: The Broad Institute of MIT and Harvard 2015
 """
 
-import os, sys, argparse, glob
-from utils.makesets import makesets
+import os, sys, argparse, glob, time, signal, traceback
+import numpy as np
+from multiprocessing import Process
+from utils.makesets import makesets_batch, makesets_stream, makesets_folds, master_seed
+from utils.splits import export_sets, frame_exists, load_status, save_status
+from utils.impcache import cached_process
+from utils.sweep import project_sets
+from utils.supervisor import limit_resources, exit_status, describe
 from importlib import import_module
 
+"""Imputes the training set with the given id, saving the result as training-data-completed-ID.csv,
+or training-data-completed-ID.npz in binary format
+
+:param model_dir: directory of the model
+:param id: id of the training set
+:param module: module implementing the imputation method
+:param method: name of the imputation method
+:param store: storage of the training/test sets, csv or index
+:param cache_size: maximum size in MB of the cache of imputed sets, 0 to disable the cache
+:param frame_format: format of the imputed training set, csv or npz (binary)
+:param kwparams: custom arguments for the imputation method
+"""
+def impute_set(model_dir, id, module, method, store, cache_size, frame_format="csv", **kwparams):
+    print "Imputing training set #" + str(id) + "..."
+    train_filename = model_dir + "/training-data-"+str(id)+".csv"
+    completed_filename = model_dir + "/training-data-completed-"+str(id)+"." + frame_format
+    if store == "index":
+        # The imputation methods read the training set from a CSV file, which is only
+        # kept while imputing
+        export_sets(model_dir, [id], ["training"])
+    try:
+        if 0 < cache_size:
+            cached_process(module, method, train_filename, completed_filename, cache_size * 1024 * 1024, **kwparams)
+        else:
+            module.process(in_filename=train_filename, out_filename=completed_filename, **kwparams)
+    finally:
+        if store == "index":
+            os.remove(train_filename)
+            os.remove(train_filename.replace("-data", "-index"))
+    print "Done."
+
+"""Runs a task in a child process, exiting with a non-zero status if it raises an exception.
+Core dumps are disabled, and the memory of the process is limited to the given number of MB
+(0 for no limit)
+"""
+def run_task(target, args, kwargs, memory=0):
+    limit_resources(memory)
+    try:
+        target(*args, **kwargs)
+    except Exception:
+        traceback.print_exc()
+        sys.stdout.flush()
+        sys.exit(1)
+    sys.stdout.flush()
+
+"""Records in the status file of the model whether the imputation of a training set succeeded,
+that is, it didn't fail and the imputed training set exists. Returns True if it succeeded
+
+:param model_dir: directory of the model
+:param id: id of the training set
+:param method: name of the imputation method
+:param success: False if the imputation failed
+"""
+def record_status(model_dir, id, method, success):
+    success = success and frame_exists(model_dir + "/training-data-completed-" + str(id) + ".csv")
+    save_status(model_dir, {id:(method, "done" if success else "failed")})
+    return success
+
+"""Runs the tasks in separate processes, at most num_jobs at a time. A task that fails, or
+whose process crashes or runs out of time, doesn't stop the others. Returns the ids of the
+failed tasks
+
+:param tasks: list of tuples (id, target, args, kwargs)
+:param num_jobs: maximum number of concurrent processes
+:param on_done: function called with the id of each task when it finishes, and False if it
+                failed, returns False if the task has to be counted as failed anyway
+:param timeout: maximum running time of each task in seconds, 0 for no limit
+:param memory: maximum memory of each task in MB, 0 for no limit
+"""
+def run_parallel(tasks, num_jobs, on_done=None, timeout=0, memory=0):
+    pending = list(tasks)
+    running = {}
+    failed = []
+    while pending or running:
+        while pending and len(running) < num_jobs:
+            id, target, args, kwargs = pending.pop(0)
+            process = Process(target=run_task, args=(target, args, kwargs, memory))
+            process.start()
+            running[id] = (process, time.time())
+        time.sleep(0.1)
+        for id in running.keys():
+            process, start = running[id]
+            timed_out = 0 < timeout and timeout < time.time() - start
+            if process.is_alive() and not timed_out: continue
+            if process.is_alive():
+                process.terminate()
+                process.join(5)
+                if process.is_alive(): os.kill(process.pid, signal.SIGKILL)
+            process.join()
+            status = exit_status(process.exitcode, time.time() - start, timed_out)
+            success = status["status"] == "ok"
+            if not success:
+                print "Task #" + str(id), describe(status)
+            if on_done is not None: success = on_done(id, success)
+            if not success: failed.append(id)
+            del running[id]
+    failed.sort()
+    return failed
+
 """Creates training/test sets using the provided parameters
 
 :param model_name: model of the name
@@ -16,38 +121,117 @@ from importlib import import_module
 :param num_imputed: number of intermediate imputed sets if imputation is selected
 :param id_start: id of first group of sets
 :param impute_method: name of script in utils folder containing the imputation algorithm
+:param split_seed: master seed used to draw the test sets, if None the seed recorded in the model
+                   directory (split-seed.txt) is reused, or a random one is drawn
+:param store: csv to save the training/test sets as CSV files, index to save only the indices
+              of their rows
+:param chunk_size: if greater than 0, each training/test set is created reading the source
+                   data in chunks of this number of records (only with csv storage)
+:param folds: if greater than 0, the sets are the folds of a repeated k-fold partition of the
+              complete rows, shared by all the models with the same outcome
+:param repeats: number of repetitions of the k-fold partition
+:param num_jobs: number of training sets imputed concurrently, each one in its own process
+:param cache_size: maximum size in MB of the cache of imputed sets, 0 to disable the cache
+:param master: name of the master model, if given the sets are derived from the imputed sets
+               of the master model instead of being created and imputed
+:param frame_format: format of the imputed training sets, csv or npz (binary)
+:param ids: list of ids of the sets to create, instead of iter_count sets starting at id_start.
+            Only these sets are replaced, the other ones are kept
+:param timeout: maximum time in seconds to impute each set, 0 for no limit
+:param memory: maximum memory in MB used to impute each set, 0 for no limit
 :param kwparams: custom arguments that the imputation method can receive
 """
-def create_sets(base_dir, model_name, iter_count, id_start, test_percentage, impute_method, **kwparams):
+def create_sets(base_dir, model_name, iter_count, id_start, test_percentage, impute_method, split_seed=None, store="csv", chunk_size=0, folds=0, repeats=1, num_jobs=1, cache_size=0, master="", frame_format="csv", ids=None, timeout=0, memory=0, **kwparams):
     model_dir =  os.path.join(base_dir, "models", model_name)
     if not os.path.exists(model_dir):
         os.makedirs(model_dir)
 
-    if id_start == 0:
+    all_sets = ids is None
+    if all_sets:
+        ids = range(id_start, id_start + iter_count)
+    else:
+        iter_count = len(ids)
+
+    if id_start == 0 and all_sets:
         # remove old data
         test_files = glob.glob(model_dir + "/testing-data*.csv")
         train_files = glob.glob(model_dir + "/training-data*.csv")
         idx_files = glob.glob(model_dir + "/*-index*.csv")
-        if test_files or train_files or idx_files:
+        rows_files = glob.glob(model_dir + "/training-rows*.csv")
+        split_files = glob.glob(model_dir + "/splits.npz") + glob.glob(model_dir + "/training-data-completed*.npz") + glob.glob(model_dir + "/imputation-status.csv") + glob.glob(model_dir + "/split-seed.txt")
+        if test_files or train_files or idx_files or rows_files or split_files:
             print "Removing old sets..."
             for file in test_files: os.remove(file)
             for file in train_files: os.remove(file)
             for file in idx_files: os.remove(file)
+            for file in rows_files: os.remove(file)
+            for file in split_files: os.remove(file)
             print "Done."
 
+    if master:
+        print "Deriving " + str(iter_count) + " training/test sets from master model " + master + "..."
+        master_dir = os.path.join(base_dir, "models", master)
+        project_sets(master_dir, model_dir, ids, store)
+        # The sets are imputed by the method that imputed the sets of the master model
+        master_status = load_status(master_dir)
+        for id in ids:
+            record_status(model_dir, id, master_status[id][0] if id in master_status else "master", True)
+        print "Done."
+        return
+
     module_path = os.path.abspath("./utils")
     sys.path.insert(0, module_path)
     module = import_module(impute_method)
 
-    for i in range(iter_count):
-        id = i + id_start
-        print "Creating training/test sets #" + str(id) + "..."
-        test_filename = model_dir + "/testing-data-"+str(id)+".csv"
-        train_filename = model_dir + "/training-data-"+str(id)+".csv"
-        completed_filename = model_dir + "/training-data-completed-"+str(id)+".csv"
-        makesets(test_percentage, test_filename, train_filename)
-        module.process(in_filename=train_filename, out_filename=completed_filename, **kwparams)
-        print "Done."
+    print "Creating " + str(iter_count) + " training/test sets..."
+    if 0 < chunk_size and (store != "csv" or 0 < folds):
+        print "Warning: the sets are not read in chunks with " + ("folds" if 0 < folds else store + " storage") + ", ignoring the chunk size"
+    if 0 < folds:
+        # The same seed must be used by all models to share the folds
+        seed = 0 if split_seed is None else split_seed
+        makesets_folds(folds, repeats, seed, model_dir, store=store, ids=ids)
+    elif 0 < chunk_size and store == "csv":
+        seed = master_seed(model_dir, split_seed)
+        for id in ids:
+            makesets_stream(test_percentage, model_dir + "/testing-data-" + str(id) + ".csv",
+                            model_dir + "/training-data-" + str(id) + ".csv", chunk_size,
+                            np.random.RandomState([seed, id]))
+    else:
+        seed = master_seed(model_dir, split_seed)
+        makesets_batch(iter_count, test_percentage, seed, model_dir, store=store, ids=ids)
+    print "Done."
+
+    # Each set is imputed with its own seed, derived from the master seed (or the seed given
+    # to the imputation method) and the set id
+    base_seed = int(kwparams["seed"]) if "seed" in kwparams else seed
+    tasks = []
+    for id in ids:
+        params = dict(kwparams)
+        params["seed"] = str(np.random.RandomState([base_seed, id]).randint(0, 2**31 - 1))
+        tasks.append((id, impute_set, (model_dir, id, module, impute_method, store, cache_size, frame_format), params))
+    # Sets whose imputation is interrupted remain pending
+    save_status(model_dir, dict([(id, (impute_method, "pending")) for id in ids]))
+
+    # With limits, each set is imputed in its own process even if they are not imputed in parallel
+    supervised = 1 < num_jobs or 0 < timeout or 0 < memory
+    if not supervised:
+        failed = []
+        for id, target, args, params in tasks:
+            try:
+                target(*args, **params)
+                success = True
+            except Exception:
+                traceback.print_exc()
+                success = False
+            if not record_status(model_dir, id, impute_method, success): failed.append(id)
+    else:
+        print "Imputing " + str(iter_count) + " training sets in " + str(num_jobs) + " processes..."
+        failed = run_parallel(tasks, num_jobs, lambda id, success: record_status(model_dir, id, impute_method, success),
+                              timeout, memory)
+    if failed:
+        print "Error: imputation failed for training sets " + ", ".join([str(id) for id in failed])
+        exit(1)
+    if supervised: print "Done."
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser()
@@ -55,14 +239,38 @@ if __name__ == "__main__":
                         help="Base directory")
     parser.add_argument('-N', '--name', nargs=1, default=["test"],
                         help="Model name")
-    parser.add_argument('-n', '--number', type=int, nargs=1, default=[10],
-                        help="Number of training/test sets")
+    parser.add_argument('-n', '--number', type=int, nargs=1, default=[None],
+                        help="Number of training/test sets, 10 by default or all the folds with --folds")
     parser.add_argument('-s', '--start', type=int, nargs=1, default=[0],
                         help="ID of starting training/test set")
     parser.add_argument('-t', '--test', type=int, nargs=1, default=[50],
                         help="Percentage of complete rows used to build the test set")
     parser.add_argument('-m', '--method', nargs=1, default=["amelia"],
                         help="Name of script implementing imputation method")
+    parser.add_argument('-r', '--seed', type=int, nargs=1, default=[None],
+                        help="Master seed used to draw the test sets")
+    parser.add_argument('-f', '--store', nargs=1, default=["csv"],
+                        help="Storage of training/test sets: csv (CSV files) or index (row indices only)")
+    parser.add_argument('-c', '--chunk_size', type=int, nargs=1, default=[0],
+                        help="Number of records read at once from the source data, 0 to read all")
+    parser.add_argument('-K', '--folds', type=int, nargs=1, default=[0],
+                        help="Number of folds of repeated k-fold cross-validation, 0 for random test sets")
+    parser.add_argument('-R', '--repeats', type=int, nargs=1, default=[1],
+                        help="Number of repetitions of the k-fold partition")
+    parser.add_argument('-j', '--jobs', type=int, nargs=1, default=[1],
+                        help="Number of training sets imputed in parallel")
+    parser.add_argument('-x', '--cache_size', type=int, nargs=1, default=[0],
+                        help="Maximum size in MB of the cache of imputed sets, 0 to disable it")
+    parser.add_argument('-M', '--master', nargs=1, default=[""],
+                        help="Master model the sets are derived from, in sweep mode")
+    parser.add_argument('-F', '--frame_format', nargs=1, default=["csv"],
+                        help="Format of the imputed training sets: csv or npz (binary)")
+    parser.add_argument('-i', '--ids', nargs=1, default=[""],
+                        help="Comma-separated list of ids of the sets to create, instead of --number and --start")
+    parser.add_argument('-T', '--timeout', type=int, nargs=1, default=[0],
+                        help="Maximum time in seconds to impute each training set, 0 for no limit")
+    parser.add_argument('-L', '--memory', type=int, nargs=1, default=[0],
+                        help="Maximum memory in MB used to impute each training set, 0 for no limit")
     parser.add_argument('vars', nargs='*',
                         help="Custom arguments for imputation algorithm")
     args = parser.parse_args()
@@ -73,8 +281,25 @@ if __name__ == "__main__":
     id_start = args.start[0]
     test_percentage = args.test[0]
     impute_method = args.method[0]
+    seed = args.seed[0]
+    store = args.store[0]
+    chunk_size = args.chunk_size[0]
+    folds = args.folds[0]
+    repeats = args.repeats[0]
+    num_jobs = args.jobs[0]
+    cache_size = args.cache_size[0]
+    master = args.master[0]
+    frame_format = args.frame_format[0]
+    ids = [int(id) for id in args.ids[0].split(",")] if args.ids[0] else None
+    if not frame_format in ["csv", "npz"]:
+        print "Error: unknown format of imputed training sets", frame_format
+        exit(1)
+    if ids is not None:
+        iter_count = len(ids)
+    elif iter_count is None:
+        iter_count = folds * repeats - id_start if 0 < folds else 10
     kwargs = {}
     for var in args.vars:
         [k, v] = var.split("=")
         kwargs[k] = v
-    create_sets(base_dir, model_name, iter_count, id_start, test_percentage, impute_method, **kwargs)
+    create_sets(base_dir, model_name, iter_count, id_start, test_percentage, impute_method, seed, store, chunk_size, folds, repeats, num_jobs, cache_size, master, frame_format, ids, args.timeout[0], args.memory[0], **kwargs)
@@ -6,23 +6,37 @@ Executes a single job.
 
 #!/usr/bin/env python
 
-import sys, os, threading, argparse
+import sys, os, argparse, subprocess, fcntl
 import time, glob, time
 import itertools
+from utils import rpool, supervisor
+from utils.splits import pending_sets, completed_files
+from utils.modelindex import record_model, report_score
 
-def get_last(name):
+def get_pending(name):
     mdl_folder = base_folder + "/models/" + name
-    if not os.path.exists(mdl_folder): return -1
-    train_files = glob.glob(mdl_folder + "/training-data-completed*.csv")
-    idx = [int(fn[fn.rfind("-") + 1: fn.rfind(".")]) for fn in train_files]
-    idx.sort()
-    if idx: return idx[-1]
-    else: return -1
-
-def worker(name, count, first, imeth):
+    if not os.path.exists(mdl_folder): return range(0, total_sets)
+    # The status file tells which sets failed, so only those are created again
+    return pending_sets(mdl_folder, range(0, total_sets))
+
+def worker(name, ids, imeth, master):
     print "Start"
-    os.system("python init.py -B " + base_folder + " -N " + name + " -n " + str(count) + " -s " + str(first) + " -t " + str(test_prec) + " -m " + imeth + " " + impute_options[imeth])
-    return
+    # With a fixed seed, sets recreated after a restart are identical, and can reuse the
+    # imputation cache
+    extra_opts = " -r " + split_seed if split_seed else ""
+    if master: extra_opts += " -M " + master
+    if len(ids) == total_sets:
+        extra_opts += " -n " + str(total_sets) + " -s 0"
+    else:
+        extra_opts += " -i " + ",".join([str(id) for id in ids])
+    if 0 < impute_timeout: extra_opts += " -T " + str(impute_timeout)
+    if 0 < impute_memory: extra_opts += " -L " + str(impute_memory)
+    # Each set is imputed within the time limit, the whole run gets the time of all of them
+    # plus the time to create the sets
+    timeout = impute_timeout * len(ids) + 600 if 0 < impute_timeout else 0
+    status = supervisor.run("python init.py -B " + base_folder + " -N " + name + " -t " + str(test_prec) + " -f " + split_store + " -c " + str(chunk_size) + " -K " + str(folds) + " -R " + str(repeats) + " -j " + str(impute_jobs) + " -x " + str(impute_cache) + " -F " + frame_format + extra_opts + " -m " + imeth + " " + impute_options.get(imeth, ""), timeout, impute_memory)
+    print "Init stage", supervisor.describe(status)
+    return status
 
 def create_var_file(mdl_id, mdl_vars):
     dir = base_folder + "/models/" + str(mdl_id)
@@ -34,60 +48,117 @@ def create_var_file(mdl_id, mdl_vars):
         for v in mdl_vars:
             vfile.write(v + " " + var_dict[v] + "\n")
 
-def run_model(mdl_id, mdl_vars):
-    print "running model", mdl_id, mdl_vars
-    create_var_file(mdl_id, mdl_vars)
-    
-    n = get_last(mdl_id)
-    if n + 1 == total_sets:
+def init_model(mdl_id, master=""):
+    ids = get_pending(mdl_id)
+    if not ids:
         print "Training/testing files already generated, skipping init stage..."
     else:
         imeth = impute_method
-        start = n + 1
-        count = total_sets - start
         nrest = 0
         while True:
-            thread = threading.Thread(target=worker, args=(mdl_id, count, start, imeth))
-            thread.start()
-            while True:
-                time.sleep(0.1)
-                if not thread.isAlive(): break
-            n = get_last(mdl_id)
-            if n < total_sets - 1:
-                # Remove core dump files, we know that (most likely) is just amelia crashing...
-                core_files = glob.glob("./core.*")
-                for file in core_files:
-                    os.remove(file)
+            # Core dumps are disabled, and the sets left pending by a crash are imputed again
+            worker(mdl_id, ids, imeth, master)
+            ids = get_pending(mdl_id)
+            if ids:
                 if nrest < max_restarts:
-                    start = n + 1
-                    count = total_sets - start
                     nrest += 1
                 else:
                     if impute_fallback and (not imeth == impute_fallback):
+                        # Only the sets that failed are imputed with the fallback method
                         imeth = impute_fallback
-                        count = total_sets
-                        start = 0
                         nrest = 0
-                        print "Primary imputation, will try fallback imputation method",imeth
+                        print "Primary imputation failed for sets " + ",".join([str(id) for id in ids]) + ", will try fallback imputation method",imeth
                     else:
                         print "Model cannot be succesfully imputed, skipping!"
-                        return
+                        return False
             else:
                 print "Done! Number of restarts:", nrest
                 break
-            
+    return True
+
+def init_master():
+    global master_failed
+    # A master model that could not be imputed is not imputed again for each model of the job
+    if master_failed: return False
+    # Jobs sharing the base folder impute the master model only once, the first one to get
+    # the lock does it while the others wait. The lock is released by the system if the job
+    # holding it dies
+    models_folder = base_folder + "/models"
+    if not os.path.exists(models_folder):
+        try:
+            os.makedirs(models_folder)
+        except OSError:
+            pass
+    with open(models_folder + "/" + master_model + ".lock", "w") as lock:
+        try:
+            fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except IOError:
+            print "Waiting for master model", master_model, "..."
+            fcntl.flock(lock, fcntl.LOCK_EX)
+        print "running master model", master_model, all_vars[1:]
+        create_var_file(master_model, all_vars[1:])
+        master_failed = not init_model(master_model)
+        return not master_failed
+
+def prepare_model(mdl_id, mdl_vars):
+    print "running model", mdl_id, mdl_vars
+    create_var_file(mdl_id, mdl_vars)
+
+    if master_model:
+        if not init_master():
+            print "Master model cannot be succesfully imputed, skipping!"
+            return False
+        return init_model(mdl_id, master_model)
+    return init_model(mdl_id)
+
+def report_found(mdl_id, pred_name):
+    repfn = base_folder + "/models/" + mdl_id + "/report-" + pred_name + ".out"
+    if os.path.exists(repfn):
+        with open(repfn, "r") as report:
+            lines = report.readlines()
+            if lines: return True
+    return False
+
+def batch_trained(mdl_id, pred_name):
+    mdl_folder = base_folder + "/models/" + mdl_id
+    files = completed_files(mdl_folder)
+    return files and all([os.path.exists(fn.replace("training-data-completed", pred_name + "-params").replace(".csv", "")) for fn in files])
+
+def run_predictors(mdl_id, mdl_vars, batched=[]):
     for pred_name in predictors:
         print "PREDICTOR",pred_name,"---------------"
         pred_opt = pred_options[pred_name]
         repfn = base_folder + "/models/" + mdl_id + "/report-" + pred_name + ".out"
-        if os.path.exists(repfn):
-            with open(repfn, "r") as report:
-                lines = report.readlines()
-                if lines:
-                    print "Report for",pred_name,"found, skipping..."
-                    continue
-        os.system("python train.py -B " + base_folder + " -N " + mdl_id + " " + pred_name + " " + pred_opt)
+        if report_found(mdl_id, pred_name):
+            print "Report for",pred_name,"found, skipping..."
+            continue
+        if pred_name in batched and batch_trained(mdl_id, pred_name):
+            print "Parameters for",pred_name,"trained in batch"
+        else:
+            train_opts = " -P -j " + str(train_jobs) if pooled_training else ""
+            if warm_start: train_opts += " -W"
+            # train.py refuses the predictors that cannot be trained on the sets (those that don't
+            # handle missing values, on sets that were not imputed)
+            if os.system("python train.py -B " + base_folder + " -N " + mdl_id + train_opts + " " + pred_name + " " + pred_opt) != 0:
+                print "Predictor",pred_name,"cannot be trained, skipping..."
+                continue
         os.system("python eval.py -B " + base_folder + " -N " + mdl_id + " -p " + pred_name + " -m report > " + repfn)
+        # Larger models can start from this one
+        record_model(base_folder, mdl_id, pred_name, mdl_vars, report_score(repfn))
+
+def run_model(mdl_id, mdl_vars):
+    if prepare_model(mdl_id, mdl_vars): run_predictors(mdl_id, mdl_vars)
+
+"""Imputes all the models of the job first, and then trains the logistic regressions of all
+of them in a single process, from the sets of the master model
+"""
+def run_batch():
+    ready = [i for i in range(0, len(mdl_ids)) if prepare_model(mdl_ids[i], mdl_vars[i])]
+    pending = [mdl_ids[i] for i in ready if not report_found(mdl_ids[i], "lreg")]
+    if pending:
+        os.system("python lreg/batch.py -B " + base_folder + " -M " + master_model + " -m " + ",".join(pending) + " " + pred_options["lreg"])
+    # The models whose parameters were not saved are trained separately
+    for i in ready: run_predictors(mdl_ids[i], mdl_vars[i], ["lreg"])
 
 ##########################################################################################
 
@@ -103,6 +174,10 @@ cfg_filename = args.cfg_file[0]
 
 total_sets = 100
 test_prec = 60
+split_store = "csv"
+chunk_size = 0
+folds = 0
+repeats = 1
 max_restarts = 5
 base_folder="./"
 var_file = "./data/variables-master.txt"
@@ -111,6 +186,19 @@ pred_options = {"lreg":"", "scikit_lreg":""}
 impute_method = "hmisc"
 impute_fallback = "mice"
 impute_options = {"hmisc":"", "mice":""}
+rpool_workers = 0
+impute_jobs = 1
+impute_cache = 0
+split_seed = ""
+frame_format = "csv"
+master_model = ""
+master_failed = False
+pooled_training = False
+train_jobs = 1
+batch_training = False
+warm_start = False
+impute_timeout = 0
+impute_memory = 0
 with open(cfg_filename, "r") as cfg:
     lines = cfg.readlines()
     for line in lines:
@@ -119,6 +207,10 @@ with open(cfg_filename, "r") as cfg:
         key,value = line.split("=", 1)
         if key == "total_sets": total_sets = int(value)
         elif key == "test_prec": test_prec = int(value)
+        elif key == "split_store": split_store = value
+        elif key == "chunk_size": chunk_size = int(value)
+        elif key == "folds": folds = int(value)
+        elif key == "repeats": repeats = int(value)
         elif key == "max_restarts": max_restarts = int(value)
         elif key == "base_folder": base_folder = value
         elif key == "var_file": var_file = value
@@ -131,6 +223,21 @@ with open(cfg_filename, "r") as cfg:
         elif "impute_options" in key:
             imp = key.split(".")[1]
             impute_options[imp] = value
+        elif key == "rpool_workers": rpool_workers = int(value)
+        elif key == "impute_jobs": impute_jobs = int(value)
+        elif key == "impute_cache": impute_cache = int(value)
+        elif key == "impute_timeout": impute_timeout = int(value)
+        elif key == "impute_memory": impute_memory = int(value)
+        elif key == "split_seed": split_seed = value
+        elif key == "frame_format": frame_format = value
+        elif key == "master_model": master_model = value
+        elif key == "pooled_training": pooled_training = value.lower() == "true"
+        elif key == "train_jobs": train_jobs = int(value)
+        elif key == "batch_training": batch_training = value.lower() == "true"
+        elif key == "warm_start": warm_start = value.lower() == "true"
+if 0 < folds:
+    # One training/test set per fold and repetition
+    total_sets = folds * repeats
 
 all_vars = []
 var_dict = {}
@@ -156,7 +263,27 @@ with open(job_filename, "r") as cfg:
         mdl_ids.append(id)
         mdl_vars.append(vars.split(","))
 
-for i in range(0, len(mdl_ids)):
-    id = mdl_ids[i]
-    vars = mdl_vars[i]
-    run_model(id, vars)
+# R pool shared by all the imputations and evaluations of the job, unless one is already
+# running
+pool = None
+if 0 < rpool_workers and rpool.request("status") is None:
+    os.environ["RPOOL_FILE"] = os.path.abspath("./cache/rpool-" + str(os.getpid()) + ".txt")
+    # The workers get the limits of the imputation of a set
+    pool = subprocess.Popen(["python", "utils/rpool.py", "start", "-w", str(rpool_workers), "-t", str(impute_timeout), "-m", str(impute_memory)])
+    if not rpool.wait_ready(120):
+        print "R pool could not be started, R will run inside each process"
+        pool.terminate()
+        pool = None
+
+# Sets that were not imputed are not trained in batch, so train.py refuses lreg for them
+if batch_training and master_model and not pooled_training and "lreg" in predictors and impute_method != "none":
+    run_batch()
+else:
+    for i in range(0, len(mdl_ids)):
+        id = mdl_ids[i]
+        vars = mdl_vars[i]
+        run_model(id, vars)
+
+if pool is not None:
+    rpool.request("stop")
+    pool.wait()
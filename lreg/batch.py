@@ -0,0 +1,239 @@
+"""
+Trains the logistic regressions of many models at once, from the imputed training sets of a
+master model whose variables include the variables of all the models (see utils/sweep.py).
+The training set of a model on split k is made of the rows of the master training set k
+selected for the model, projected to its variables, so all the models are trained on one
+design matrix: each model uses a subset of its columns, and gives zero weight to the rows it
+doesn't select. The small regressions are solved together with Newton iterations stacked
+over the models, and the parameters of each model are saved in its folder, in the same
+format as train.py. Only a single inverse regularization coefficient is supported.
+Usage:
+
+python lreg/batch.py -B ./ -M master -m 1,2,3 inv_reg=12.5
+
+@copyright: The Broad Institute of MIT and Harvard 2015
+"""
+
+import sys, os, argparse, glob
+import numpy as np
+sys.path.append(os.path.abspath('./utils'))
+from splits import load_frame, load_index, completed_files, frame_exists, load_status
+from imputation import rows_filename, load_rows
+from makesets import load_variables
+from regpath import path_values
+from train import prefix, title, save_theta
+
+"""Returns the numbers in the source data of the rows in a training or testing set
+
+:param dir: directory of the model
+:param kind: training or testing
+:param id: id of the set
+"""
+def source_numbers(dir, kind, id):
+    lines = load_index(os.path.join(dir, kind + "-index-" + str(id) + ".csv"))
+    if lines is None:
+        raise Exception("Index of " + kind + " set " + str(id) + " not found in " + dir)
+    return np.array([int(line.split(",")[0]) for line in lines], dtype=int)
+
+"""Returns the number of rows in the imputed training set of a model, which train.py uses for
+the columns of the variables that are constant in the set
+
+:param dir: directory of the model
+:param id: id of the set
+"""
+def training_rows(dir, id):
+    completed = os.path.join(dir, "training-data-completed-" + str(id) + ".csv")
+    if os.path.exists(rows_filename(completed)):
+        return len(load_rows(completed)[0])
+    return len(load_frame(completed))
+
+"""Returns the penalized cost of each model, stacked as in newton
+
+:param X: design matrices of the models, with shape (models, rows, coefficients)
+:param y: outcome of each row
+:param W: weight of each row in each model, normalized so the weights of a model sum to 1
+:param theta: coefficients of each model
+:param reg: regularization of each coefficient of each model
+"""
+def stacked_cost(X, y, W, theta, reg):
+    z = np.matmul(X, theta[:, :, None])[:, :, 0]
+    # log(1 + exp(z)) - y z, computed without overflow
+    terms = np.logaddexp(0, z) - y * z
+    return (W * terms).sum(axis=1) + 0.5 * (reg * theta * theta).sum(axis=1)
+
+"""Minimizes the penalized cost of all the models together with Newton iterations, halving
+the step of the models whose cost would increase. Returns the coefficients of each model and
+the number of iterations
+
+:param X: design matrices of the models, with shape (models, rows, coefficients), and zero in
+          the unused coefficients of the models with less variables
+:param y: outcome of each row
+:param W: weight of each row in each model, normalized so the weights of a model sum to 1
+:param reg: regularization of each coefficient of each model
+:param used: True for the coefficients used by each model
+:param threshold: convergence threshold on the largest component of the gradient
+:param max_iter: maximum number of iterations
+"""
+def newton(X, y, W, reg, used, threshold, max_iter):
+    B, M, P = X.shape
+    theta = np.zeros((B, P))
+    active = np.ones(B, dtype=bool)
+    cost = stacked_cost(X, y, W, theta, reg)
+    for it in range(0, max_iter):
+        Xa = X[active]
+        h = 1 / (1 + np.exp(-np.matmul(Xa, theta[active][:, :, None])[:, :, 0]))
+        grad = np.matmul(((h - y) * W[active])[:, None, :], Xa)[:, 0, :] + reg[active] * theta[active]
+        conv = np.abs(grad).max(axis=1) < threshold
+        idx = np.nonzero(active)[0]
+        active[idx[conv]] = False
+        if not active.any(): break
+        keep = ~conv
+        Xa = Xa[keep]
+        idx = idx[keep]
+        s = h[keep] * (1 - h[keep]) * W[idx]
+        hess = np.matmul(np.transpose(Xa * s[:, :, None], (0, 2, 1)), Xa)
+        # The unused coefficients have identity rows, so their steps are zero
+        hess += reg[idx][:, :, None] * np.eye(P) + (~used[idx])[:, :, None] * np.eye(P)
+        step = np.linalg.solve(hess, grad[keep][:, :, None])[:, :, 0]
+        t = np.ones(len(idx))
+        for k in range(0, 30):
+            new_theta = theta[idx] - t[:, None] * step
+            new_cost = stacked_cost(Xa, y, W[idx], new_theta, reg[idx])
+            worse = cost[idx] + 1e-12 < new_cost
+            if not worse.any(): break
+            t[worse] = t[worse] / 2
+        theta[idx] = new_theta
+        cost[idx] = new_cost
+    return theta, it + 1
+
+"""Trains the logistic regressions of the models on one set of the master model, and saves
+their parameters
+
+:param master_dir: directory of the master model
+:param model_dirs: directories of the models
+:param id: id of the set
+:param gamma: regularization coefficient
+:param threshold: convergence threshold
+:param max_iter: maximum number of Newton iterations
+:param chunk: maximum number of models solved together
+"""
+def train_set(master_dir, model_dirs, id, gamma, threshold, max_iter, chunk):
+    master_completed = os.path.join(master_dir, "training-data-completed-" + str(id) + ".csv")
+    df = load_frame(master_completed)
+    master_variables = df.columns.tolist()
+    values = df.values.astype(np.float64)
+    y = values[:, 0]
+    if os.path.exists(rows_filename(master_completed)):
+        rows, _, weights = load_rows(master_completed)
+    else:
+        rows, weights = np.arange(len(df)), np.ones(len(df), dtype=int)
+    numbers = source_numbers(master_dir, "training", id)[rows]
+
+    models = []
+    for dir in model_dirs:
+        variables = load_variables(dir)
+        if not set(variables) <= set(master_variables):
+            raise Exception("Variables of " + dir + " are not a subset of the variables of " + master_dir)
+        models.append((dir, variables))
+    P = max([len(variables) for dir, variables in models])
+
+    iters = 0
+    for start in range(0, len(models), chunk):
+        batch = models[start:start + chunk]
+        B = len(batch)
+        X = np.zeros((B, len(y), P))
+        W = np.zeros((B, len(y)))
+        reg = np.zeros((B, P))
+        used = np.zeros((B, P), dtype=bool)
+        for b in range(0, B):
+            dir, variables = batch[b]
+            # The rows of the master set that come from rows of the model training set
+            sel = np.in1d(numbers, source_numbers(dir, "training", id))
+            if not sel.any():
+                raise Exception("Training set " + str(id) + " of " + dir + " has no rows in the master set")
+            N = len(variables)
+            X[b, :, 0] = 1
+            for j in range(1, N):
+                # Normalized with the range of the variable in the model training set, as in
+                # train.py
+                col = values[:, master_variables.index(variables[j])]
+                minv = col[sel].min()
+                maxv = col[sel].max()
+                if maxv > minv:
+                    X[b, :, j] = np.clip((col - minv) / (maxv - minv), 0, 1)
+                else:
+                    # The training set of the model has less rows than selected here, as the
+                    # rows that differ only in variables not in the model are merged
+                    X[b, :, j] = 1.0 / training_rows(dir, id)
+            wsum = float(weights[sel].sum())
+            W[b, sel] = weights[sel] / wsum
+            reg[b, 1:N] = gamma / wsum
+            used[b, 0:N] = True
+
+        theta, it = newton(X, y, W, reg, used, threshold, max_iter)
+        iters = max(iters, it)
+        for b in range(0, B):
+            dir, variables = batch[b]
+            N = len(variables)
+            save_theta(os.path.join(dir, prefix() + "-params-" + str(id)), theta[b, 0:N], N, variables[1:])
+    print "Trained", len(models), "logistic regressions on set", id, "in", iters, "Newton iterations"
+
+"""
+Trains the logistic regressions of the models on all the sets of the master model
+
+: param base_dir: base directory
+: param master: name of the master model
+: param names: names of the models
+: param kwparams: custom arguments: inv_reg (inverse of regularization coefficient), threshold
+                  (convergence threshold), max_iter (maximum number of Newton iterations),
+                  chunk (maximum number of models solved together)
+"""
+def train(base_dir, master, names, **kwparams):
+    if "inv_reg" in kwparams:
+        if path_values(kwparams["inv_reg"]) is not None:
+            raise Exception("Regularization paths are not supported in batch training, use train.py")
+        gamma = 1.0 / float(kwparams["inv_reg"])
+    else:
+        gamma = 0.08
+    threshold = float(kwparams["threshold"]) if "threshold" in kwparams else 1E-5
+    max_iter = int(kwparams["max_iter"]) if "max_iter" in kwparams else 100
+    chunk = int(kwparams["chunk"]) if "chunk" in kwparams else 500
+
+    models_dir = os.path.join(base_dir, "models")
+    master_dir = os.path.join(models_dir, master)
+    model_dirs = [os.path.join(models_dir, name) for name in names]
+
+    status = load_status(master_dir)
+    if [id for id in status if status[id][0] == "none"]:
+        raise Exception("The " + title() + " predictor doesn't handle missing values, and the sets of " + master + " were not imputed")
+
+    for dir in model_dirs:
+        # remove old parameters
+        for file in glob.glob(dir + "/" + prefix() + "-params-*"):
+            os.remove(file)
+
+    print "Training " + title() + " predictor of " + str(len(model_dirs)) + " models..."
+    for tfile in completed_files(master_dir):
+        start_idx = tfile.find("training-data-completed-") + len("training-data-completed-")
+        stop_idx = tfile.find(".csv")
+        id = tfile[start_idx:stop_idx]
+        # Only the models with that set
+        dirs = [dir for dir in model_dirs if frame_exists(os.path.join(dir, "training-data-completed-" + id + ".csv"))]
+        if dirs: train_set(master_dir, dirs, id, gamma, threshold, max_iter, chunk)
+    print "Done."
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-B', '--base_dir', nargs=1, default=["./"],
+                        help="Base directory")
+    parser.add_argument('-M', '--master', nargs=1, default=["master"],
+                        help="Name of master model")
+    parser.add_argument('-m', '--models', nargs=1, default=["test"],
+                        help="Comma-separated list of names of the models")
+    parser.add_argument('vars', nargs='*')
+    args = parser.parse_args()
+    kwargs = {}
+    for var in args.vars:
+        [k, v] = var.split("=")
+        kwargs[k] = v
+    train(args.base_dir[0], args.master[0], args.models[0].split(","), **kwargs)
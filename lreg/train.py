@@ -5,11 +5,17 @@ Trains a Logistic Regression Classifier with binary output.
 """
 
 import argparse
-import sys
+import sys, os
 import pandas as pd
 import numpy as np
 from scipy.optimize import fmin_l_bfgs_b
 import matplotlib.pyplot as plt
+sys.path.append(os.path.abspath('./utils'))
+from splits import load_frame, load_weights
+from objective import Objective
+from regpath import path_values, validation_rows, validation_loss
+from modelindex import map_coefficients
+from utils import best_fit
 
 def prefix():
     return "lreg"
@@ -17,24 +23,18 @@ def prefix():
 def title():
     return "Logistic Regression"
 
+def handles_missing():
+    return False
+
 def sigmoid(v):
     return 1 / (1 + np.exp(-v))
 
-def cost(theta, X, y, gamma):
-    M = X.shape[0]
-
-    h = sigmoid(np.dot(X, theta))
-    terms =  -y * np.log(h) - (1-y) * np.log(1-h)
-
-    prod = theta * theta
-    prod[0] = 0
-    penalty = (gamma / (2 * M)) * np.sum(prod)
-
-    return terms.mean() + penalty
-
-def gradient(theta, X, y, gamma):
-    M = X.shape[0]
-    N = X.shape[1]
+"""Evaluates the cost function and its gradient together, sharing the predictions of the
+model
+"""
+def cost_gradient(theta, X, y, w, gamma):
+    # Each row counts as many times as its weight
+    M = w.sum()
 
     # Note the vectorized operations using numpy:
     # X is a MxN array, and theta a Nx1 array,
@@ -43,86 +43,124 @@ def gradient(theta, X, y, gamma):
     # perform the calculation component-wise and
     # return another Mx1 array
     h = sigmoid(np.dot(X, theta))
+    terms =  -y * np.log(h) - (1-y) * np.log(1-h)
+
+    prod = theta * theta
+    prod[0] = 0
+    penalty = (gamma / (2 * M)) * np.sum(prod)
+
     err = h - y
     # err is a Mx1 array, so that its dot product
     # with the MxN array X gives a Nx1 array, which
     # in this case it is exactly the gradient!
-    costGrad = np.dot(err, X) / M
+    costGrad = np.dot(w * err, X) / M
 
     regCost = (gamma / M) * np.copy(theta)
     regCost[0] = 0
 
-    grad = costGrad + regCost
+    return np.dot(w, terms) / M + penalty, costGrad + regCost
 
-    global gcheck
-    if gcheck:
-        ok = True
-        epsilon = 1E-5
-        maxerr = 0.01
-        grad1 = np.zeros(N);
-        for i in range(0, N):
-            theta0 = np.copy(theta)
-            theta1 = np.copy(theta)
-
-            theta0[i] = theta0[i] - epsilon
-            theta1[i] = theta1[i] + epsilon
-
-            c0 = cost(theta0, X, y, gamma)
-            c1 = cost(theta1, X, y, gamma)
-            grad1[i] = (c1 - c0) / (2 * epsilon)
-            diff = abs(grad1[i] - grad[i])
-            if maxerr < diff: 
-                print "Numerical and analytical gradients differ by",diff,"at argument",i,"/",N
-                ok = False
-        if ok:
-            print "Numerical and analytical gradients coincide within the given precision of",maxerr
-
-    return grad
-
-def add_value(theta):
-    global params
-    global gamma 
-    global values
-    (X, y, gamma) = params
-    value = cost(theta, X, y, gamma);
-    values = np.append(values, [value])
-
-def optim(params, threshold):
-    global values
-    (X, y, gamma) = params
+def cost(theta, X, y, w, gamma):
+    return cost_gradient(theta, X, y, w, gamma)[0]
+
+def gradient(theta, X, y, w, gamma):
+    return cost_gradient(theta, X, y, w, gamma)[1]
+
+def optim(objective, threshold, theta0=None):
+    (X, y, w, gamma) = objective.args
     M = X.shape[0]
     N = X.shape[1]
 
     print ""
     print "Running BFGS minimization..."
-    theta0 = 1 - 2 * np.random.rand(N)
+    if theta0 is None:
+        theta0 = 1 - 2 * np.random.rand(N)
  
-    thetaOpt = fmin_l_bfgs_b(cost, theta0, fprime=gradient, args=(X, y, gamma), pgtol=threshold, callback=add_value)[0]
+    thetaOpt, value, info = fmin_l_bfgs_b(objective.cost, theta0, fprime=objective.gradient, pgtol=threshold, callback=objective.callback)
+    print "Number of iterations:", info["nit"]
     return [True, thetaOpt]
 
+"""Fits the logistic regression for each value of the inverse regularization coefficient in
+a path, starting each minimization from the solution of the previous one. Returns the
+coefficients of all the fits, and the objective of the last one. The first minimization
+starts from theta0, or from random coefficients if None
+"""
+def fit_path(X, y, w, inv_regs, threshold, debug, theta0=None):
+    thetas = []
+    theta = theta0
+    for inv_reg in inv_regs:
+        objective = Objective(cost_gradient, (X, y, w, 1.0 / inv_reg), debug)
+        theta = optim(objective, threshold, theta)[1]
+        thetas.append(theta)
+    return thetas, objective
+
 def print_theta(theta, N, names):
     print "{:10s} {:3.5f}".format("Intercept", theta[0])
     for i in range(1, N):
         print "{:10s} {:3.5f}".format(names[i-1], theta[i])
 
-def save_theta(filename, theta, N, names):
+def save_theta(filename, theta, N, names, stderr=None):
     with open(filename, "wb") as pfile:
-        pfile.write("Intercept " + str(theta[0]) + "\n")
-        for i in range(1, N):
-            pfile.write(names[i-1] + " " + str(theta[i]) + "\n")
+        for i in range(0, N):
+            line = ("Intercept" if i == 0 else names[i-1]) + " " + str(theta[i])
+            if stderr is not None: line += " " + str(stderr[i])
+            pfile.write(line + "\n")
+
+"""Saves the coefficients of all the fits in a regularization path, each preceded by its
+inverse regularization coefficient and validation loss, and separated by empty lines
+"""
+def save_path(filename, inv_regs, losses, thetas, N, names):
+    with open(filename, "wb") as pfile:
+        for k in range(0, len(inv_regs)):
+            if 0 < k: pfile.write("\n")
+            pfile.write("Inverse_regularization " + str(inv_regs[k]) + "\n")
+            pfile.write("Validation_loss " + str(losses[k]) + "\n")
+            pfile.write("Intercept " + str(thetas[k][0]) + "\n")
+            for i in range(1, N):
+                pfile.write(names[i-1] + " " + str(thetas[k][i]) + "\n")
+
+"""Builds the normalized design matrix of the data frame, scaling each variable with its range
+in the normalization data frame
+
+: param df: data frame, with the outcome in the first column
+: param df0: data frame used for normalization
+"""
+def design(df, df0):
+    M = df.shape[0]
+    N = df.shape[1]
+    X = np.ones((M, N))
+    for j in range(1, N):
+        # Computing i-th column. The pandas dataframe
+        # contains all the values as numpy arrays that
+        # can be handled individually:
+        values = df.values[:, j]
+        minv = df0.values[:, j].min()
+        maxv = df0.values[:, j].max()
+        if maxv > minv:
+            X[:, j] = np.clip((values - minv) / (maxv - minv), 0, 1)
+        else:
+            X[:, j] = 1.0 / M
+    return X
 
 """
 Trains the logistic regression classifier given the specified parameters
 
 : param train_filename: name of file containing training set
 : param param_filename: name of file to store resulting logistic regression parameters
-: param kwparams: custom arguments for logistic regression: nv_reg (inverse of regularization 
-                  coefficient), threshold (default convergence threshold), show (show 
-                  minimization plot), debug (gradient check)
+: param kwparams: custom arguments for logistic regression: inv_reg (inverse of regularization 
+                  coefficient, or start:stop:num for a regularization path, see regpath),
+                  valid_frac and seed (validation fold of the path), threshold (default
+                  convergence threshold), show (show minimization plot), debug (gradient
+                  check), norm_file (training file whose ranges are used to normalize the
+                  variables, the training file by default), init_params (parameters file of a
+                  model with one variable less, to start the minimization from its
+                  coefficients)
 """
 def train(train_filename, param_filename, **kwparams):
+    inv_regs = None
     if "inv_reg" in kwparams:
-        gamma = 1.0 / float(kwparams["inv_reg"])
+        inv_regs = path_values(kwparams["inv_reg"])
+        gamma = 1.0 / float(kwparams["inv_reg"]) if inv_regs is None else None
     else:
         gamma = 0.08
 
@@ -141,39 +179,45 @@ def train(train_filename, param_filename, **kwparams):
     else:
         debug = False
 
-    global gcheck
-    global params
-    global values
-    gcheck = debug
-
     print "***************************************"
 
     # Loading data frame and initalizing dimensions
-    df = pd.read_csv(train_filename, delimiter=',', na_values="?")
+    df = load_frame(train_filename)
+    w = load_weights(train_filename)
     M = df.shape[0]
     N = df.shape[1]
     vars = df.columns.values[1: N]
     print "Number of independent variables:", N-1
-    print "Number of data samples         :", M
+    print "Number of data samples         :", M, "(" + str(int(w.sum())) + " with weights)"
 
     y = df.values[:,0]
     # Building the (normalized) design matrix
-    X = np.ones((M, N))
-    for j in range(1, N):
-        # Computing i-th column. The pandas dataframe
-        # contains all the values as numpy arrays that
-        # can be handled individually:
-        values = df.values[:, j]
-        minv = values.min()
-        maxv = values.max()
-        if maxv > minv:
-            X[:, j] = np.clip((values - minv) / (maxv - minv), 0, 1)
-        else:
-            X[:, j] = 1.0 / M
-
-    values = np.array([])
-    params = (X, y, gamma)
-    [conv, theta] = optim(params, threshold)
+    df0 = load_frame(kwparams["norm_file"]) if "norm_file" in kwparams else df
+    X = design(df, df0)
+
+    theta0 = None
+    if "init_params" in kwparams:
+        # The new variable starts with a zero coefficient
+        print "Starting from the coefficients in", kwparams["init_params"]
+        theta0 = map_coefficients(kwparams["init_params"], best_fit(kwparams["init_params"])[2], df.columns.tolist())
+
+    if inv_regs is not None:
+        # The validation losses come from the path fitted without the validation fold, and
+        # the coefficients from the path fitted on all the rows
+        valid = validation_rows(train_filename, kwparams)
+        fit = ~valid
+        thetas = fit_path(X[fit], y[fit], w[fit], inv_regs, threshold, debug, theta0)[0]
+        losses = [validation_loss(y[valid], sigmoid(np.dot(X[valid], t)), w[valid]) for t in thetas]
+        thetas, objective = fit_path(X, y, w, inv_regs, threshold, debug, theta0)
+        best = np.argmin(losses)
+        print ""
+        print "Validation loss along the regularization path:"
+        for k in range(0, len(inv_regs)):
+            print "{:10.5f} {:10.5f}{:s}".format(inv_regs[k], losses[k], " *" if k == best else "")
+        [conv, theta] = [True, thetas[best]]
+    else:
+        objective = Objective(cost_gradient, (X, y, w, gamma), debug)
+        [conv, theta] = optim(objective, threshold, theta0)
 
     if conv:
         print "Convergence!"
@@ -182,7 +226,7 @@ def train(train_filename, param_filename, **kwparams):
         print "Try adjusting the learning or the regularization coefficients"
 
     if show:
-        plt.plot(np.arange(values.shape[0]), values)
+        plt.plot(np.arange(len(objective.values)), objective.values)
         plt.xlabel("Step number")
         plt.ylabel("Cost function")
         plt.show()
@@ -190,7 +234,61 @@ def train(train_filename, param_filename, **kwparams):
     print ""
     print "Logistic Regresion parameters:"
     print_theta(theta, N, vars)
-    save_theta(param_filename, theta, N, vars)
+    if inv_regs is not None:
+        save_path(param_filename, inv_regs, losses, thetas, N, vars)
+    else:
+        save_theta(param_filename, theta, N, vars)
+
+"""
+Pools the logistic regressions trained on each imputed dataset with Rubin's rules: the pooled
+coefficients are the average of the coefficients, and their variance is the average variance
+within the datasets plus the variance between them. The standard errors are saved next to the
+pooled coefficients (see utils.load_stderr)
+
+: param train_files: training files of the imputed datasets
+: param param_files: parameter files of the logistic regressions trained on them
+: param param_filename: name of file to store the pooled parameters
+: param kwparams: custom arguments used to train the logistic regressions
+"""
+def pool(train_files, param_files, param_filename, **kwparams):
+    if "inv_reg" in kwparams and path_values(kwparams["inv_reg"]) is None:
+        gamma = 1.0 / float(kwparams["inv_reg"])
+    else:
+        gamma = 0.08
+
+    thetas = []
+    within = []
+    for train_file, param_file in zip(train_files, param_files):
+        # With a regularization path, the fit with the lowest validation loss
+        inv_reg, loss, theta = best_fit(param_file)
+        if inv_reg is not None: gamma = 1.0 / inv_reg
+        df = load_frame(train_file)
+        df0 = load_frame(kwparams["norm_file"]) if "norm_file" in kwparams else df
+        X = design(df, df0)
+        w = load_weights(train_file)
+        # Covariance of the coefficients from the Hessian of the penalized log-likelihood
+        h = sigmoid(np.dot(X, theta))
+        penalty = gamma * np.eye(len(theta))
+        penalty[0, 0] = 0
+        hess = np.dot(X.T * (w * h * (1 - h)), X) + penalty
+        thetas.append(theta)
+        within.append(np.diag(np.linalg.pinv(hess)))
+
+    m = len(thetas)
+    thetas = np.array(thetas)
+    theta = thetas.mean(axis=0)
+    between = thetas.var(axis=0, ddof=1) if 1 < m else np.zeros(len(theta))
+    total = np.mean(within, axis=0) + (1 + 1.0 / m) * between
+
+    N = len(theta)
+    vars = load_frame(train_files[0]).columns.values[1: N]
+    print ""
+    print "Pooled Logistic Regresion parameters from", m, "imputed datasets:"
+    print "{:10s} {:>10s} {:>10s}".format("", "Estimate", "Std. Err.")
+    for i in range(0, N):
+        name = "Intercept" if i == 0 else vars[i-1]
+        print "{:10s} {:10.5f} {:10.5f}".format(name, theta[i], np.sqrt(total[i]))
+    save_theta(param_filename, theta, N, vars, np.sqrt(total))
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser()
@@ -198,18 +296,21 @@ if __name__ == "__main__":
                         help="File containing training set")
     parser.add_argument("-p", "--param", nargs=1, default=["./models/test/lreg-params"],
                         help="Output file to save the parameters of the neural net")
-    parser.add_argument("-r", "--inv_reg", nargs=1, type=float, default=[12.5],
-                        help="Inverse of regularization coefficient, larger values represent lower penalty")
+    parser.add_argument("-r", "--inv_reg", nargs=1, default=["12.5"],
+                        help="Inverse of regularization coefficient, larger values represent lower penalty, or start:stop:num for a regularization path")
     parser.add_argument("-c", "--convergence", nargs=1, type=float, default=[1E-5],
                         help="Convergence threshold for the BFGS minimizer")
+    parser.add_argument("-i", "--init_params", nargs=1, default=[""],
+                        help="Parameters file of a model with one variable less, to start from its coefficients")
     parser.add_argument("-s", "--show", action="store_true",
                         help="Shows minimization plot")
     parser.add_argument("-d", "--debug", action="store_true",
                         help="Debugs gradient calculation")
 
     args = parser.parse_args()
+    kwargs = {"init_params":args.init_params[0]} if args.init_params[0] else {}
     train(args.train[0], args.param[0],
           inv_reg=str(args.inv_reg[0]),
           threshold=str(args.convergence[0]),
           show=str(args.show),
-          debug=str(args.debug))
+          debug=str(args.debug), **kwargs)
@@ -15,17 +15,47 @@ def predict(x, theta):
     p = sigmoid(np.dot(x, theta))
     return np.array([p])
 
+"""Loads the coefficients in a parameters file. Returns a list with a tuple for each fit in a
+regularization path (the inverse regularization coefficient, the validation loss and the
+coefficients), or a single tuple with None in the first two elements for a single fit
+"""
+def load_path(params_filename):
+    with open(params_filename, "rb") as pfile:
+        blocks = pfile.read().strip().split("\n\n")
+    path = []
+    for block in blocks:
+        inv_reg = None
+        loss = None
+        coeffs = []
+        for line in block.split("\n"):
+            name, value = line.strip().split(' ')[0:2]
+            if name == "Inverse_regularization": inv_reg = float(value)
+            elif name == "Validation_loss": loss = float(value)
+            else: coeffs.append(float(value))
+        path.append((inv_reg, loss, np.array(coeffs)))
+    return path
+
+"""Returns the fit with the lowest validation loss in a parameters file, as a tuple like those
+returned by load_path
+"""
+def best_fit(params_filename):
+    path = load_path(params_filename)
+    if len(path) == 1: return path[0]
+    return path[np.argmin([loss for inv_reg, loss, theta in path])]
+
+"""Returns the standard errors of the coefficients saved with the pooled coefficients of a
+parameters file (the third column, see pool in train.py), or None if there are none
+"""
+def load_stderr(params_filename):
+    with open(params_filename, "rb") as pfile:
+        parts = [line.strip().split(' ') for line in pfile.read().strip().split("\n")]
+    if not all([len(p) == 3 for p in parts]): return None
+    return np.array([float(p[2]) for p in parts])
+
 """Return a function that gives a prediction from a design matrix row
 """
 def gen_predictor(params_filename="./models/test/lreg-params"):
-    with open(params_filename, "rb") as pfile:
-        lines = pfile.readlines()
-        N = len(lines)
-        theta = np.ones(N)
-        i = 0
-        for line in lines:
-            theta[i] = float(line.strip().split(' ')[1])
-            i = i + 1
+    theta = best_fit(params_filename)[2]
 
     def predictor(X):
         scores = []
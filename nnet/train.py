@@ -5,13 +5,16 @@ Trains a Neural Network predictor with binary output.
 """
 
 import argparse
-import sys
-import math
+import sys, os
 import pandas as pd
 import numpy as np
 from scipy.optimize import fmin_bfgs
 import matplotlib.pyplot as plt
-from utils import thetaMatrix, gradientArray, sigmoid, forwardProp, backwardProp, predict
+sys.path.append(os.path.abspath('./utils'))
+from splits import load_frame, load_weights
+from objective import Objective
+from modelindex import map_coefficients
+from utils import thetaMatrix, gradientArray, sigmoid, forwardProp, backwardProp, predict, load_nets
 
 def prefix():
     return "nnet"
@@ -19,102 +22,78 @@ def prefix():
 def title():
     return "Neural Network"
 
-"""Evaluates the cost function
-"""
-def cost(theta, X, y, N, L, S, K, gamma):
-    M = X.shape[0]
+def handles_missing():
+    return False
 
+"""Evaluates the cost function and its gradient together, propagating all the samples through
+the net at once
+"""
+def cost_gradient(theta, X, y, w, N, L, S, K, gamma):
     # The cost argument is a 1D-array that needs to be reshaped into the
     # parameter matrix for each layer:
     thetam = thetaMatrix(theta, N, L, S, K)
 
-    h = np.zeros(M)
-    terms = np.zeros(M)
-    for i in range(0, M):
-        a = forwardProp(X[i,:], thetam, L)
-        h[i] = a[L]
-        t0 = -y[i] * np.log(h[i]) if 0 < y[i] else 0
-        t1 = -(1-y[i]) * np.log(1-h[i]) if y[i] < 1 else 0
-        if math.isnan(t0) or math.isnan(t1):
-            #print "NaN detected when calculating cost contribution of observation",i
-            terms[i] = 10
-        else:
-            terms[i] = t0 + t1 
+    a = forwardProp(X, thetam, L)
+    h = a[L][:, 0]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        t0 = np.where(0 < y, -y * np.log(h), 0)
+        t1 = np.where(y < 1, -(1 - y) * np.log(1 - h), 0)
+    terms = t0 + t1
+    # NaN detected when calculating cost contribution of some observations
+    terms[np.isnan(terms)] = 10
 
     # Regularization penalty
     penalty = (gamma/2) * np.sum(theta * theta)
 
-    return terms.mean() + penalty;
+    # Each row counts as many times as its weight
+    value = np.dot(w, terms) / w.sum() + penalty
 
-"""Computes the gradient of the cost function
-"""
-def gradient(theta, X, y, N, L, S, K, gamma):
-    M = X.shape[0]
-
-    # The cost argument is a 1D-array that needs to be reshaped into the
-    # parameter matrix for each layer:
-    thetam = thetaMatrix(theta, N, L, S, K)
-
-    # Init auxiliary data structures
-    delta = [None] * L
+    # The outer products of the errors and the activations of all the samples, weighted, are
+    # accumulated by a single product per layer
+    err = backwardProp(y, a, thetam, L, N)
     D = [None] * L
-    delta[0] = np.zeros((S - 1, N))
-    D[0] = np.zeros((S - 1, N))
-    for l in range(1, L - 1):
-        delta[l] = np.zeros((S - 1, S))
-        D[l] = np.zeros((S - 1, S))
-    delta[L - 1] = np.zeros((K, S))
-    D[L - 1] = np.zeros((K, S))
+    for l in range(0, L):
+        D[l] = np.dot((w[:, None] * err[l + 1]).T, a[l]) / w.sum() + gamma * thetam[l]
 
-    for i in range(0, M):
-        a = forwardProp(X[i,:], thetam, L)
-        err = backwardProp(y[i], a, thetam, L, N)
-        for l in range(0, L):
-            # Notes about multiplying numpy arrays: err[l+1] is a 1-dimensional
-            # array so it needs to be made into a 2D array by putting inside [],
-            # and then transposed so it becomes a column vector.
-            prod = np.array([err[l+1]]).T * np.array([a[l]])
-            delta[l] = delta[l] + prod
+    return value, gradientArray(D, N, L, S, K)
 
-    for l in range(0, L):
-        D[l] = (1.0 / M) * delta[l] + gamma * thetam[l]
-    
-    grad = gradientArray(D, N, L, S, K)
-
-    global gcheck
-    if gcheck:
-        ok = True
-        size = theta.shape[0] 
-        epsilon = 1E-5
-        maxerr = 0.01
-        grad1 = np.zeros(size);
-        for i in range(0, size):
-            theta0 = np.copy(theta)
-            theta1 = np.copy(theta)
-
-            theta0[i] = theta0[i] - epsilon
-            theta1[i] = theta1[i] + epsilon
-
-            c0 = cost(theta0, X, y, N, L, S, K, gamma)
-            c1 = cost(theta1, X, y, N, L, S, K, gamma)
-            grad1[i] = (c1 - c0) / (2 * epsilon)
-            diff = abs(grad1[i] - grad[i])
-            if maxerr < diff:
-                print "Numerical and analytical gradients differ by",diff,"at argument",i,"/",size
-                ok = False
-        if ok:
-            print "Numerical and analytical gradients coincide within the given precision of",maxerr
-
-    return grad
-
-"""Adds the current cost to the vector of values
+"""Evaluates the cost function
 """
-def add_value(theta):
-    global params
-    global values
-    (X, y, N, L, S, K, gamma) = params
-    value = cost(theta, X, y, N, L, S, K, gamma);
-    values = np.append(values, [value])
+def cost(theta, X, y, w, N, L, S, K, gamma):
+    return cost_gradient(theta, X, y, w, N, L, S, K, gamma)[0]
+
+"""Computes the gradient of the cost function
+"""
+def gradient(theta, X, y, w, N, L, S, K, gamma):
+    return cost_gradient(theta, X, y, w, N, L, S, K, gamma)[1]
+
+"""Returns the initial parameters of the net, copying the weights of the first net in the
+parameters file of a model with one variable less into the given parameters. The input
+weights of the hidden units in both nets are matched by variable, with zero weights for the
+new variable, and the hidden units that the other net doesn't have start with zero weights
+into the next layer, so the net starts from the predictions of the other net
+
+: param theta: random initial parameters
+: param init_params: parameters file of the model with one variable less
+: param variables: variables of the model, with the outcome first
+"""
+def init_theta(theta, init_params, variables, N, L, S, K):
+    (theta1, N1, L1, S1, K1) = load_nets(init_params)[0]
+    if L1 != L or K1 != K:
+        print "The net in", init_params, "has a different number of layers, starting from random parameters"
+        return theta
+
+    theta = np.copy(theta)
+    # The matrices are views of theta
+    thetam = thetaMatrix(theta, N, L, S, K)
+    thetam1 = thetaMatrix(theta1, N1, L1, S1, K1)
+    U = min(S, S1) - 1
+    thetam[0][0:U, :] = map_coefficients(init_params, thetam1[0][0:U, :], variables)
+    for l in range(1, L):
+        rows = U if l < L - 1 else K
+        thetam[l][0:rows, 0:U + 1] = thetam1[l][0:rows, 0:U + 1]
+        thetam[l][:, U + 1:] = 0
+    return theta
 
 """
 Calculating the prediction rate by applying the trained model on the remaining fraction 
@@ -205,7 +184,10 @@ Trains the neural net given the specified parameters
                   (factor to calculate number of hidden units given the number of variables),
                   inv_reg (inverse of regularization coefficient), threshold 
                   (default convergence threshold), show (show minimization plot), debug 
-                  (gradient check)
+                  (gradient check), norm_file (training file whose ranges are used to
+                  normalize the variables, the training file by default), init_params
+                  (parameters file of a model with one variable less, to start from its
+                  weights)
 """
 def train(train_filename, param_filename, **kwparams):
     if "layers" in kwparams:
@@ -238,10 +220,6 @@ def train(train_filename, param_filename, **kwparams):
     else:
         debug = False
 
-    global gcheck
-    global params
-    global values
-    gcheck = debug
     K = 1
 
     if L < 1:
@@ -251,11 +229,12 @@ def train(train_filename, param_filename, **kwparams):
     L = L + 1
 
     # Loading data frame and initalizing dimensions
-    df = pd.read_csv(train_filename, delimiter=",", na_values="?")
+    df = load_frame(train_filename)
+    w = load_weights(train_filename)
     M = df.shape[0]
     N = df.shape[1]
     S = int(N * hf) # includes the bias unit on each layer, so the number of units is S-1
-    print "Number of data samples          :", M
+    print "Number of data samples          :", M, "(" + str(int(w.sum())) + " with weights)"
     print "Number of independent variables :", N-1
     print "Number of hidden layers         :", L-1
     print "Number of units per hidden layer:", S-1
@@ -272,30 +251,34 @@ def train(train_filename, param_filename, **kwparams):
 
     y = df.values[:,0]
     # Building the (normalized) design matrix
+    df0 = load_frame(kwparams["norm_file"]) if "norm_file" in kwparams else df
     X = np.ones((M, N))
     for j in range(1, N):
         # Computing i-th column. The pandas dataframe
         # contains all the values as numpy arrays that
         # can be handled individually:
         values = df.values[:, j]
-        minv = values.min()
-        maxv = values.max()
+        minv = df0.values[:, j].min()
+        maxv = df0.values[:, j].max()
         if maxv > minv:
             X[:, j] = np.clip((values - minv) / (maxv - minv), 0, 1)
         else:
             X[:, j] = 1.0 / M
 
     theta0 = 1 - 2 * np.random.rand(R)
-    params = (X, y, N, L, S, K, gamma)
+    if "init_params" in kwparams:
+        print "Starting from the weights in", kwparams["init_params"]
+        theta0 = init_theta(theta0, kwparams["init_params"], df.columns.tolist(), N, L, S, K)
+    # The cost and gradient share one pass through the net for each parameters
+    objective = Objective(cost_gradient, (X, y, w, N, L, S, K, gamma), debug)
 
     # http://docs.scipy.org/doc/scipy/reference/generated/scipy.optimize.fmin_bfgs.html
     print "Training Neural Network..."
-    values = np.array([])
-    theta = fmin_bfgs(cost, theta0, fprime=gradient, args=params, gtol=threshold, callback=add_value)
+    theta = fmin_bfgs(objective.cost, theta0, fprime=objective.gradient, gtol=threshold, callback=objective.callback)
     print "Done!"
 
     if show:
-        plt.plot(np.arange(values.shape[0]), values)
+        plt.plot(np.arange(len(objective.values)), objective.values)
         plt.xlabel("Step number")
         plt.ylabel("Cost function") 
         plt.show()
@@ -306,6 +289,24 @@ def train(train_filename, param_filename, **kwparams):
     print_theta(theta, N, L, S, K)
     save_theta(param_filename, theta, N, L, S, K)
 
+"""
+Pools the neural nets trained on each imputed dataset into an ensemble that averages their
+predicted probabilities. The parameters of all the nets are saved in the same file, separated
+by empty lines
+
+: param train_files: training files of the imputed datasets
+: param param_files: parameter files of the neural nets trained on them
+: param param_filename: name of file to store the pooled parameters
+: param kwparams: custom arguments used to train the neural nets
+"""
+def pool(train_files, param_files, param_filename, **kwparams):
+    with open(param_filename, "wb") as pfile:
+        for i in range(0, len(param_files)):
+            if 0 < i: pfile.write("\n")
+            with open(param_files[i], "rb") as ifile:
+                pfile.write(ifile.read())
+    print "Saved ensemble of", len(param_files), "neural nets"
+
 if __name__ == "__main__":
     parser = argparse.ArgumentParser()
     parser.add_argument("-t", "--train", nargs=1, default=["./models/test/training-data-completed.csv"],
@@ -320,15 +321,18 @@ if __name__ == "__main__":
                         help="Inverse of regularization coefficient, larger values represent lower penalty")
     parser.add_argument("-c", "--convergence", nargs=1, type=float, default=[1E-5],
                         help="Convergence threshold for the BFGS minimizer")
+    parser.add_argument("-i", "--init_params", nargs=1, default=[""],
+                        help="Parameters file of a model with one variable less, to start from its weights")
     parser.add_argument("-s", "--show", action="store_true",
                         help="Shows minimization plot")
     parser.add_argument("-d", "--debug", action="store_true",
                         help="Debugs gradient calculation")
     args = parser.parse_args()
+    kwargs = {"init_params":args.init_params[0]} if args.init_params[0] else {}
     train(args.train[0], args.param[0],
           layers=str(args.layers[0]),
           hfactor=str(args.hfactor[0]),
           inv_reg=str(args.inv_reg[0]),
           threshold=str(args.convergence[0]),
           show=str(args.show),
-          debug=str(args.debug))
+          debug=str(args.debug), **kwargs)
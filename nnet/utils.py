@@ -55,43 +55,58 @@ def gradientArray(gmatrix, N, L, S, K):
 def sigmoid(v):
     return 1 / (1 + np.exp(-v))
 
-"""Performs forward propagation
+"""Performs forward propagation of all the rows of the design matrix X at once. Returns the
+activations of each layer as matrices with one row per sample, including the bias column in
+the input and hidden layers
 """
-def forwardProp(x, thetam, L):
+def forwardProp(X, thetam, L):
     a = [None] * (L + 1)
-    a[0] = x
+    a[0] = X
     for l in range(0, L):
-        z = np.dot(thetam[l], a[l])
-        res = sigmoid(z)
-        a[l + 1] = np.insert(res, 0, 1) if l < L - 1 else res
+        z = np.dot(a[l], thetam[l].T)
+        if l < L - 1:
+            # The bias column is allocated with the activations
+            a[l + 1] = np.empty((z.shape[0], z.shape[1] + 1))
+            a[l + 1][:, 0] = 1
+            a[l + 1][:, 1:] = sigmoid(z)
+        else:
+            a[l + 1] = sigmoid(z)
     return a
 
-"""Performs backward propagation
+"""Performs backward propagation of the errors of all the samples at once, given the outputs y
+and the activations computed by forwardProp. Returns the errors of each layer as matrices with
+one row per sample
 """
 def backwardProp(y, a, thetam, L, N):
     err = [None] * (L + 1)
-    err[L] = a[L] - y
-    for l in range(L - 1, 0, -1):  
-        backp = np.dot(np.transpose(thetam[l]), err[l + 1])
-        deriv = np.multiply(a[l], 1 - a[l])
-        err[l] = np.delete(np.multiply(backp, deriv), 0)
-    err[0] = np.zeros(N);
+    err[L] = a[L] - y.reshape(a[L].shape[0], -1)
+    for l in range(L - 1, 0, -1):
+        # The bias units don't propagate errors backwards
+        backp = np.dot(err[l + 1], thetam[l][:, 1:])
+        err[l] = backp * a[l][:, 1:] * (1 - a[l][:, 1:])
+    err[0] = np.zeros((a[0].shape[0], N))
     return err
 
-"""Computes a prediction (in the form of probabilities) for the given data vector
+"""Computes a prediction (in the form of probabilities) for the given data vector, or for each
+row of the given design matrix
 """
 def predict(x, theta, N, L, S, K):
     thetam = thetaMatrix(theta, N, L, S, K)
-    a = forwardProp(x, thetam, L) 
+    a = forwardProp(np.atleast_2d(x), thetam, L)
     h = a[L]
-    return h
+    return h[0] if np.ndim(x) == 1 else h
 
-"""Return a function that gives a prediction from a design matrix row
+"""Loads the nets in a parameters file, separated by empty lines. Returns a list with a tuple
+(theta, N, L, S, K) for each net
 """
-def gen_predictor(params_filename="./models/test/nnet-params"):
+def load_nets(params_filename):
+    nets = []
     with open(params_filename, "rb") as pfile:
         i = 0
         for line in pfile.readlines():
+            if not line.strip():
+                i = 0
+                continue
             [name, value] = line.strip().split(":")
             if i == 0:
                 N = int(value.strip()) + 1
@@ -103,15 +118,23 @@ def gen_predictor(params_filename="./models/test/nnet-params"):
                 K = int(value.strip())
                 R = (S - 1) * N + (L - 2) * (S - 1) * S + K * S
                 theta = np.ones(R)
+                nets.append((theta, N, L, S, K))
             else:
                 idx = [int(s.strip().split(" ")[1]) for s in name.split(",")]
                 n = linear_index(idx, N, L, S, K)
                 theta[n] = float(value.strip())
             i = i + 1
+    return nets
+
+"""Return a function that gives a prediction from a design matrix row. If the parameters file
+contains several nets (separated by empty lines), the prediction is the average of their
+predictions
+"""
+def gen_predictor(params_filename="./models/test/nnet-params"):
+    nets = load_nets(params_filename)
 
     def predictor(X):
-        scores = []
-        for i in range(0, len(X)):
-            scores.extend(predict(X[i,:], theta, N, L, S, K))
-        return scores
+        # All the rows are propagated through each net at once
+        p = [predict(X, theta, N, L, S, K)[:, 0] for (theta, N, L, S, K) in nets]
+        return np.mean(p, axis=0).tolist()
     return predictor
@@ -64,7 +64,7 @@ mdl_count = 0
 empty_count = 0
 for dir_name, subdir_list, file_list in os.walk(base_dir):
     if file_list:
-        train_files = glob.glob(dir_name + "/training-data-completed-*.csv")
+        train_files = glob.glob(dir_name + "/training-data-completed-*.csv") + glob.glob(dir_name + "/training-data-completed-*.npz")
         var_file = os.path.exists(dir_name + "/variables.txt")
         if train_files or var_file:
             mdl_count += 1
@@ -8,6 +8,7 @@ import argparse, sys, os
 from utils import gen_predictor
 sys.path.append(os.path.abspath('./utils'))
 from evaluate import design_matrix, run_eval, get_misses
+from splits import load_index
 
 def prefix():
     return "scikit_lreg"
@@ -28,11 +29,7 @@ def eval(test_filename, train_filename, param_filename, method, **kwparams):
     return run_eval(probs, y, method, **kwparams)
 
 def miss(test_filename, train_filename, param_filename):
-    fn = test_filename.replace("-data", "-index")
-    meta = None
-    if os.path.exists(fn):
-        with open(fn, "r") as idxfile:
-            meta = idxfile.readlines()
+    meta = load_index(test_filename.replace("-data", "-index"))
 
     X, y, df = design_matrix(test_filename, train_filename, get_df=True)
     predictor = gen_predictor(param_filename)
@@ -5,12 +5,17 @@ http://scikit-learn.org/stable/modules/generated/sklearn.linear_model.LogisticRe
 @copyright: The Broad Institute of MIT and Harvard 2015
 """
 
-import sys, os, argparse
+import sys, os, argparse, copy
 import pandas as pd
 import pickle
+import numpy as np
 from sklearn import linear_model
 sys.path.append(os.path.abspath('./utils'))
 from evaluate import design_matrix
+from splits import load_frame, load_weights
+from regpath import path_values, validation_rows, validation_loss
+from modelindex import map_coefficients
+from utils import best_classifier
 
 def prefix():
     return "scikit_lreg"
@@ -18,6 +23,9 @@ def prefix():
 def title():
     return "Logistic Regression Classifier from scikit-learn"
 
+def handles_missing():
+    return False
+
 """
 Trains the logistic regression classifier given the specified parameters
 
@@ -25,7 +33,10 @@ Trains the logistic regression classifier given the specified parameters
 : param param_filename: name of file to store resulting parameters
 : param kwparams: custom arguments for logistic regression. Same as listed in
                   http://scikit-learn.org/stable/modules/generated/sklearn.linear_model.LogisticRegression.html
-                  with the exception of random_state (not supported)
+                  with the exception of random_state (not supported). inv_reg can be given as
+                  start:stop:num for a regularization path (see regpath), with valid_frac and
+                  seed for its validation fold. init_params is the parameters file of a model
+                  with one variable less, to start from its coefficients
 """
 def train(train_filename, param_filename, **kwparams):
     if "penalty" in kwparams:
@@ -38,8 +49,10 @@ def train(train_filename, param_filename, **kwparams):
     else:
         dual = False
 
+    inv_regs = None
     if "inv_reg" in kwparams:
-        C = float(kwparams["inv_reg"])
+        inv_regs = path_values(kwparams["inv_reg"])
+        C = float(kwparams["inv_reg"]) if inv_regs is None else inv_regs[0]
     else:
         C = 1.0
 
@@ -68,8 +81,22 @@ def train(train_filename, param_filename, **kwparams):
     else:
         tol = 0.0001
 
+    if "solver" in kwparams:
+        solver = kwparams["solver"]
+    elif inv_regs is not None or "init_params" in kwparams:
+        # liblinear cannot start from a previous solution
+        solver = "saga" if penalty == "l1" else "lbfgs"
+    else:
+        solver = "liblinear"
+
     # Separating target from inputs
-    X, y = design_matrix(train_filename=train_filename)
+    if "norm_file" in kwparams:
+        # Variables normalized with their ranges in another training file
+        X, y = design_matrix(train_filename, kwparams["norm_file"])
+    else:
+        X, y = design_matrix(train_filename=train_filename)
+    # Rows of imputed training sets can stand for several identical rows
+    w = load_weights(train_filename)
 
     print "Training Logistic Regression Classifier..."
 
@@ -77,10 +104,40 @@ def train(train_filename, param_filename, **kwparams):
     clf = linear_model.LogisticRegression(penalty=penalty, dual=dual, C=C,
                                           fit_intercept=fit_intercept, intercept_scaling=intercept_scaling,
                                           class_weight=class_weight, random_state=random_state,
-                                          tol=tol)
-
-    # Fitting LR classifier
-    clf.fit(X, y)
+                                          tol=tol, solver=solver, warm_start=inv_regs is not None or "init_params" in kwparams)
+
+    if "init_params" in kwparams:
+        # The new variable starts with a zero coefficient
+        print "Starting from the coefficients in", kwparams["init_params"]
+        init = best_classifier(kwparams["init_params"])
+        clf.coef_ = map_coefficients(kwparams["init_params"], init.coef_, load_frame(train_filename).columns.tolist())
+        clf.intercept_ = np.copy(init.intercept_)
+
+    if inv_regs is not None:
+        # The validation losses come from the path fitted without the validation fold, and
+        # the classifiers from the path fitted on all the rows
+        valid = validation_rows(train_filename, kwparams)
+        fit = ~valid
+        vclf = copy.deepcopy(clf)
+        losses = []
+        for C in inv_regs:
+            vclf.C = C
+            vclf.fit(X[fit], y[fit], sample_weight=w[fit])
+            losses.append(validation_loss(y[valid], vclf.predict_proba(X[valid])[:, 1], w[valid]))
+        clfs = []
+        for C in inv_regs:
+            clf.C = C
+            clf.fit(X, y, sample_weight=w)
+            clfs.append(copy.deepcopy(clf))
+        best = np.argmin(losses)
+        print "Validation loss along the regularization path:"
+        for k in range(0, len(inv_regs)):
+            print "{:10.5f} {:10.5f}{:s}".format(inv_regs[k], losses[k], " *" if k == best else "")
+        clf = {"inv_reg":inv_regs.tolist(), "loss":losses, "clfs":clfs}
+    else:
+        # Fitting LR classifier
+        clf.fit(X, y, sample_weight=w)
+        print "Number of iterations:", np.max(clf.n_iter_)
 
     # Pickle and save
     f = open(param_filename, 'wb')
@@ -88,6 +145,28 @@ def train(train_filename, param_filename, **kwparams):
 
     print "Done."
 
+"""
+Pools the logistic regressions trained on each imputed dataset with Rubin's rules, averaging
+their coefficients
+
+: param train_files: training files of the imputed datasets
+: param param_files: parameter files of the classifiers trained on them
+: param param_filename: name of file to store the pooled classifier
+: param kwparams: custom arguments used to train the classifiers
+"""
+def pool(train_files, param_files, param_filename, **kwparams):
+    # With a regularization path, the classifier with the lowest validation loss
+    clfs = [best_classifier(fn) for fn in param_files]
+    clf = clfs[0]
+    clf.coef_ = np.mean([c.coef_ for c in clfs], axis=0)
+    clf.intercept_ = np.mean([c.intercept_ for c in clfs], axis=0)
+
+    # Pickle and save
+    f = open(param_filename, 'wb')
+    pickle.dump(clf, f)
+
+    print "Pooled", len(clfs), "classifiers"
+
 if __name__ == "__main__":
     parser = argparse.ArgumentParser()
     parser.add_argument("-t", "--train", nargs=1, default=["./models/test/training-data-completed.csv"],
@@ -98,8 +177,8 @@ if __name__ == "__main__":
                         help="Used to specify the norm used in the penalization")
     parser.add_argument("-d", "--dual", nargs=1, default=["False"],
                         help="Dual or primal formulation")
-    parser.add_argument("-c", "--inv_reg", nargs=1, type=float, default=[1.0],
-                        help="Inverse of regularization strength; must be a positive floa")
+    parser.add_argument("-c", "--inv_reg", nargs=1, default=["1.0"],
+                        help="Inverse of regularization strength; must be a positive float, or start:stop:num for a regularization path")
     parser.add_argument("-f", "--fit_intercept", nargs=1, default=["True"],
                         help="Specifies if a constant should be added the decision function")
     parser.add_argument("-s", "--intercept_scaling", nargs=1, type=float, default=[1.0],
@@ -110,14 +189,17 @@ if __name__ == "__main__":
                         help="The seed of the pseudo random number generator to use when shuffling the data")
     parser.add_argument("-l", "--tol", nargs=1, type=float, default=[0.0001],
                         help="The seed of the pseudo random number generator to use when shuffling the data")
+    parser.add_argument("-i", "--init_params", nargs=1, default=[""],
+                        help="Parameters file of a model with one variable less, to start from its coefficients")
 
     args = parser.parse_args()
+    kwargs = {"init_params":args.init_params[0]} if args.init_params[0] else {}
     train(args.train[0], args.param[0],
           penalty=args.penalty[0],
           dual=args.dual[0],
-          C=args.inv_reg[0],
+          inv_reg=args.inv_reg[0],
           fit_intercept=args.fit_intercept[0],
           intercept_scaling=args.intercept_scaling[0],
           class_weight=args.class_weight[0],
           random_state=args.random_state[0],
-          tol=args.tol[0])
+          tol=args.tol[0], **kwargs)
@@ -8,10 +8,20 @@ import numpy as np
 import pandas as pd
 import pickle
 
+"""Returns the classifier in a parameters file. A regularization path is saved as a dictionary
+with the lists of inverse regularization coefficients (inv_reg), validation losses (loss) and
+classifiers (clfs), and the classifier with the lowest validation loss is returned
+"""
+def best_classifier(params_filename):
+    clf = pickle.load(open(params_filename, "rb" ) )
+    if isinstance(clf, dict):
+        clf = clf["clfs"][np.argmin(clf["loss"])]
+    return clf
+
 """Return a function that gives a prediction from a design matrix row
 """
 def gen_predictor(params_filename="./models/test/scikit_lreg-params"):
-    clf = pickle.load(open(params_filename, "rb" ) )
+    clf = best_classifier(params_filename)
 
     def predictor(X):
         scores = clf.predict_proba(X)
@@ -0,0 +1,119 @@
+"""
+Trains the Logistic Regression classifier from scikit-learn with missing indicators: the
+missing values of each variable are replaced by the mean of its observed values, and an
+indicator variable for the missing values is added to the inputs, so the classifier can be
+trained on the training sets with missing values, created with the imputation method none:
+http://scikit-learn.org/stable/modules/generated/sklearn.linear_model.LogisticRegression.html
+
+@copyright: The Broad Institute of MIT and Harvard 2015
+"""
+
+import sys, os, argparse
+import pickle
+import numpy as np
+from sklearn import linear_model
+from utils import indicator_matrix
+sys.path.append(os.path.abspath('./utils'))
+from evaluate import design_matrix
+from splits import load_weights, save_ensemble
+
+def prefix():
+    return "scikit_milreg"
+
+def title():
+    return "Logistic Regression with Missing Indicators from scikit-learn"
+
+def handles_missing():
+    return True
+
+"""
+Trains the logistic regression classifier given the specified parameters
+
+: param train_filename: name of file containing training set, the missing values can be kept
+: param param_filename: name of file to store resulting parameters
+: param kwparams: custom arguments for logistic regression: penalty, inv_reg (inverse of
+                  regularization strength), class_weight, tol
+"""
+def train(train_filename, param_filename, **kwparams):
+    if "penalty" in kwparams:
+        penalty = kwparams["penalty"]
+    else:
+        penalty = "l2"
+
+    if "inv_reg" in kwparams:
+        C = float(kwparams["inv_reg"])
+    else:
+        C = 1.0
+
+    if "class_weight" in kwparams and kwparams["class_weight"]:
+        class_weight = kwparams["class_weight"]
+    else:
+        class_weight = None
+
+    if "tol" in kwparams:
+        tol = float(kwparams["tol"])
+    else:
+        tol = 0.0001
+
+    # Separating target from inputs
+    if "norm_file" in kwparams:
+        # Variables normalized with their ranges in another training file
+        X, y = design_matrix(train_filename, kwparams["norm_file"])
+    else:
+        X, y = design_matrix(train_filename=train_filename)
+    # Rows of imputed training sets can stand for several identical rows
+    w = load_weights(train_filename)
+
+    # Missing values are replaced by the weighted mean of the observed ones, and the variables
+    # with missing values get an indicator
+    missing = np.isnan(X)
+    observed = np.dot(w, ~missing)
+    fill = np.where(0 < observed, np.dot(w, np.where(missing, 0, X)) / np.maximum(observed, 1e-12), 0)
+    indicators = np.nonzero(missing.any(axis=0))[0]
+    print "Training Logistic Regression Classifier with", len(indicators), "missing indicators..."
+
+    # Initializing LR classifier
+    clf = linear_model.LogisticRegression(penalty=penalty, C=C, class_weight=class_weight,
+                                          tol=tol, solver="liblinear")
+
+    # Fitting LR classifier
+    clf.fit(indicator_matrix(X, fill, indicators), y, sample_weight=w)
+
+    # Pickle and save
+    f = open(param_filename, 'wb')
+    pickle.dump({"clf":clf, "fill":fill, "indicators":indicators}, f)
+
+    print "Done."
+
+"""
+Pools the classifiers trained on each imputed dataset into an ensemble that averages their
+predicted probabilities, saved as a list of classifiers
+
+: param train_files: training files of the imputed datasets
+: param param_files: parameter files of the classifiers trained on them
+: param param_filename: name of file to store the pooled classifiers
+: param kwparams: custom arguments used to train the classifiers
+"""
+def pool(train_files, param_files, param_filename, **kwparams):
+    print "Pooled", save_ensemble(param_files, param_filename), "classifiers"
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-t", "--train", nargs=1, default=["./models/test/training-data-completed.csv"],
+                        help="File containing training set")
+    parser.add_argument("-p", "--param", nargs=1, default=["./models/test/scikit_milreg-params"],
+                        help="Output file to save the parameters of the logistic regression classifier")
+    parser.add_argument("-y", "--penalty", nargs=1, default=["l2"],
+                        help="Used to specify the norm used in the penalization")
+    parser.add_argument("-c", "--inv_reg", nargs=1, type=float, default=[1.0],
+                        help="Inverse of regularization strength; must be a positive float")
+    parser.add_argument("-w", "--class_weight", nargs=1, default=[""],
+                        help="Over-/undersamples the samples of each class according to the given weights")
+    parser.add_argument("-l", "--tol", nargs=1, type=float, default=[0.0001],
+                        help="Tolerance for stopping criteria")
+    args = parser.parse_args()
+    train(args.train[0], args.param[0],
+          penalty=args.penalty[0],
+          inv_reg=str(args.inv_reg[0]),
+          class_weight=args.class_weight[0],
+          tol=str(args.tol[0]))
@@ -0,0 +1,33 @@
+"""
+Utility functions for the logistic regression classifier with missing indicators.
+
+@copyright: The Broad Institute of MIT and Harvard 2015
+"""
+
+import numpy as np
+import pickle
+
+"""Returns the design matrix with the missing values replaced by the fill values, and an
+indicator column for each of the given variables, which is 1 in the rows where it is missing
+
+:param X: design matrix, with NaN in the missing values
+:param fill: value used for the missing values of each column
+:param indicators: indices of the columns with indicators
+"""
+def indicator_matrix(X, fill, indicators):
+    missing = np.isnan(X)
+    return np.column_stack((np.where(missing, fill, X), missing[:, indicators].astype(np.float64)))
+
+"""Return a function that gives a prediction from a design matrix row
+"""
+def gen_predictor(params_filename="./models/test/scikit_milreg-params"):
+    model = pickle.load(open(params_filename, "rb" ) )
+
+    def predictor(X):
+        # Pooled classifiers are saved as a list, and their probabilities averaged
+        models = model if isinstance(model, list) else [model]
+        scores = np.mean([m["clf"].predict_proba(indicator_matrix(X, m["fill"], m["indicators"])) for m in models], axis=0)
+        probs = [x[1] for x in scores]
+        return probs
+
+    return predictor
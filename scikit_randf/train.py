@@ -11,6 +11,7 @@ import pickle
 from sklearn import ensemble
 sys.path.append(os.path.abspath('./utils'))
 from evaluate import design_matrix
+from splits import load_weights, save_ensemble
 
 def prefix():
     return "scikit_randf"
@@ -18,6 +19,9 @@ def prefix():
 def title():
     return "Random Forest from scikit-learn"
 
+def handles_missing():
+    return False
+
 """
 Trains the Random Forest classifier given the specified parameters
 
@@ -102,7 +106,13 @@ def train(train_filename, param_filename, **kwparams):
         class_weight = None
 
     # Separating target from inputs
-    X, y = design_matrix(train_filename=train_filename)
+    if "norm_file" in kwparams:
+        # Variables normalized with their ranges in another training file
+        X, y = design_matrix(train_filename, kwparams["norm_file"])
+    else:
+        X, y = design_matrix(train_filename=train_filename)
+    # Rows of imputed training sets can stand for several identical rows
+    w = load_weights(train_filename)
 
     print "Training Random Forest Classifier..."
     clf = ensemble.RandomForestClassifier(n_estimators=n_estimators, criterion=criterion,
@@ -116,7 +126,7 @@ def train(train_filename, param_filename, **kwparams):
 #                                           class_weight=class_weight)
 
     # Fitting LR classifier
-    clf.fit(X, y)
+    clf.fit(X, y, sample_weight=w)
 
     # Pickle and save
     f = open(param_filename, 'wb')
@@ -124,6 +134,18 @@ def train(train_filename, param_filename, **kwparams):
 
     print "Done."
 
+"""
+Pools the classifiers trained on each imputed dataset into an ensemble that averages their
+predicted probabilities, saved as a list of classifiers
+
+: param train_files: training files of the imputed datasets
+: param param_files: parameter files of the classifiers trained on them
+: param param_filename: name of file to store the pooled classifiers
+: param kwparams: custom arguments used to train the classifiers
+"""
+def pool(train_files, param_files, param_filename, **kwparams):
+    print "Pooled", save_ensemble(param_files, param_filename), "classifiers"
+
 if __name__ == "__main__":
     parser = argparse.ArgumentParser()
     parser.add_argument("-t", "--train", nargs=1, default=["./models/test/training-data-completed.csv"],
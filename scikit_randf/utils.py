@@ -14,7 +14,11 @@ def gen_predictor(params_filename="./models/test/scikit_randf-params"):
     clf = pickle.load(open(params_filename, "rb" ) )
 
     def predictor(X):
-        scores = clf.predict_proba(X)
+        # Pooled classifiers are saved as a list, and their probabilities averaged
+        if isinstance(clf, list):
+            scores = np.mean([c.predict_proba(X) for c in clf], axis=0)
+        else:
+            scores = clf.predict_proba(X)
         probs = [x[1] for x in scores]
         return probs
 
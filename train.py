@@ -1,14 +1,51 @@
 """
 Trains all the predictors and saves the parameters to the data folder for later 
-evaluation.
+evaluation. In pooled mode, a predictor is trained on each imputed dataset of the training
+sets separately, in parallel processes, and the predictors are pooled into a single set of
+parameters by the pool function of the predictor module (Rubin's rules for the logistic
+regressions, averaging of the predicted probabilities for the others). With warm starts, the
+predictor of each set starts from the parameters of the best model with one variable less in
+the index of completed models (see utils/modelindex.py), for the predictors that support it
+(lreg, scikit_lreg and nnet). The predictors that don't handle missing values are not trained
+on sets created without imputation (imputation method none).
 
 @copyright: The Broad Institute of MIT and Harvard 2015
 """
 
 import sys, os, argparse, glob
 from importlib import import_module
+from multiprocessing import Pool
+sys.path.append(os.path.abspath('./utils'))
+from splits import completed_files, split_frames, binary_file, load_status
+from imputation import rows_filename
+from makesets import load_variables
+from modelindex import find_parent
 
-def train(base_dir, mdl_name, predictor, **kwparams):
+"""Trains the predictor on one imputed dataset, used by the worker processes in pooled mode
+
+:param task: tuple with the training file, the parameter file and the custom arguments
+"""
+def train_frame(task):
+    train_filename, param_filename, kwparams = task
+    module.train(train_filename=train_filename, param_filename=param_filename, **kwparams)
+
+"""Returns the custom arguments of the predictor for the given set, with the parameters file of
+the model to start from, if it has parameters for that set
+
+:param kwparams: custom arguments of the predictor
+:param base_dir: base directory
+:param parent: name of the model to start from, None for no warm start
+:param id: id of the set
+"""
+def set_params(kwparams, base_dir, parent, id):
+    params = dict(kwparams)
+    if parent:
+        init_params = os.path.join(base_dir, "models", parent, module.prefix() + "-params-" + str(id))
+        if os.path.exists(init_params): params["init_params"] = init_params
+    return params
+
+def train(base_dir, mdl_name, predictor, pooled=False, num_jobs=1, warm_start=False, **kwparams):
+    global module
     model_dir =  os.path.join(base_dir, "models", mdl_name)
 
     module_path = os.path.abspath(predictor)
@@ -16,7 +53,15 @@ def train(base_dir, mdl_name, predictor, **kwparams):
     sys.path.insert(0, module_path)
     module = import_module(module_filename)
 
-    train_files = glob.glob(model_dir + "/training-data-completed-*.csv")
+    train_files = completed_files(model_dir)
+
+    if not module.handles_missing():
+        # The sets created with the imputation method none keep the missing values
+        status = load_status(model_dir)
+        ids = [str(id) for id in sorted(status.keys()) if status[id][0] == "none"]
+        if ids:
+            print "Error: the " + module.title() + " predictor doesn't handle missing values, and the training sets " + ", ".join(ids) + " of model " + mdl_name + " were not imputed (imputation method none)"
+            exit(1)
 
     # remove old parameters
     param_files = glob.glob(model_dir + "/" + module.prefix() + "-params-*")
@@ -26,15 +71,73 @@ def train(base_dir, mdl_name, predictor, **kwparams):
             os.remove(file)
         print "Done."
 
+    parent = None
+    if warm_start:
+        parent = find_parent(base_dir, module.prefix(), load_variables(model_dir)[1:])
+        if parent:
+            print "Starting from the parameters of model " + parent + "..."
+        else:
+            print "No model with one variable less in the index, starting from random parameters"
+
+    if pooled:
+        train_pooled(model_dir, train_files, num_jobs, base_dir, parent, **kwparams)
+        return
+
     print "Training " + module.title() + " predictor..."
     for tfile in train_files:
         print "Training set: " + tfile + "..."
         start_idx = tfile.find("training-data-completed-") + len("training-data-completed-")
         stop_idx = tfile.find(".csv")
         id = tfile[start_idx:stop_idx]
-        module.train(train_filename=tfile, param_filename=model_dir + "/" + module.prefix() + "-params-" + str(id), **kwparams)
+        module.train(train_filename=tfile, param_filename=model_dir + "/" + module.prefix() + "-params-" + str(id), **set_params(kwparams, base_dir, parent, id))
     print "Done."
 
+"""Trains the predictor on each imputed dataset of the training sets, and pools the predictors
+of each set
+
+:param model_dir: directory of the model
+:param train_files: imputed training sets
+:param num_jobs: number of predictors trained in parallel
+:param base_dir: base directory
+:param parent: name of the model to start the predictors from, None for no warm start
+:param kwparams: custom arguments of the predictor
+"""
+def train_pooled(model_dir, train_files, num_jobs, base_dir="./", parent=None, **kwparams):
+    tasks = []
+    groups = []
+    try:
+        for tfile in train_files:
+            start_idx = tfile.find("training-data-completed-") + len("training-data-completed-")
+            stop_idx = tfile.find(".csv")
+            id = tfile[start_idx:stop_idx]
+            frame_files = split_frames(tfile, model_dir + "/temp-data-frame-" + id + "-")
+            frame_params = [model_dir + "/temp-" + module.prefix() + "-params-" + id + "-" + str(k) for k in range(0, len(frame_files))]
+            # All the predictors of a set use the normalization of the whole set, which is
+            # used when evaluating the pooled predictor
+            params = set_params(kwparams, base_dir, parent, id)
+            params["norm_file"] = tfile
+            tasks.extend([(frame_files[k], frame_params[k], params) for k in range(0, len(frame_files))])
+            groups.append((id, frame_files, frame_params, params))
+
+        print "Training " + module.title() + " predictor on " + str(len(tasks)) + " imputed datasets in " + str(num_jobs) + " processes..."
+        if 1 < num_jobs:
+            pool = Pool(num_jobs)
+            pool.map(train_frame, tasks)
+            pool.close()
+            pool.join()
+        else:
+            for task in tasks: train_frame(task)
+
+        for id, frame_files, frame_params, params in groups:
+            print "Pooling predictors of training set " + id + "..."
+            module.pool(frame_files, frame_params, model_dir + "/" + module.prefix() + "-params-" + id, **params)
+        print "Done."
+    finally:
+        for id, frame_files, frame_params, params in groups:
+            for fn in frame_files + frame_params:
+                for temp in [binary_file(fn), rows_filename(fn), fn]:
+                    if os.path.exists(temp): os.remove(temp)
+
 if __name__ == "__main__":
     parser = argparse.ArgumentParser()
     # Evaluate the model with given method(s)
@@ -42,6 +145,12 @@ if __name__ == "__main__":
                         help="Base directory")
     parser.add_argument('-N', '--name', nargs=1, default=["test"],
                         help="Model name")
+    parser.add_argument('-P', '--pooled', action="store_true",
+                        help="Train on each imputed dataset separately and pool the predictors")
+    parser.add_argument('-j', '--jobs', type=int, nargs=1, default=[1],
+                        help="Number of predictors trained in parallel in pooled mode")
+    parser.add_argument('-W', '--warm_start', action="store_true",
+                        help="Start from the parameters of the best model with one variable less in the index of completed models")
     parser.add_argument('pred', nargs=1, default=["nnet"],
                         help="Folder containing predictor to evaluate")
     parser.add_argument('vars', nargs='*')
@@ -50,4 +159,4 @@ if __name__ == "__main__":
     for var in args.vars:
         [k, v] = var.split("=")
         kwargs[k] = v
-    train(args.base_dir[0], args.name[0], args.pred[0], **kwargs)
+    train(args.base_dir[0], args.name[0], args.pred[0], args.pooled, args.jobs[0], args.warm_start, **kwargs)
@@ -1,9 +1,10 @@
 import argparse, glob, os, sys, csv
 from importlib import import_module
 import numpy as np
+from splits import testing_files, frame_exists
 
 def aggregate_model(mdl_dir, out_file, module):
-    test_files = glob.glob(mdl_dir + "/testing-data-*.csv")
+    test_files = testing_files(mdl_dir)
     all_prob = []
     all_y = []
     for testfile in test_files:
@@ -12,7 +13,7 @@ def aggregate_model(mdl_dir, out_file, module):
         id = testfile[start_idx:stop_idx]
         pfile = mdl_dir + "/" + module.prefix() + "-params-" + str(id)
         trainfile = mdl_dir + "/training-data-completed-" + str(id) + ".csv"
-        if os.path.exists(testfile) and os.path.exists(pfile) and os.path.exists(trainfile):
+        if frame_exists(testfile) and os.path.exists(pfile) and frame_exists(trainfile):
             p, y = module.pred(testfile, trainfile, pfile)
             all_prob.extend(p)
             all_y.extend(y)
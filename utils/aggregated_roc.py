@@ -63,7 +63,7 @@ for pred_name in pred_names:
 count = 0
 for dir_name, subdir_list, file_list in os.walk(os.path.join(base_dir, "models")):
     if file_list:
-        train_files = glob.glob(dir_name + "/training-data-completed-*.csv")
+        train_files = glob.glob(dir_name + "/training-data-completed-*.csv") + glob.glob(dir_name + "/training-data-completed-*.npz")
         var_file = os.path.exists(dir_name + "/variables.txt")
         if train_files or var_file:
             count += 1
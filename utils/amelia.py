@@ -8,8 +8,8 @@ http://gking.harvard.edu/amelia
 """
 
 import os, argparse
-import rpy2.robjects as robjects
-from imputation import load_variables, load_bounds, aggregate_files
+import rpool
+from imputation import load_variables, load_bounds, load_data, write_frames, temp_prefix, generate_frames
 
 """Creates a complete training set by imputing missing values using Amelia
 
@@ -17,7 +17,10 @@ from imputation import load_variables, load_bounds, aggregate_files
 :param out_filename: output file with only complete rows
 :param kwparams: optional arguments for Amelia: num_imputed (number of imputed dataframes),
                  num_resamples (number of resamples), in_check (enable/disable input check),
-                 gen_plots (enable/disable imputation plots)
+                 gen_plots (enable/disable imputation plots), seed (seed of R's random
+                 generator), debug (also save the data and the imputed datasets in
+                 temporary files), and the options of the adaptive number of imputed
+                 dataframes (see imputation.adaptive_options)
 """
 def process(in_filename, out_filename, **kwparams):
     if "num_imputed" in kwparams:
@@ -45,6 +48,11 @@ def process(in_filename, out_filename, **kwparams):
     else:
         gen_plots = False
 
+    if "debug" in kwparams:
+        debug = True if kwparams["debug"].lower() == "true" else False
+    else:
+        debug = False
+
     var_names, var_types = load_variables(in_filename)
     bounds = load_bounds(in_filename, var_names, var_types)
     nom_rstr = ''
@@ -74,45 +82,61 @@ def process(in_filename, out_filename, **kwparams):
             min_str = min_str + str(bounds[i][0])
             max_str = max_str + str(bounds[i][1])
     bds_str = idx_str + ", " + min_str + ", " + max_str
-    robjects.r('num_bounds <- matrix(c(' + bds_str + '), nrow=' + str(num_vars) +', ncol=3)')
+    commands = ['num_bounds <- matrix(c(' + bds_str + '), nrow=' + str(num_vars) +', ncol=3)']
 
     print "Generating " + str(num_imputed) + " imputed datasets with Amelia..."
-    robjects.r('library(Amelia)')
-    robjects.r('trdat <- read.table("' + in_filename + '", sep=",", header=TRUE, na.strings="?")')
-    robjects.r('nom_vars = c(' + nom_rstr + ')')
+    commands.append('library(Amelia)')
+    commands.append('nom_vars = c(' + nom_rstr + ')')
 
     if incheck_opt:
          incheck_str = "TRUE"
     else:
          incheck_str = "FALSE"
 
-    dir,_ = os.path.split(in_filename)
-    tmp_prefix = os.path.join(dir, "temp-data-amelia-")
-
-    robjects.r('imdat <- amelia(trdat, m=' + str(num_imputed) + ', noms=nom_vars, bounds=num_bounds, max.resample = ' + str(resamples_opt) + ', incheck=' + incheck_str + ', emburn = c(5,' + str(max_iter) +'))')
-    robjects.r('write.amelia(obj=imdat, file.stem="' + tmp_prefix + '", format="csv", row.names=FALSE)')
-    
-    if gen_plots:
-        if not os.path.exists("./out"): os.makedirs("./out")
-        robjects.r('pdf("./out/missingness.pdf", useDingbats=FALSE)')
-        robjects.r('missmap(imdat)')
-        robjects.r('dev.off()')
-        for i in range(0, len(var_names)):
-            name = var_names[i]
-            # Compare observed density with imputed density
-            robjects.r('pdf("./out/obs-vs-imp-' + name+ '.pdf", useDingbats=FALSE)')
-            robjects.r('compare.density(imdat, var = "' + name + '")')
-            robjects.r('dev.off()')
-            if var_types[name] != "category":
-                # Numerical variable, we can generate the quality of imputation plot
-                robjects.r('pdf("./out/quality-imp-' + name+ '.pdf", useDingbats=FALSE)')
-                robjects.r('overimpute(imdat, var = "' + name + '")')
-                robjects.r('dev.off()')
-        print "Saved Amelia plots to out folder"
+    tmp_prefix = temp_prefix(in_filename, "amelia")
+    data = load_data(in_filename, var_names)
+
+    # Runs Amelia in R and returns the given number of new imputed datasets. Each run after the
+    # first one starts from another seed, and the input data, imputed datasets and plots are saved
+    # only in the first run
+    def run_amelia(start, count):
+        run_commands = list(commands)
+        if debug and start == 0:
+            run_commands.append('write.csv(trdat, file="' + tmp_prefix + 'input.csv", row.names=FALSE)')
+
+        if "seed" in kwparams:
+            run_commands.append('set.seed(' + str(int(kwparams["seed"]) + start) + ')')
+        run_commands.append('imdat <- amelia(trdat, m=' + str(count) + ', noms=nom_vars, bounds=num_bounds, max.resample = ' + str(resamples_opt) + ', incheck=' + incheck_str + ', emburn = c(5,' + str(max_iter) +'))')
+        if debug and start == 0:
+            run_commands.append('write.amelia(obj=imdat, file.stem="' + tmp_prefix + '", format="csv", row.names=FALSE)')
+
+        if gen_plots and start == 0:
+            if not os.path.exists("./out"): os.makedirs("./out")
+            run_commands.append('pdf("./out/missingness.pdf", useDingbats=FALSE)')
+            run_commands.append('missmap(imdat)')
+            run_commands.append('dev.off()')
+            for i in range(0, len(var_names)):
+                name = var_names[i]
+                # Compare observed density with imputed density
+                run_commands.append('pdf("./out/obs-vs-imp-' + name+ '.pdf", useDingbats=FALSE)')
+                run_commands.append('compare.density(imdat, var = "' + name + '")')
+                run_commands.append('dev.off()')
+                if var_types[name] != "category":
+                    # Numerical variable, we can generate the quality of imputation plot
+                    run_commands.append('pdf("./out/quality-imp-' + name+ '.pdf", useDingbats=FALSE)')
+                    run_commands.append('overimpute(imdat, var = "' + name + '")')
+                    run_commands.append('dev.off()')
+
+        # The training data is passed to R as a data frame, and the imputed datasets are returned
+        # as matrices
+        results = ['data.matrix(imdat$imputations[[' + str(i) + ']])' for i in range(1, count + 1)]
+        return rpool.run(run_commands, results, {"trdat":(var_names, data)})
+
+    frames = generate_frames(run_amelia, data, num_imputed, kwparams)
+    if gen_plots: print "Saved Amelia plots to out folder"
 
     print "Success!"
-    imp_files = [tmp_prefix + str(i) + ".csv" for i in range(1, num_imputed + 1)]
-    aggregate_files(out_filename, imp_files, var_names, var_types, bounds)
+    write_frames(out_filename, frames, var_names, var_types, bounds)
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser()
@@ -122,6 +146,12 @@ if __name__ == "__main__":
                         help="name of output training file afer imputation")
     parser.add_argument("-n", "--num_imputed", type=int, nargs=1, default=[5],
                         help="number of imputed datasets")
+    parser.add_argument("-a", "--adaptive", nargs=1, default=[""],
+                        help="add imputed datasets until this statistic converges: moments or auc")
+    parser.add_argument("-T", "--adaptive_tol", type=float, nargs=1, default=[0.01],
+                        help="maximum change of the statistic in adaptive mode")
+    parser.add_argument("-M", "--max_imputed", type=int, nargs=1, default=[20],
+                        help="maximum number of imputed datasets in adaptive mode")
     parser.add_argument("-r", "--num_resamples", type=int, nargs=1, default=[10000],
                         help="number of resamples")
     parser.add_argument("-x", "--max_iter", type=int, nargs=1, default=[10000],
@@ -130,11 +160,17 @@ if __name__ == "__main__":
                         help="check input data")
     parser.add_argument("-p", "--gen_plots", action="store_true",
                         help="generate plots")
+    parser.add_argument("-d", "--debug", action="store_true",
+                        help="save the data and the imputed datasets in temporary files")
 
     args = parser.parse_args()
     process(in_filename=args.input[0], out_filename=args.output[0],
             num_imputed=str(args.num_imputed[0]),
+            adaptive=args.adaptive[0],
+            adaptive_tol=str(args.adaptive_tol[0]),
+            max_imputed=str(args.max_imputed[0]),
             resamples_opt=str(args.num_resamples[0]),
             max_iter=str(args.max_iter[0]),
             incheck_opt=str(args.in_check),
-            gen_plots=str(args.gen_plots))
\ No newline at end of file
+            gen_plots=str(args.gen_plots),
+            debug=str(args.debug))
\ No newline at end of file
@@ -4,7 +4,7 @@ Main R package from http://www.genabel.org/PredictABEL/plotCalibration.html
 """
 
 import os
-import rpy2.robjects as robjects
+import rpool
 
 def create_path(fn):
     dir = os.path.abspath(os.path.split(fn)[0])
@@ -32,18 +32,16 @@ def calplot(probs, y_test, **kwparams):
     create_path(out_file)
     create_path(plot_file)
     
-    robjects.r('pdf("'+ plot_file +'", useDingbats=FALSE)') 
     predrisk = 'c('+ ', '.join([str(p) for p in probs])+')'
-
-    robjects.r('par(new=TRUE)')
-    robjects.r('par(col="'+color+'")')
-
-    robjects.r('library(PredictABEL)')
-    robjects.r('trdat <- read.table("' + test_file + '", sep = ",", header=TRUE)')
-    robjects.r('cOutcome <- 1')
-    robjects.r('predRisk <- '+predrisk)
-    robjects.r('plotCalibration(data=trdat, cOutcome=cOutcome, predRisk=predRisk, filename="' + out_file + '")')
-    robjects.r('dev.off()')
+    rpool.run(['pdf("'+ plot_file +'", useDingbats=FALSE)',
+               'par(new=TRUE)',
+               'par(col="'+color+'")',
+               'library(PredictABEL)',
+               'trdat <- read.table("' + test_file + '", sep = ",", header=TRUE)',
+               'cOutcome <- 1',
+               'predRisk <- '+predrisk,
+               'plotCalibration(data=trdat, cOutcome=cOutcome, predRisk=predRisk, filename="' + out_file + '")',
+               'dev.off()'])
 
     print "Saved calibration plot to          :",plot_file
     print "Saved Hosmer-Lemeshow statistics to: ",out_file
@@ -22,17 +22,14 @@ of Statistical Software, 56(6), 1-31
 
 import argparse
 import sys, csv, os
-import rpy2.robjects as robjects
+import rpool
+from datacache import load_source, source_rows
 
-src_file = "./data/sources.txt"
 range_file = "./data/ranges.txt"
 ignore_file = "./data/ignore.txt"
 
 def run_test(var_file, mcar_test, pvalue_threshold):
-    input_file = ""
-    with open(src_file, "rb") as sfile:
-        for line in sfile.readlines():
-            input_file = os.path.abspath(line.strip())
+    data = load_source()
 
     model_variables = []
     with open(var_file, "rb") as vfile:
@@ -59,44 +56,42 @@ def run_test(var_file, mcar_test, pvalue_threshold):
 
     idx_info = []
     all_data = []
-    with open(input_file, "rb") as ifile:
-        reader = csv.reader(ifile)
-        titles = reader.next()
-        model_idx = [titles.index(var) for var in model_variables]
-        r0 = 0
-        r = 0
-        for row in reader:
-            if row[0] in ignore_records: continue
-
-            r0 += 1 # Starts at 1, because of titles
-            all_missing = True
-            some_missing = False
-            missing_dvar = row[model_idx[0]] == "\\N"
-            for i in range(1, len(model_variables)):
-                var_idx = model_idx[i]
-                if row[var_idx] == "\\N":
-                    some_missing = True
-                else:
-                    all_missing = False
-
-            inside_range = True
-            for var in range_variables:
-                idx = titles.index(var["name"])
-                val = row[idx]
-                if val == "\\N": continue
-                vtype = var["type"]
-                vrang = var["range"]
-                test = True
-                if vtype == "category":
-                    test = val in vrang
-                else:
-                    test = float(vrang[0]) <= float(val) and float(val) < float(vrang[1])
-                inside_range = inside_range and test
-
-            if not all_missing and not missing_dvar and inside_range:
-                idx_info.append([r0, row[0], row[model_idx[0]]])
-                all_data.append([row[idx].replace("\\N", "?") for idx in model_idx])
-                r += 1
+    titles = data["titles"]
+    model_idx = [titles.index(var) for var in model_variables]
+    r0 = 0
+    r = 0
+    for row in source_rows(data):
+        if row[0] in ignore_records: continue
+
+        r0 += 1 # Starts at 1, because of titles
+        all_missing = True
+        some_missing = False
+        missing_dvar = row[model_idx[0]] == "\\N"
+        for i in range(1, len(model_variables)):
+            var_idx = model_idx[i]
+            if row[var_idx] == "\\N":
+                some_missing = True
+            else:
+                all_missing = False
+
+        inside_range = True
+        for var in range_variables:
+            idx = titles.index(var["name"])
+            val = row[idx]
+            if val == "\\N": continue
+            vtype = var["type"]
+            vrang = var["range"]
+            test = True
+            if vtype == "category":
+                test = val in vrang
+            else:
+                test = float(vrang[0]) <= float(val) and float(val) < float(vrang[1])
+            inside_range = inside_range and test
+
+        if not all_missing and not missing_dvar and inside_range:
+            idx_info.append([r0, row[0], row[model_idx[0]]])
+            all_data.append([row[idx].replace("\\N", "?") for idx in model_idx])
+            r += 1
 
     test_filename = "./mcar_test.csv"
     with open(test_filename, "w") as trfile:
@@ -104,15 +99,14 @@ def run_test(var_file, mcar_test, pvalue_threshold):
         writer.writerow(model_variables)
         for row in all_data:
             writer.writerow(row)
-    robjects.r('dat <- read.table("' + test_filename + '", sep=",", header=TRUE, na.strings="?")')
+    read_cmd = 'dat <- read.table("' + test_filename + '", sep=",", header=TRUE, na.strings="?")'
 
     if mcar_test == "little":
-        robjects.r('library(BaylorEdPsych)')
-        robjects.r('res <- LittleMCAR(dat)')
+        res = rpool.run([read_cmd, 'library(BaylorEdPsych)', 'res <- LittleMCAR(dat)'],
+                        ['res[[1]]', 'res[[3]]'])
         print ""
-        res = robjects.r['res']
         chisq = res[0][0]
-        pvalue = res[2][0]
+        pvalue = res[1][0]
         print "Value of Little'schi-squared statistic:", chisq
         print "P-value of Little's chi-squared test  :", pvalue        
 #        print res
@@ -129,10 +123,10 @@ def run_test(var_file, mcar_test, pvalue_threshold):
 #                print idx_info[int(rn) - 1][1]
 #            print ""        
     elif mcar_test == "hawkins":
-        robjects.r('library(MissMech)')
-        robjects.r('res <- TestMCARNormality(dat, alpha = ' + str(pvalue_threshold) + ')')
-        res = robjects.r['res']
-        print res
+        res = rpool.run([read_cmd, 'library(MissMech)',
+                         'res <- TestMCARNormality(dat, alpha = ' + str(pvalue_threshold) + ')'],
+                        ['capture.output(print(res))'])
+        print "\n".join(res[0])
 
     os.remove(test_filename)
 
@@ -0,0 +1,192 @@
+"""
+Columnar binary cache of the source data. The CSV file listed in the sources file is
+converted once into per-column NumPy arrays (numerical values, missing-value mask and the
+original text of each field), which are memory-mapped on load. The text of each column is
+stored in its own file, with the width of its longest field, so a long free-text column
+doesn't widen the others. The cache is rebuilt
+automatically whenever the source file changes.
+
+@copyright: The Broad Institute of MIT and Harvard 2015
+"""
+
+import os, csv, hashlib, shutil, argparse
+import numpy as np
+
+src_file = "./data/sources.txt"
+cache_dir = "./cache/source"
+missing_value = "\\N"
+
+"""Returns the absolute path of the source data file
+"""
+def source_file():
+    input_file = ""
+    with open(src_file, "rb") as sfile:
+        for line in sfile.readlines():
+            input_file = os.path.abspath(line.strip())
+    return input_file
+
+"""Returns the string identifying the current state of the source file, used to detect
+changes in it
+"""
+def source_stamp(input_file):
+    info = os.stat(input_file)
+    return input_file + "\n" + str(info.st_size) + "\n" + repr(info.st_mtime) + "\n"
+
+"""Returns the name of the file with the text of the given column in the cache directory
+"""
+def text_file(dest_dir, j):
+    return os.path.join(dest_dir, "text-" + str(j) + ".npy")
+
+"""Converts the input CSV file into the columnar cache stored in the given directory. The
+conversion makes two passes over the file, so the memory used does not depend on its size
+
+:param input_file: source CSV file
+:param dest_dir: directory where to store the cache
+"""
+def build_cache(input_file, dest_dir):
+    print "Building data cache for", input_file, "..."
+
+    # First pass: dimensions, maximum field width and type of each column
+    with open(input_file, "rb") as ifile:
+        reader = csv.reader(ifile)
+        titles = reader.next()
+        N = len(titles)
+        numeric = [True] * N
+        width = [1] * N
+        M = 0
+        for row in reader:
+            for j in range(0, N):
+                val = row[j]
+                if width[j] < len(val): width[j] = len(val)
+                if numeric[j] and val != missing_value:
+                    try:
+                        float(val)
+                    except ValueError:
+                        numeric[j] = False
+            M += 1
+
+    # Building in a temporary folder, so concurrent processes never see a partial cache
+    temp_dir = dest_dir + "-tmp-" + str(os.getpid())
+    if os.path.exists(temp_dir): shutil.rmtree(temp_dir)
+    os.makedirs(temp_dir)
+
+    with open(os.path.join(temp_dir, "titles.txt"), "wb") as tfile:
+        for name in titles: tfile.write(name + "\n")
+    np.save(os.path.join(temp_dir, "numeric.npy"), np.array(numeric, dtype=bool))
+
+    # Numerical values and missing mask are stored by columns, the text in a file per column
+    values = np.lib.format.open_memmap(os.path.join(temp_dir, "values.npy"), mode="w+",
+                                       dtype=np.float64, shape=(M, N), fortran_order=True)
+    missing = np.lib.format.open_memmap(os.path.join(temp_dir, "missing.npy"), mode="w+",
+                                        dtype=bool, shape=(M, N), fortran_order=True)
+    text = [np.lib.format.open_memmap(text_file(temp_dir, j), mode="w+", dtype="S" + str(width[j]), shape=(M,))
+            for j in range(0, N)]
+
+    # Second pass: filling the arrays
+    with open(input_file, "rb") as ifile:
+        reader = csv.reader(ifile)
+        reader.next()
+        r = 0
+        for row in reader:
+            for j in range(0, N): text[j][r] = row[j]
+            miss = [val == missing_value for val in row]
+            missing[r] = miss
+            values[r] = [float(row[j]) if numeric[j] and not miss[j] else np.nan for j in range(0, N)]
+            r += 1
+    del values, missing, text
+
+    # The stamp is written last, marking the cache as complete
+    with open(os.path.join(temp_dir, "source.txt"), "wb") as sfile:
+        sfile.write(source_stamp(input_file))
+
+    if os.path.exists(dest_dir): shutil.rmtree(dest_dir, ignore_errors=True)
+    try:
+        os.rename(temp_dir, dest_dir)
+    except OSError:
+        # Another process just created the same cache
+        shutil.rmtree(temp_dir, ignore_errors=True)
+    print "Done."
+
+"""Returns true if the cache in the given directory corresponds to the current state of the
+input file
+"""
+def valid_cache(input_file, dest_dir):
+    fn = os.path.join(dest_dir, "source.txt")
+    # Caches built before the text was stored by columns are rebuilt
+    if not os.path.exists(fn) or not os.path.exists(text_file(dest_dir, 0)): return False
+    with open(fn, "rb") as sfile:
+        return sfile.read() == source_stamp(input_file)
+
+"""Loads the cached source data, building the cache first if it doesn't exist or if it
+is out of date. The returned dictionary contains the following memory-mapped arrays, with
+one row per record in the source file:
+
+values : numerical value of each field (NaN if missing or non-numerical)
+missing: True for the missing fields (\N in the source file)
+text   : list with the original text of the fields of each column (see source_text)
+
+as well as the list of column titles, a dictionary mapping titles to column indices, and
+the type of each column (True if numerical)
+
+:param input_file: source CSV file, by default the one listed in the sources file
+"""
+def load_source(input_file=""):
+    if not input_file: input_file = source_file()
+    dest_dir = os.path.join(cache_dir, hashlib.md5(input_file).hexdigest())
+    if not valid_cache(input_file, dest_dir):
+        build_cache(input_file, dest_dir)
+
+    titles = []
+    with open(os.path.join(dest_dir, "titles.txt"), "rb") as tfile:
+        for line in tfile.readlines():
+            titles.append(line.rstrip("\n"))
+    index = {}
+    for i in range(0, len(titles)):
+        if not titles[i] in index: index[titles[i]] = i
+
+    data = {"file": input_file,
+            "titles": titles,
+            "index": index,
+            "numeric": np.load(os.path.join(dest_dir, "numeric.npy")),
+            "values": np.load(os.path.join(dest_dir, "values.npy"), mmap_mode="r"),
+            "missing": np.load(os.path.join(dest_dir, "missing.npy"), mmap_mode="r"),
+            "text": [np.load(text_file(dest_dir, j), mmap_mode="r") for j in range(0, len(titles))]}
+    return data
+
+"""Returns the original text of the given columns in the given records of the cached data, as
+an array with one row per record
+
+:param data: cached data returned by load_source
+:param rows: indices of the records, or a slice
+:param columns: indices of the columns
+"""
+def source_text(data, rows, columns):
+    return np.column_stack([data["text"][j][rows] for j in columns])
+
+"""Iterates over the records in the cached data, returning each one as a list of strings
+exactly as they appear in the source file
+
+:param data: cached data returned by load_source
+:param start: index of first record
+:param stop: index after the last record, all the remaining records by default
+:param chunk_size: number of records read from the cache at once
+"""
+def source_rows(data, start=0, stop=None, chunk_size=10000):
+    if stop is None: stop = data["values"].shape[0]
+    columns = range(0, len(data["titles"]))
+    for first in range(start, stop, chunk_size):
+        for row in source_text(data, slice(first, min(stop, first + chunk_size)), columns).tolist():
+            yield row
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-i", "--input", nargs=1, default=[""],
+                        help="Source CSV file, by default the one listed in " + src_file)
+    parser.add_argument("-f", "--force", action="store_true",
+                        help="Rebuild the cache even if it is up to date")
+    args = parser.parse_args()
+    input_file = os.path.abspath(args.input[0]) if args.input[0] else source_file()
+    if args.force:
+        build_cache(input_file, os.path.join(cache_dir, hashlib.md5(input_file).hexdigest()))
+    data = load_source(input_file)
+    print "Cached", data["values"].shape[0], "records with", len(data["titles"]), "variables from", input_file
@@ -0,0 +1,215 @@
+"""
+This script imputes the missing values with the Expectation-Maximization with Bootstrapping
+algorithm used by Amelia, implemented in NumPy. For each imputed dataset, the mean and
+covariance of a multivariate normal model are estimated by EM on a bootstrap resample of the
+data, and the missing values of each row are drawn from their conditional distribution given
+the observed values. All the rows with the same missingness pattern are processed together.
+
+Honaker, J., King, G., Blackwell, M. (2011). Amelia II: A Program for Missing Data. Journal
+of Statistical Software, 45(7), 1-47
+
+@copyright: The Broad Institute of MIT and Harvard 2015
+"""
+
+import argparse
+import numpy as np
+from imputation import load_variables, load_bounds, load_data, write_frames, generate_frames
+
+"""Groups the rows by missingness pattern, returning a list with the mask of observed
+variables of each pattern and the indices of its rows
+
+:param missing: boolean matrix with the missing values
+"""
+def missing_patterns(missing):
+    patterns, inverse = np.unique(missing, axis=0, return_inverse=True)
+    return [(~patterns[k], np.nonzero(inverse == k)[0]) for k in range(0, len(patterns))]
+
+"""Returns the regression coefficients of the missing variables on the observed variables,
+and the covariance of the missing variables conditional on the observed ones
+
+:param sigma: covariance matrix
+:param obs: mask of observed variables
+"""
+def conditional(sigma, obs):
+    mis = ~obs
+    s_mo = sigma[np.ix_(mis, obs)]
+    coeffs = s_mo.dot(np.linalg.pinv(sigma[np.ix_(obs, obs)]))
+    cov = sigma[np.ix_(mis, mis)] - coeffs.dot(s_mo.T)
+    return coeffs, cov
+
+"""Estimates the mean and covariance of the data with the EM algorithm
+
+:param data: data matrix, with NaN in the missing values
+:param patterns: missingness patterns of the rows, as returned by missing_patterns
+:param max_iter: maximum number of EM iterations
+:param tol: convergence tolerance on the change of the parameters
+:param ridge: strength of the ridge prior that shrinks the covariances towards zero
+"""
+def em(data, patterns, max_iter, tol, ridge):
+    n, p = data.shape
+    mu = np.nanmean(data, axis=0)
+    sigma = np.diag(np.nanvar(data, axis=0))
+    for iter in range(0, max_iter):
+        t1 = np.zeros(p)
+        t2 = np.zeros((p, p))
+        for obs, rows in patterns:
+            x = data[rows]
+            if not obs.all():
+                mis = ~obs
+                coeffs, cov = conditional(sigma, obs)
+                x[:, mis] = mu[mis] + (x[:, obs] - mu[obs]).dot(coeffs.T)
+                t2[np.ix_(mis, mis)] += len(rows) * cov
+            t1 += x.sum(axis=0)
+            t2 += x.T.dot(x)
+        new_mu = t1 / n
+        new_sigma = t2 / n - np.outer(new_mu, new_mu)
+        if 0 < ridge:
+            new_sigma = (n * new_sigma + ridge * np.diag(np.diag(new_sigma))) / (n + ridge)
+        delta = max(np.abs(new_mu - mu).max(), np.abs(new_sigma - sigma).max())
+        mu, sigma = new_mu, new_sigma
+        if delta < tol: break
+    return mu, sigma
+
+"""Draws the missing values of the data from the normal model, redrawing the rows with values
+out of bounds up to the given number of times, and clipping the remaining ones
+
+:param data: data matrix, with NaN in the missing values
+:param patterns: missingness patterns of the rows
+:param mu: mean of the model
+:param sigma: covariance of the model
+:param lower: lower bound of each variable
+:param upper: upper bound of each variable
+:param num_resamples: maximum number of redraws
+:param rng: random generator
+"""
+def draw(data, patterns, mu, sigma, lower, upper, num_resamples, rng):
+    imputed = data.copy()
+    for obs, rows in patterns:
+        if obs.all(): continue
+        mis = ~obs
+        coeffs, cov = conditional(sigma, obs)
+        w, v = np.linalg.eigh(cov)
+        factor = v * np.sqrt(np.clip(w, 0, None))
+        mean = mu[mis] + (data[rows][:, obs] - mu[obs]).dot(coeffs.T)
+        lo = lower[mis]
+        hi = upper[mis]
+        vals = mean + rng.standard_normal(mean.shape).dot(factor.T)
+        for i in range(0, num_resamples):
+            out = np.logical_or(vals < lo, hi < vals).any(axis=1)
+            if not out.any(): break
+            vals[out] = mean[out] + rng.standard_normal((np.sum(out), mean.shape[1])).dot(factor.T)
+        imputed[np.ix_(rows, mis)] = np.clip(vals, lo, hi)
+    return imputed
+
+"""Returns the given number of imputed copies of the data. The variables are standardized
+before running EM, and the imputed values of category variables are rounded to the nearest
+observed category
+
+:param data: data matrix, with NaN in the missing values
+:param var_names: list of variable names
+:param var_types: dictionary with the type of each variable
+:param bounds: bounds of each variable, as returned by load_bounds
+:param num_imputed: number of imputed datasets
+:param max_iter: maximum number of EM iterations
+:param tol: convergence tolerance of EM
+:param num_resamples: maximum number of redraws of values out of bounds
+:param ridge: strength of the ridge prior
+:param rng: random generator
+"""
+def impute(data, var_names, var_types, bounds, num_imputed=5, max_iter=1000, tol=1e-4,
+           num_resamples=100, ridge=0.0, rng=np.random):
+    n, p = data.shape
+    missing = np.isnan(data)
+    center = np.nanmean(data, axis=0)
+    scale = np.nanstd(data, axis=0)
+    scale[~(0 < scale)] = 1
+    zdata = (data - center) / scale
+
+    category = np.array([var_types[name] == "category" for name in var_names])
+    lower = np.where(category, -np.inf, (np.array([b[0] for b in bounds]) - center) / scale)
+    upper = np.where(category, np.inf, (np.array([b[1] for b in bounds]) - center) / scale)
+    levels = [np.unique(data[~missing[:, j], j]) for j in range(0, p)]
+    patterns = missing_patterns(missing)
+
+    frames = []
+    for m in range(0, num_imputed):
+        # Bootstrap resample, drawn again if some variable has no observed values in it
+        for attempt in range(0, 100):
+            sample = rng.randint(0, n, n)
+            if (~missing[sample]).any(axis=0).all(): break
+        else:
+            sample = np.arange(0, n)
+        mu, sigma = em(zdata[sample], missing_patterns(missing[sample]), max_iter, tol, ridge)
+        imputed = data.copy()
+        drawn = draw(zdata, patterns, mu, sigma, lower, upper, num_resamples, rng) * scale + center
+        imputed[missing] = drawn[missing]
+        for j in np.nonzero(category)[0]:
+            lev = levels[j]
+            vals = imputed[missing[:, j], j]
+            pos = np.clip(np.searchsorted(lev, vals), 1, max(1, len(lev) - 1))
+            left = lev[pos - 1]
+            right = lev[np.minimum(pos, len(lev) - 1)]
+            imputed[missing[:, j], j] = np.where(vals - left <= right - vals, left, right)
+        frames.append(imputed)
+    return frames
+
+"""Creates a complete training set by imputing missing values using bootstrap EM
+
+:param in_filename: input file with all the data
+:param out_filename: output file with only complete rows
+:param kwparams: optional arguments: num_imputed (number of imputed dataframes), max_iter
+                 (maximum number of EM iterations), tol (EM tolerance), num_resamples
+                 (maximum number of redraws of values out of bounds), ridge (strength of
+                 ridge prior), seed (random seed), and the options of the adaptive number
+                 of imputed dataframes (see imputation.adaptive_options)
+"""
+def process(in_filename, out_filename, **kwparams):
+    num_imputed = int(kwparams["num_imputed"]) if "num_imputed" in kwparams else 5
+    max_iter = int(kwparams["max_iter"]) if "max_iter" in kwparams else 1000
+    tol = float(kwparams["tol"]) if "tol" in kwparams else 1e-4
+    num_resamples = int(kwparams["num_resamples"]) if "num_resamples" in kwparams else 100
+    ridge = float(kwparams["ridge"]) if "ridge" in kwparams else 0.0
+    rng = np.random.RandomState(int(kwparams["seed"])) if "seed" in kwparams else np.random
+
+    var_names, var_types = load_variables(in_filename)
+    bounds = load_bounds(in_filename, var_names, var_types)
+    data = load_data(in_filename, var_names)
+
+    print "Generating " + str(num_imputed) + " imputed datasets with bootstrap EM..."
+    frames = generate_frames(lambda start, count: impute(data, var_names, var_types, bounds, count, max_iter,
+                                                         tol, num_resamples, ridge, rng),
+                             data, num_imputed, kwparams)
+    print "Success!"
+    write_frames(out_filename, frames, var_names, var_types, bounds)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-i", "--input", nargs=1, default=["./models/test/training-data.csv"],
+                        help="name of input training file")
+    parser.add_argument("-o", "--output", nargs=1, default=["./models/test/training-data-completed.csv"],
+                        help="name of output training file afer imputation")
+    parser.add_argument("-n", "--num_imputed", type=int, nargs=1, default=[5],
+                        help="number of imputed datasets")
+    parser.add_argument("-a", "--adaptive", nargs=1, default=[""],
+                        help="add imputed datasets until this statistic converges: moments or auc")
+    parser.add_argument("-T", "--adaptive_tol", type=float, nargs=1, default=[0.01],
+                        help="maximum change of the statistic in adaptive mode")
+    parser.add_argument("-M", "--max_imputed", type=int, nargs=1, default=[20],
+                        help="maximum number of imputed datasets in adaptive mode")
+    parser.add_argument("-x", "--max_iter", type=int, nargs=1, default=[1000],
+                        help="maximum number of EM iterations")
+    parser.add_argument("-r", "--num_resamples", type=int, nargs=1, default=[100],
+                        help="maximum number of redraws of values out of bounds")
+    parser.add_argument("-s", "--seed", type=int, nargs=1, default=[None],
+                        help="random seed")
+
+    args = parser.parse_args()
+    kwparams = {"num_imputed":str(args.num_imputed[0]),
+                "max_iter":str(args.max_iter[0]),
+                "num_resamples":str(args.num_resamples[0])}
+    if args.seed[0] is not None: kwparams["seed"] = str(args.seed[0])
+    if args.adaptive[0]:
+        kwparams.update({"adaptive":args.adaptive[0],
+                         "adaptive_tol":str(args.adaptive_tol[0]),
+                         "max_imputed":str(args.max_imputed[0])})
+    process(in_filename=args.input[0], out_filename=args.output[0], **kwparams)
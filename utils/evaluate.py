@@ -11,13 +11,14 @@ from calplot import calplot
 from classificationreport import report
 from confusion import confusion
 from roc import roc
+from splits import load_frame
 
 def design_matrix(test_filename="", train_filename="", get_df=False):
     if test_filename and train_filename:
         # Will build a design matrix from the test data, using the training data for 
         # normalization
-        df0 = pd.read_csv(train_filename, delimiter=",", na_values="?")
-        df = pd.read_csv(test_filename, delimiter=",", na_values="?")
+        df0 = load_frame(train_filename)
+        df = load_frame(test_filename)
         # df and df0 must have the same number of columns (N), but not necessarily the same
         # number of rows.
         M = df.shape[0]
@@ -32,8 +33,9 @@ def design_matrix(test_filename="", train_filename="", get_df=False):
             # Using the max/min values from the training set because those were used to 
             # train the predictor
             values0 = df0.values[:, j]
-            minv0 = values0.min()
-            maxv0 = values0.max()
+            # Missing values are kept as NaN, for the predictors that handle them
+            minv0 = np.nanmin(values0)
+            maxv0 = np.nanmax(values0)
             if maxv0 > minv0:
                 X[:, j] = np.clip((values - minv0) / (maxv0 - minv0), 0, 1)
             else:
@@ -42,7 +44,7 @@ def design_matrix(test_filename="", train_filename="", get_df=False):
         # Will build the design matrix from either the training of testing set
         if train_filename: filename = train_filename
         else: filename = test_filename
-        df = pd.read_csv(filename, delimiter=",", na_values="?")
+        df = load_frame(filename)
         M = df.shape[0]
         N = df.shape[1]
         y = df.values[:,0]
@@ -52,8 +54,8 @@ def design_matrix(test_filename="", train_filename="", get_df=False):
             # contains all the values as numpy arrays that
             # can be handled individually:
             values = df.values[:, j]
-            minv = values.min()
-            maxv = values.max()
+            minv = np.nanmin(values)
+            maxv = np.nanmax(values)
             if maxv > minv:
                 X[:, j] = np.clip((values - minv) / (maxv - minv), 0, 1)
             else:
@@ -8,14 +8,17 @@ http://www.inside-r.org/packages/cran/Hmisc/docs/aregImpute
 """
 
 import sys, os, csv, argparse
-import rpy2.robjects as robjects
-from imputation import load_variables, load_bounds, aggregate_files
+import rpool
+from imputation import load_variables, load_bounds, load_data, write_frames, temp_prefix, generate_frames
 
 """Creates a complete training set by imputing missing values using aregImpute
 
 :param in_filename: input file with all the data
 :param out_filename: output file with only complete rows
-:param kwparams: optional arguments for MICE: num_imputed (number of imputed dataframes)
+:param kwparams: optional arguments for MICE: num_imputed (number of imputed dataframes),
+                 seed (seed of R's random generator), debug (also save the imputed
+                 datasets in temporary files), and the options of the adaptive number of
+                 imputed dataframes (see imputation.adaptive_options)
 """
 def process(in_filename, out_filename, **kwparams):
     if "num_imputed" in kwparams:
@@ -23,6 +26,11 @@ def process(in_filename, out_filename, **kwparams):
     else:
         num_imputed = 5
 
+    if "debug" in kwparams:
+        debug = True if kwparams["debug"].lower() == "true" else False
+    else:
+        debug = False
+
     var_names, var_types = load_variables(in_filename)
     bounds = load_bounds(in_filename, var_names, var_types)
     model_str = ""
@@ -35,21 +43,34 @@ def process(in_filename, out_filename, **kwparams):
         list_str += '"' + name + '"'
     frame_str = ",".join(["comp$" + x for x in list_str.split(",")])
 
-    dir,_ = os.path.split(in_filename)
-    tmp_prefix = os.path.join(dir, "temp-data-hmisc-")
+    tmp_prefix = temp_prefix(in_filename, "hmisc")
 
     print "Generating " + str(num_imputed) + " imputed datasets with Hmisc..."
-    robjects.r('library(Hmisc)') 
-    robjects.r('trdat <- read.table("' + in_filename + '", sep=",", header=TRUE, na.strings="?")')
-    robjects.r('imdat <- aregImpute(' + model_str + ', nk=c(0,3:5), tlinear=FALSE, data=trdat, n.impute=' + str(num_imputed) + ')')
+    data = load_data(in_filename, var_names)
+
+    # Runs aregImpute in R and returns the given number of new imputed datasets, each run after
+    # the first one starts from another seed
+    def run_hmisc(start, count):
+        commands = ['library(Hmisc)']
+        if "seed" in kwparams:
+            commands.append('set.seed(' + str(int(kwparams["seed"]) + start) + ')')
+        commands.append('imdat <- aregImpute(' + model_str + ', nk=c(0,3:5), tlinear=FALSE, data=trdat, n.impute=' + str(count) + ')')
+
+        for i in range(1, count + 1):
+            df = 'df' + str(i)
+            commands.append('comp <- impute.transcan(imdat, imputation=' + str(i)+ ', data=trdat, list.out=TRUE, pr=FALSE, check=FALSE)')
+            commands.append(df + ' = data.frame(' + frame_str + ')')
+            commands.append('colnames(' + df + ') <- c(' + list_str + ')')
+            if debug:
+                commands.append('write.csv(' + df + ', file="' + tmp_prefix + str(start + i) + '.csv", row.names=FALSE)')
+
+        # The training data is passed to R as a data frame, and the imputed datasets are returned
+        # as matrices
+        results = ['data.matrix(df' + str(i) + ')' for i in range(1, count + 1)]
+        return rpool.run(commands, results, {"trdat":(var_names, data)})
 
-    imp_files = [tmp_prefix + str(i) + ".csv" for i in range(1, num_imputed + 1)]
-    for i in range(1, num_imputed + 1):
-        robjects.r('comp <- impute.transcan(imdat, imputation=' + str(i)+ ', data=trdat, list.out=TRUE, pr=FALSE, check=FALSE)')
-        robjects.r('df = data.frame(' + frame_str + ')')
-        robjects.r('colnames(df) <- c(' + list_str + ')')
-        robjects.r('write.csv(df, file="' + tmp_prefix + str(i) + '.csv", row.names=FALSE)')
-    aggregate_files(out_filename, imp_files, var_names, var_types, bounds)
+    frames = generate_frames(run_hmisc, data, num_imputed, kwparams)
+    write_frames(out_filename, frames, var_names, var_types, bounds)
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser()
@@ -59,7 +80,19 @@ if __name__ == "__main__":
                         help="name of output training file afer imputation")
     parser.add_argument("-n", "--num_imputed", type=int, nargs=1, default=[5],
                         help="number of imputed datasets")
+    parser.add_argument("-a", "--adaptive", nargs=1, default=[""],
+                        help="add imputed datasets until this statistic converges: moments or auc")
+    parser.add_argument("-T", "--adaptive_tol", type=float, nargs=1, default=[0.01],
+                        help="maximum change of the statistic in adaptive mode")
+    parser.add_argument("-M", "--max_imputed", type=int, nargs=1, default=[20],
+                        help="maximum number of imputed datasets in adaptive mode")
+    parser.add_argument("-d", "--debug", action="store_true",
+                        help="save the imputed datasets in temporary files")
 
     args = parser.parse_args()
     process(in_filename=args.input[0], out_filename=args.output[0],
-            num_imputed=str(args.num_imputed[0]))
+            num_imputed=str(args.num_imputed[0]),
+            adaptive=args.adaptive[0],
+            adaptive_tol=str(args.adaptive_tol[0]),
+            max_imputed=str(args.max_imputed[0]),
+            debug=str(args.debug))
@@ -0,0 +1,123 @@
+"""
+Cache of imputed training sets. The completed file produced by an imputation method is
+stored under a key computed from the contents of the input file, the variable types, the
+method and its options (including the seed), so imputing the same data again with the same
+method and options only copies the stored result. The least recently used files are evicted
+when the total size of the cache exceeds the given limit. The provenance of the rows of the
+imputed set (see imputation.write_rows) is cached along with it. Sets saved in CSV and in
+binary format are cached under different keys.
+
+@copyright: The Broad Institute of MIT and Harvard 2015
+"""
+
+import os, glob, shutil, hashlib, argparse
+from imputation import load_variables, rows_filename
+
+cache_dir = "./cache/imputed"
+
+"""Returns the cache key of an imputation
+
+:param in_filename: input file with all the data
+:param out_filename: output file, only its format (CSV or binary) is part of the key
+:param method: name of the imputation method
+:param kwparams: arguments of the imputation method
+"""
+def cache_key(in_filename, out_filename, method, **kwparams):
+    md5 = hashlib.md5()
+    with open(in_filename, "rb") as ifile:
+        for block in iter(lambda: ifile.read(1 << 20), ""):
+            md5.update(block)
+    var_names, var_types = load_variables(in_filename)
+    md5.update("\n".join([name + " " + var_types[name] for name in var_names]) + "\n")
+    md5.update(method + os.path.splitext(out_filename)[1] + "\n")
+    md5.update("\n".join([key + "=" + str(kwparams[key]) for key in sorted(kwparams.keys())]))
+    return md5.hexdigest()
+
+"""Returns the name of the cached file for the given key and output file
+"""
+def cache_file(key, out_filename):
+    return os.path.join(cache_dir, key + "-data" + os.path.splitext(out_filename)[1])
+
+"""Copies the cached result with the given key to the output file, returning False if it is
+not in the cache
+"""
+def lookup(key, out_filename):
+    fn = cache_file(key, out_filename)
+    try:
+        shutil.copyfile(fn, out_filename)
+        if os.path.exists(rows_filename(fn)):
+            shutil.copyfile(rows_filename(fn), rows_filename(out_filename))
+        # The modification time records the last use
+        os.utime(fn, None)
+    except (IOError, OSError):
+        return False
+    return True
+
+"""Stores the output file in the cache under the given key, and evicts the least recently
+used files until the size of the cache is below the limit
+
+:param key: cache key
+:param out_filename: output file of the imputation
+:param max_size: maximum size of the cache in bytes
+"""
+def store(key, out_filename, max_size):
+    if not os.path.exists(out_filename): return
+    if not os.path.exists(cache_dir): os.makedirs(cache_dir)
+    fn = cache_file(key, out_filename)
+    temp_fn = fn + "-tmp-" + str(os.getpid())
+    if os.path.exists(rows_filename(out_filename)):
+        shutil.copyfile(rows_filename(out_filename), temp_fn)
+        os.rename(temp_fn, rows_filename(fn))
+    # The data file is stored last, since its presence marks the entry as complete
+    shutil.copyfile(out_filename, temp_fn)
+    os.rename(temp_fn, fn)
+    evict(max_size)
+
+"""Removes the least recently used files until the size of the cache is below the limit
+"""
+def evict(max_size):
+    entries = []
+    for fn in glob.glob(os.path.join(cache_dir, "*-data.csv")) + glob.glob(os.path.join(cache_dir, "*-data.npz")):
+        try:
+            info = os.stat(fn)
+            size = info.st_size
+            if os.path.exists(rows_filename(fn)): size += os.path.getsize(rows_filename(fn))
+        except OSError:
+            continue
+        entries.append((info.st_mtime, size, fn))
+    entries.sort()
+    total = sum([e[1] for e in entries])
+    for mtime, size, fn in entries:
+        if total <= max_size: break
+        try:
+            os.remove(fn)
+            if os.path.exists(rows_filename(fn)): os.remove(rows_filename(fn))
+        except OSError:
+            pass
+        total -= size
+
+"""Runs the process function of the imputation module, unless the result is already cached
+
+:param module: imputation module
+:param method: name of the imputation method
+:param in_filename: input file with all the data
+:param out_filename: output file with only complete rows
+:param max_size: maximum size of the cache in bytes
+:param kwparams: arguments of the imputation method
+"""
+def cached_process(module, method, in_filename, out_filename, max_size, **kwparams):
+    key = cache_key(in_filename, out_filename, method, **kwparams)
+    if lookup(key, out_filename):
+        print "Found imputed data for", in_filename, "in cache"
+        return
+    module.process(in_filename=in_filename, out_filename=out_filename, **kwparams)
+    store(key, out_filename, max_size)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-s", "--size", type=int, nargs=1, default=[0],
+                        help="maximum size of the cache in MB, the least recently used files are removed")
+    args = parser.parse_args()
+    evict(args.size[0] * 1024 * 1024)
+    files = glob.glob(os.path.join(cache_dir, "*.csv")) + glob.glob(os.path.join(cache_dir, "*.npz"))
+    print len(glob.glob(os.path.join(cache_dir, "*-data.*"))), "imputed sets in cache,", sum([os.path.getsize(fn) for fn in files]) / (1024 * 1024), "MB"
@@ -1,4 +1,5 @@
 import sys, os, csv
+import numpy as np
 
 var_file = "./data/variables.txt"
 def load_variables(in_filename):
@@ -18,53 +19,327 @@ def load_variables(in_filename):
             var_types[name] = type
     return var_names, var_types
 
+"""Returns the prefix of the temporary files of an imputation method. The prefix includes the
+id of the training set, so several sets can be imputed concurrently in the same directory
+"""
+def temp_prefix(in_filename, method):
+    dir, name = os.path.split(in_filename)
+    id = os.path.splitext(name)[0].replace("training-data", "")
+    return os.path.join(dir, "temp-data-" + method + id + "-")
+
+"""Returns the data in the training file as a NumPy array, with NaN in the missing values
+
+:param in_filename: training file, with ? in the missing values
+:param var_names: list of variable names
+"""
+def load_data(in_filename, var_names):
+    import pandas as pd
+    df = pd.read_csv(in_filename, delimiter=",", na_values="?", float_precision="round_trip")
+    return df[var_names].values.astype(np.float64)
+
+"""Returns the bounds of each variable, computed from its observed values in the training file
+
+:param in_filename: training file, with ? in the missing values
+:param var_names: list of variable names
+:param var_types: dictionary with the type of each variable
+"""
 def load_bounds(in_filename, var_names, var_types):
-    # Extract bounds from data
-    bounds = [[1000, 0] for x in var_names]
-    with open(in_filename, "rb") as tfile:
-        reader = csv.reader(tfile, delimiter=",")
-        reader.next()
-        for row in reader:
-            for i in range(0, len(row)):
-                if row[i] == "?": continue
-                val = float(row[i])
-                bounds[i][0] = min(val, bounds[i][0])
-                bounds[i][1] = max(val, bounds[i][1])
+    # Extract bounds from data, the lower bound is at most 1000 and the upper at least 0
+    data = load_data(in_filename, var_names)
+    observed = ~np.isnan(data).all(axis=0)
+    lower = np.full(len(var_names), 1000.0)
+    upper = np.zeros(len(var_names))
+    if observed.any():
+        lower[observed] = np.minimum(np.nanmin(data[:, observed], axis=0), 1000)
+        upper[observed] = np.maximum(np.nanmax(data[:, observed], axis=0), 0)
     # Expand the bounds a bit...
     tol = 0.0
-    for i in range(0, len(var_names)):
-        if var_types[var_names[i]] == "category": continue
-        bounds[i][0] = (1 - tol) * bounds[i][0]
-        bounds[i][1] = (1 + tol) * bounds[i][1]
-    return bounds
-    
-def aggregate_files(out_filename, imp_files, var_names, var_types, bounds):
-    print "Aggregating imputed datasets..."
-    aggregated_data = []
+    numerical = np.array([var_types[name] != "category" for name in var_names], dtype=bool)
+    lower[numerical] *= 1 - tol
+    upper[numerical] *= 1 + tol
+    return [[lower[i], upper[i]] for i in range(0, len(var_names))]
+
+"""Returns the name of the file with the provenance of the rows in an imputed training set
+(training-rows-completed-ID.csv for training-data-completed-ID.csv or .npz)
+"""
+def rows_filename(out_filename):
+    dir, name = os.path.split(out_filename)
+    return os.path.join(dir, os.path.splitext(name)[0].replace("-data", "-rows", 1) + ".csv")
+
+"""Returns the number of data rows in a CSV file with titles
+"""
+def count_rows(filename):
+    with open(filename, "rb") as ifile:
+        return max(0, sum(1 for line in ifile) - 1)
+
+"""Saves the provenance of the rows in an imputed training set: for each row, its position
+in the input training set (ROW), the imputed dataset it comes from (FRAME, -1 if the row is
+the same in all the imputed datasets), and the number of rows it stands for (WEIGHT)
+
+:param out_filename: imputed training set
+:param rows: position of each row in the input training set
+:param frames: imputed dataset of each row
+:param weights: weight of each row, 1 for all the rows if None
+"""
+def write_rows(out_filename, rows, frames, weights=None):
+    if weights is None: weights = np.ones(len(rows), dtype=int)
+    with open(rows_filename(out_filename), "wb") as rfile:
+        writer = csv.writer(rfile, delimiter=",", quotechar='"', quoting=csv.QUOTE_MINIMAL)
+        writer.writerow(["ROW", "FRAME", "WEIGHT"])
+        writer.writerows(np.column_stack((rows, frames, weights)).astype(int).tolist())
+
+"""Returns the positions, imputed datasets and weights of the rows in an imputed training set,
+as saved by write_rows. The weights are 1 in files written without them
+
+:param out_filename: imputed training set
+"""
+def load_rows(out_filename):
+    prov = np.loadtxt(rows_filename(out_filename), delimiter=",", skiprows=1, dtype=int, ndmin=2)
+    if prov.shape[1] < 3:
+        return prov[:, 0], prov[:, 1], np.ones(len(prov), dtype=int)
+    return prov[:, 0], prov[:, 1], prov[:, 2]
+
+"""Merges the copies of each row that are identical in all the imputed datasets (the rows
+without missing values, for instance) into a single row with the sum of their weights, and
+FRAME -1. Returns the data, positions, imputed datasets and weights of the remaining rows,
+in the same order
+
+:param data: data array
+:param rows: position of each row in the input training set
+:param frames: imputed dataset of each row
+:param weights: weight of each row
+:param num_frames: number of imputed datasets
+"""
+def merge_rows(data, rows, frames, weights, num_frames):
+    if not len(data): return data, rows, frames, weights
+    _, first, inverse = np.unique(np.column_stack((rows, data)), axis=0, return_index=True, return_inverse=True)
+    total = np.bincount(inverse, weights=weights)[inverse]
+    merged = total == num_frames
+    keep = np.logical_or(~merged, first[inverse] == np.arange(len(data)))
+    frames = np.where(merged, -1, frames)
+    weights = np.where(merged, total, weights).astype(int)
+    return data[keep], rows[keep], frames[keep], weights[keep]
+
+"""Aggregates the imputed datasets stored in the given files into a single output file,
+skipping the rows with numerical values out of bounds. Each file contains one imputed dataset,
+or several stacked ones if the number of rows in the input training set is given
+
+:param out_filename: output file
+:param imp_files: files with the imputed datasets
+:param var_names: list of variable names
+:param var_types: dictionary with the type of each variable
+:param bounds: bounds of each variable, as returned by load_bounds
+:param num_rows: number of rows of the input training set
+"""
+def aggregate_files(out_filename, imp_files, var_names, var_types, bounds, num_rows=None):
+    frames = []
     for fn in imp_files:
         print "  Reading " + fn
-        with open(fn, "rb") as ifile:
-            reader = csv.reader(ifile, delimiter=",")
-            reader.next()
-            for row in reader:
-                if row[0] == "NA": 
-                    print "    Empty dataset, skipping!"
-                    break
-                add = True
-                for i in range(0, len(row)):
-                    name = var_names[i]
-                    if var_types[name] != "category":
-                        val = float(row[i])
-                        if val < bounds[i][0] or bounds[i][1] < val:
-                            print "    Value " + row[i] + " for variable " + name + " is out of bounds [" + str(bounds[i][0]) + ", " + str(bounds[i][1]) + "], skipping"
-                            add = False
-                            break
-                if add: aggregated_data.append(row)
-
-    if aggregated_data:
-        with open(out_filename, "wb") as trfile:
-            writer = csv.writer(trfile, delimiter=",", quotechar='"', quoting=csv.QUOTE_MINIMAL)
-            writer.writerow(var_names)
-            for row in aggregated_data:
-                writer.writerow(row)
+        data = load_data(fn, var_names)
+        if num_rows is None or not len(data):
+            frames.append(data)
+        else:
+            frames.extend([data[i:i + num_rows] for i in range(0, len(data), num_rows)])
+    write_frames(out_filename, frames, var_names, var_types, bounds)
+
+"""Saves a data array in the given file: a CSV file with titles, where category variables are
+written as integers and missing values (NaN) as ?, or a NumPy .npz file with the variables and
+the data, if the name of the file ends with .npz
+
+:param filename: output file
+:param data: data array, one row per record and one column per variable
+:param var_names: list of variable names
+:param var_types: dictionary with the type of each variable
+"""
+def save_frame(filename, data, var_names, var_types):
+    if filename.endswith(".npz"):
+        # The file is written under a temporary name, because savez adds the extension to it
+        temp_fn = filename[:-4] + "-tmp-" + str(os.getpid()) + ".npz"
+        np.savez(temp_fn, variables=np.array(var_names), data=np.asarray(data, dtype=np.float64))
+        os.rename(temp_fn, filename)
+        return
+    with open(filename, "wb") as trfile:
+        writer = csv.writer(trfile, delimiter=",", quotechar='"', quoting=csv.QUOTE_MINIMAL)
+        writer.writerow(var_names)
+        cat = [var_types[name] == "category" for name in var_names]
+        for row in data:
+            writer.writerow(["?" if np.isnan(row[i]) else str(int(round(row[i]))) if cat[i] else repr(row[i])
+                             for i in range(0, len(row))])
+
+"""Saves imputed datasets given as NumPy arrays (one row per record, one column per variable)
+in a single output file (CSV, or .npz if the name ends with it, see save_frame), skipping the
+rows with missing values and the rows with numerical values out of bounds. Datasets that are
+not arrays with one column per variable (failed imputations returned by R as NA) are skipped
+as well. The number of skipped rows is reported for each variable out of bounds. Rows that
+are the same in all the imputed datasets are saved once, see merge_rows
+
+:param out_filename: output file
+:param frames: list of imputed arrays
+:param var_names: list of variable names
+:param var_types: dictionary with the type of each variable
+:param bounds: bounds of each variable, as returned by load_bounds, or None to keep all the
+               complete rows
+"""
+def write_frames(out_filename, frames, var_names, var_types, bounds):
+    print "Aggregating imputed datasets..."
+    num_idx = [i for i in range(0, len(var_names)) if var_types[var_names[i]] != "category"]
+    if bounds is None: num_idx = []
+    lower = np.array([bounds[i][0] for i in num_idx])
+    upper = np.array([bounds[i][1] for i in num_idx])
+    aggregated_data = []
+    rows = []
+    frame_ids = []
+    total = 0
+    num_missing = 0
+    num_out = np.zeros(len(num_idx), dtype=int)
+    for m in range(0, len(frames)):
+        data = np.asarray(frames[m], dtype=np.float64)
+        if data.ndim != 2 or data.shape[1] != len(var_names) or np.isnan(data).all():
+            print "    Empty dataset, skipping!"
+            continue
+        complete = ~np.isnan(data).any(axis=1)
+        vals = data[complete][:, num_idx]
+        out = np.logical_or(vals < lower, upper < vals)
+        inside = complete.copy()
+        inside[complete] = ~out.any(axis=1)
+        total += len(data)
+        num_missing += np.sum(~complete)
+        num_out += out.sum(axis=0)
+        aggregated_data.append(data[inside])
+        rows.append(np.nonzero(inside)[0])
+        # The datasets skipped are not counted, so the ids of the datasets saved are contiguous
+        frame_ids.append(np.repeat(len(frame_ids), np.sum(inside)))
+
+    if not aggregated_data: return
+    aggregated_data = np.concatenate(aggregated_data)
+    if total != len(aggregated_data):
+        print "    Skipped " + str(total - len(aggregated_data)) + " of " + str(total) + " rows"
+        if num_missing: print "      " + str(num_missing) + " with missing values"
+        for k in np.nonzero(num_out)[0]:
+            i = num_idx[k]
+            print "      " + str(num_out[k]) + " with " + var_names[i] + " out of bounds [" + str(bounds[i][0]) + ", " + str(bounds[i][1]) + "]"
+    if len(aggregated_data):
+        # The rows stacked from all the imputed datasets are saved only once, with their weight
+        aggregated_data, rows, frame_ids, weights = merge_rows(aggregated_data, np.concatenate(rows), np.concatenate(frame_ids),
+                                                               np.ones(len(aggregated_data), dtype=int), len(frame_ids))
+        save_frame(out_filename, aggregated_data, var_names, var_types)
+        write_rows(out_filename, rows, frame_ids, weights)
         print "Saved aggregated imputed datasets to", out_filename
+
+"""Returns the mean and standard deviation of the imputed values of each variable with missing
+values, over all the imputed datasets, in units of the standard deviation of its observed values
+
+:param data: data array, with NaN in the missing values
+:param frames: list of imputed arrays
+"""
+def imputed_moments(data, frames):
+    missing = np.isnan(data)
+    cols = np.nonzero(missing.any(axis=0))[0]
+    if not len(cols) or not frames: return np.zeros(0)
+    scale = np.nanstd(data[:, cols], axis=0)
+    scale[~(0 < scale)] = 1
+    vals = np.where(missing[:, cols], np.array(frames)[:, :, cols], np.nan).reshape(-1, len(cols))
+    return np.concatenate((np.nanmean(vals, axis=0) / scale, np.nanstd(vals, axis=0) / scale))
+
+"""Fits a logistic regression of the outcome (the first variable) on the other variables of an
+imputed dataset, leaving out the validation rows, and returns its predictions for them
+
+:param frame: imputed array
+:param valid: mask of the validation rows
+:param ridge: ridge penalty of the coefficients
+:param max_iter: maximum number of iterations
+"""
+def validation_predictions(frame, valid, ridge=1e-3, max_iter=25):
+    train = np.logical_and(~valid, ~np.isnan(frame).any(axis=1))
+    X = frame[:, 1:]
+    center = X[train].mean(axis=0)
+    scale = X[train].std(axis=0)
+    scale[~(0 < scale)] = 1
+    X = np.column_stack((np.ones(len(X)), (X - center) / scale))
+    y = frame[train, 0]
+    beta = np.zeros(X.shape[1])
+    penalty = ridge * np.eye(X.shape[1])
+    penalty[0, 0] = 0
+    for iter in range(0, max_iter):
+        p = 1.0 / (1.0 + np.exp(-np.clip(X[train].dot(beta), -30, 30)))
+        hess = (X[train] * (p * (1 - p))[:, None]).T.dot(X[train]) + penalty
+        step = np.linalg.pinv(hess).dot(X[train].T.dot(y - p) - penalty.dot(beta))
+        beta += step
+        if np.abs(step).max() < 1e-6: break
+    return 1.0 / (1.0 + np.exp(-np.clip(X[valid].dot(beta), -30, 30)))
+
+"""Returns the options that select the adaptive number of imputed datasets from the arguments of
+an imputation method: adaptive (moments or auc, the statistic whose convergence stops the
+imputation), adaptive_tol (maximum change of the statistic), adaptive_step (number of datasets
+added at each step) and max_imputed (maximum number of datasets). The statistic is None if the
+number of datasets is fixed
+"""
+def adaptive_options(kwparams):
+    stat = kwparams["adaptive"].lower() if "adaptive" in kwparams else None
+    if stat in ["none", "false", ""]: stat = None
+    if stat is not None and stat not in ["moments", "auc"]:
+        raise Exception("Unknown statistic for the adaptive number of imputed datasets: " + stat)
+    tol = float(kwparams["adaptive_tol"]) if "adaptive_tol" in kwparams else 0.01
+    step = int(kwparams["adaptive_step"]) if "adaptive_step" in kwparams else 1
+    max_imputed = int(kwparams["max_imputed"]) if "max_imputed" in kwparams else 20
+    return stat, tol, step, max_imputed
+
+"""Returns the imputed datasets produced by the generate function. If the adaptive number of
+datasets is enabled in the arguments (see adaptive_options), num_imputed datasets are generated
+first, and then more are added in steps, until the change of the statistic after a step is below
+the tolerance, or the maximum number of datasets is reached. The statistics are:
+
+- moments: mean and standard deviation of the imputed values of each variable, see imputed_moments
+- auc: AUC on a validation fold of the complete rows of the average prediction of the logistic
+  regressions trained on each imputed dataset
+
+:param generate: function that receives the number of datasets generated so far and the number
+                 of new ones, and returns a list with the new imputed arrays
+:param data: data array, with NaN in the missing values
+:param num_imputed: number of imputed datasets, or initial number in adaptive mode
+:param kwparams: dictionary with the arguments of the imputation method
+"""
+def generate_frames(generate, data, num_imputed, kwparams):
+    stat, tol, step, max_imputed = adaptive_options(kwparams)
+    if stat is None: return generate(0, num_imputed)
+
+    print "  Adding imputed datasets until the " + stat + " statistic changes less than " + str(tol) + ", up to " + str(max_imputed)
+    valid = None
+    if stat == "auc":
+        # Validation fold drawn from the complete rows, which are the same in all the datasets
+        rng = np.random.RandomState(int(kwparams["seed"])) if "seed" in kwparams else np.random
+        complete = np.nonzero(~np.isnan(data).any(axis=1))[0]
+        valid = np.zeros(len(data), dtype=bool)
+        valid[complete[rng.random_sample(len(complete)) < 0.2]] = True
+        y = data[valid, 0]
+        if len(np.unique(y)) < 2 or len(np.unique(data[~valid, 0][~np.isnan(data[~valid, 0])])) < 2:
+            print "  Not enough complete rows for the validation fold, using the moments statistic"
+            stat = "moments"
+
+    frames = []
+    usable = []
+    preds = []
+    value = None
+    while len(frames) < max_imputed:
+        count = min(num_imputed if not frames else step, max_imputed - len(frames))
+        new_frames = generate(len(frames), count)
+        frames.extend(new_frames)
+        for frame in new_frames:
+            frame = np.asarray(frame, dtype=np.float64)
+            # Failed imputations are ignored, as in write_frames
+            if frame.shape != data.shape or np.isnan(frame).all(): continue
+            usable.append(frame)
+            if stat == "auc": preds.append(validation_predictions(frame, valid))
+        if not usable: continue
+        if stat == "auc":
+            from sklearn.metrics import roc_auc_score
+            new_value = np.array([roc_auc_score(y, np.mean(preds, axis=0))])
+        else:
+            new_value = imputed_moments(data, usable)
+        if value is not None:
+            change = np.abs(new_value - value).max() if len(value) else 0
+            print "  " + str(len(frames)) + " imputed datasets, change of the statistic: " + str(change)
+            if change < tol: break
+        value = new_value
+    print "  Generated " + str(len(frames)) + " imputed datasets"
+    return frames
@@ -5,7 +5,8 @@ values are removed from the output.
 @copyright: The Broad Institute of MIT and Harvard 2015
 """
 
-import argparse, csv
+import argparse
+from imputation import load_variables, load_data, write_frames
 
 """Creates a complete output file by removing any rows in the input file with at least
 one missing value
@@ -13,22 +14,14 @@ one missing value
 :param in_filename: input file with all the data
 :param out_filename: output file with only complete rows
 """
-def process(in_filename, out_filename):
+def process(in_filename, out_filename, **kwparams):
     print "Removing incomplete rows from",in_filename
-    titles = []
-    data = []
-    with open(in_filename, "rb") as ifile:
-        reader = csv.reader(ifile)
-        titles = reader.next()
-        for row in reader:
-            if "?" in row: continue
-            data.append(row)
+    var_names, var_types = load_variables(in_filename)
+    data = load_data(in_filename, var_names)
 
+    # The rows with missing values are skipped when writing the data
     print "Writing complete data to",out_filename
-    with open(out_filename, "wb") as trfile:
-        writer = csv.writer(trfile, delimiter=",", quotechar='"', quoting=csv.QUOTE_MINIMAL)
-        writer.writerow(titles)
-        for row in data: writer.writerow(row)
+    write_frames(out_filename, [data], var_names, var_types, None)
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser()
@@ -5,32 +5,30 @@ This script creates the training and test sets.
 """
 
 import argparse
-import sys, csv, os, random
+import sys, csv, os, random, hashlib, shutil
 import numpy as np
+from datacache import load_source, source_stamp, source_text
+from splits import save_sets, save_splits
 
-src_file = "./data/sources.txt"
 var_file = "./data/variables.txt"
 range_file = "./data/ranges.txt"
 ignore_file = "./data/ignore.txt"
+fold_dir = "./cache/folds"
 
 """Returns a set of indices for the test set, making sure that both training and test 
 set will have same fraction of outcomes
 
-:param all_data: all rows in the dataset
-:param complete_rows: indices of rows w/out missing values in all_data
+:param outcomes: values of the dependent variable in all rows of the dataset
+:param complete_rows: indices of rows w/out missing values in the dataset
 :param test_percentage: percentage of complete rows that will be used in the test set
 """
-def test_set(all_data, complete_rows, test_percentage):
-    outlist = []
-    for i in complete_rows:
-        row = all_data[i]
-        outlist.append(int(row[0]))
-    out = np.array(outlist)
+def test_set(outcomes, complete_rows, test_percentage):
+    out = outcomes[complete_rows]
     i0 = np.where(out == 0)
     i1 = np.where(out == 1)
     f = test_percentage / 100.0
-    ri0 = np.random.choice(i0[0], size=f*i0[0].shape[0], replace=False)
-    ri1 = np.random.choice(i1[0], size=f*i1[0].shape[0], replace=False)
+    ri0 = np.random.choice(i0[0], size=int(f*i0[0].shape[0]), replace=False)
+    ri1 = np.random.choice(i1[0], size=int(f*i1[0].shape[0]), replace=False)
     itest = np.concatenate((ri1, ri0))
     itest.sort()
 
@@ -38,32 +36,13 @@ def test_set(all_data, complete_rows, test_percentage):
     # indices in the original data, so we:
     return np.array(complete_rows)[itest]
 
-"""Creates a training/test sets and saves them to the specified files. The test set won't
-have any missing values, and will include the given percentage of complete rows from the
-source data
-
-:param test_percentage: percentage of complete rows that will be used in the test set
-:param test_filename: name of file to store test set
-:param train_filename: name of file to store training set
+"""Returns the list of model variables, read from the variables file in the given directory
+if it exists, or from the default variables file otherwise
 """
-def makesets(test_percentage, test_filename, train_filename):
-    # Creating destination folder
-    test_dir = os.path.split(test_filename)[0]
-    train_dir = os.path.split(train_filename)[0]
-    if test_dir != train_dir:
-        print "Error: testing and training file should be stored in the same directory!"
-        exit(1)
-    if not os.path.exists(test_dir):
-        os.makedirs(test_dir)
-
-    input_file = ""
-    with open(src_file, "rb") as sfile:
-        for line in sfile.readlines():
-            input_file = os.path.abspath(line.strip())
-
+def load_variables(dir):
     model_variables = []
-    if os.path.exists(test_dir + "/variables.txt"):
-        fn = test_dir + "/variables.txt"
+    if os.path.exists(dir + "/variables.txt"):
+        fn = dir + "/variables.txt"
     else:
         fn = var_file
     with open(fn, "rb") as vfile:
@@ -71,7 +50,11 @@ def makesets(test_percentage, test_filename, train_filename):
             line = line.strip()
             if not line: continue
             model_variables.append(line.split()[0])
+    return model_variables
 
+"""Returns the list of variables with restricted ranges
+"""
+def load_ranges():
     range_variables = [] 
     with open(range_file, "rb") as rfile:
         for line in rfile.readlines():
@@ -80,92 +63,383 @@ def makesets(test_percentage, test_filename, train_filename):
             parts = line.strip().split()
             if 2 < len(parts):
                 range_variables.append({"name":parts[0], "type":parts[1], "range":parts[2].split(",")})
+    return range_variables
 
+"""Returns the list of ids of the records to ignore
+"""
+def load_ignore():
     ignore_records = []
     with open(ignore_file, "rb") as rfile:
         for line in rfile.readlines():
             line = line.strip()
             if not line: continue
             ignore_records.append(line)
+    return ignore_records
 
-    ids = []
-    all_data = []
-    idx_info = []
-    complete_rows = []
-    with open(input_file, "rb") as ifile:
-        reader = csv.reader(ifile)
-        titles = reader.next()
-        model_idx = [titles.index(var) for var in model_variables]
-        r0 = 0
-        r = 0
-        for row in reader:
-            if row[0] in ignore_records: continue
-            
-            r0 += 1 # Starts at 1, because of titles
-            all_missing = True
-            some_missing = False
-            missing_dvar = row[model_idx[0]] == "\\N"
-            for i in range(1, len(model_variables)):
-                var_idx = model_idx[i]
-                if row[var_idx] == "\\N":
-                    some_missing = True
-                else:
-                    all_missing = False
-
-            inside_range = True
-            for var in range_variables:
-                idx = titles.index(var["name"])
-                val = row[idx]
-                if val == "\\N": continue
-                vtype = var["type"]
-                vrang = var["range"]
-                test = True
-                if vtype == "category":
-                    test = val in vrang
-                else:
-                    test = float(vrang[0]) <= float(val) and float(val) < float(vrang[1])
-                inside_range = inside_range and test
-
-            if not all_missing and not missing_dvar and inside_range:
-                ids.append(row[0])
-                idx_info.append([r0, row[0], row[model_idx[0]]])
-                all_data.append([row[idx].replace("\\N", "?") for idx in model_idx])
-                if not some_missing: complete_rows.append(r)
-                r += 1
-
-    test_idx = test_set(all_data, complete_rows, test_percentage)
-    training_data = []
-    testing_data = []
-    for r in range(0, len(all_data)):
-        row = all_data[r]
-        if r in test_idx:
-            testing_data.append(row)
+"""Selects the records from the source data that can be included in the training/test 
+sets. The ignore list, the variable ranges and the missingness rules (dependent variable
+present, not all independent variables missing) are evaluated as boolean masks over entire
+columns. Returns the indices of the selected records in the source data, the positions
+of the complete records within the selected ones, and the number of each selected record
+counting only the records not in the ignore list (as stored in the index files). If a
+range of records is given, only those records are evaluated, and the numbers are counted
+from the start of the range
+
+:param data: cached source data
+:param model_variables: list of model variables, the first one being the dependent variable
+:param range_variables: list of variables with restricted ranges
+:param ignore_records: list of ids of the records to ignore
+:param start: index of first record to evaluate
+:param stop: index after the last record to evaluate, all the remaining records by default
+"""
+def select_rows(data, model_variables, range_variables, ignore_records, start=0, stop=None):
+    titles = data["titles"]
+    values = data["values"][start:stop]
+    missing = data["missing"][start:stop]
+    model_idx = [titles.index(var) for var in model_variables]
+
+    valid = np.logical_not(np.in1d(data["text"][0][start:stop], ignore_records))
+    model_missing = missing[:, model_idx]
+    all_missing = model_missing[:, 1:].all(axis=1)
+    some_missing = model_missing[:, 1:].any(axis=1)
+
+    inside_range = np.ones(values.shape[0], dtype=bool)
+    for var in range_variables:
+        idx = titles.index(var["name"])
+        vrang = var["range"]
+        if var["type"] == "category":
+            test = np.in1d(data["text"][idx][start:stop], vrang)
         else:
-            training_data.append(row)
-
-    # Saving index information
-    with open(test_filename.replace("-data", "-index"), "wb") as idxfile:
-        writer = csv.writer(idxfile, delimiter=",", quotechar='"', quoting=csv.QUOTE_MINIMAL)
-        for r in range(0, len(all_data)):
-            if r in test_idx: writer.writerow(idx_info[r])
-    with open(train_filename.replace("-data", "-index"), "wb") as idxfile:
-        writer = csv.writer(idxfile, delimiter=",", quotechar='"', quoting=csv.QUOTE_MINIMAL)
-        for r in range(0, len(all_data)):
-            if not r in test_idx: writer.writerow(idx_info[r])
-        
-    with open(train_filename, "wb") as trfile:
-        writer = csv.writer(trfile, delimiter=",", quotechar='"', quoting=csv.QUOTE_MINIMAL)
-        writer.writerow(model_variables)
-        for row in training_data:
-            writer.writerow(row)
-    print "Wrote", len(training_data), "rows to training set in", train_filename
-
-    with open(test_filename, "wb") as tefile:
-        writer = csv.writer(tefile, delimiter=",", quotechar='"', quoting=csv.QUOTE_MINIMAL)
-        writer.writerow(model_variables)
-        for row in testing_data:
-            writer.writerow(row)
-    print "Wrote", len(testing_data), "rows to training set in", test_filename
+            val = values[:, idx]
+            with np.errstate(invalid="ignore"):
+                test = (float(vrang[0]) <= val) & (val < float(vrang[1]))
+        inside_range &= missing[:, idx] | test
+
+    selected = valid & inside_range & ~all_missing & ~model_missing[:, 0]
+    rows = np.nonzero(selected)[0]
+    complete_rows = np.nonzero(~some_missing[rows])[0]
+    numbers = np.cumsum(valid)[rows]
+    return rows + start, complete_rows, numbers
+
+"""Returns a matrix with the indices of the test sets for the given split ids (one set per
+row). The test sets are stratified like in test_set, but the random choices of each split
+are drawn from its own random generator, seeded from the master seed and the split id, so
+any split can be reproduced independently of the others
+
+:param outcomes: values of the dependent variable in all rows of the dataset
+:param complete_rows: indices of rows w/out missing values in the dataset
+:param test_percentage: percentage of complete rows that will be used in the test set
+:param seed: master seed
+:param ids: list of split ids
+"""
+def test_sets(outcomes, complete_rows, test_percentage, seed, ids):
+    out = outcomes[complete_rows]
+    keys = np.array([np.random.RandomState([seed, id]).random_sample(len(complete_rows)) for id in ids])
+    keys = keys.reshape((len(ids), len(complete_rows)))
+    f = test_percentage / 100.0
+    itest = []
+    for value in [1, 0]:
+        iv = np.where(out == value)[0]
+        size = int(f * iv.shape[0])
+        # Taking the complete rows with the smallest keys is equivalent to choosing them at
+        # random without replacement, and is done for all splits at once
+        order = np.argsort(keys[:, iv], axis=1)[:, 0:size]
+        itest.append(iv[order])
+    itest = np.sort(np.concatenate(itest, axis=1), axis=1)
+    return np.array(complete_rows)[itest]
+
+"""Returns the name of the file storing the master seed of the sets in the given directory
+"""
+def seed_file(dir):
+    return os.path.join(dir, "split-seed.txt")
+
+"""Returns the master seed for a batch of splits in the given directory. If none is given, the
+seed recorded in the directory is reused, so the sets created again after a failure are drawn
+as before, or a new one is drawn if there is none. The seed is recorded in the directory and
+printed, so the sets can be created again with it
+
+:param dir: directory of the model
+:param seed: master seed, None to reuse the recorded seed or draw a new one
+"""
+def master_seed(dir, seed=None):
+    fn = seed_file(dir)
+    if seed is None and os.path.exists(fn):
+        with open(fn, "r") as sfile:
+            seed = int(sfile.read().strip())
+    if seed is None: seed = np.random.randint(0, 2**31 - 1)
+    with open(fn, "w") as sfile:
+        sfile.write(str(seed) + "\n")
+    print "Master seed of the training/test sets:", seed
+    return seed
+
+"""Loads the source data, variables, ranges and ignore list, and returns the selected rows
+ready to be split: their indices in the source data, their values (with ? for missing 
+values), index information, outcomes and the positions of the complete rows
+
+:param dir: directory of the model, where the variables file is looked up
+"""
+def prepare_data(dir):
+    data = load_source()
+    model_variables = load_variables(dir)
+    range_variables = load_ranges()
+    ignore_records = load_ignore()
+
+    rows, complete_rows, numbers = select_rows(data, model_variables, range_variables, ignore_records)
+    model_idx = [data["titles"].index(var) for var in model_variables]
+    all_data = np.where(data["missing"][rows][:, model_idx], "?", source_text(data, rows, model_idx))
+    outcomes = data["values"][rows, model_idx[0]]
+    idx_info = np.column_stack((numbers, source_text(data, rows, [0, model_idx[0]])))
+    return data, model_variables, rows, all_data, idx_info, outcomes, complete_rows
+
+"""Creates a training/test sets and saves them to the specified files. The test set won't
+have any missing values, and will include the given percentage of complete rows from the
+source data
+
+:param test_percentage: percentage of complete rows that will be used in the test set
+:param test_filename: name of file to store test set
+:param train_filename: name of file to store training set
+"""
+def makesets(test_percentage, test_filename, train_filename):
+    # Creating destination folder
+    test_dir = os.path.split(test_filename)[0]
+    train_dir = os.path.split(train_filename)[0]
+    if test_dir != train_dir:
+        print "Error: testing and training file should be stored in the same directory!"
+        exit(1)
+    if not os.path.exists(test_dir):
+        os.makedirs(test_dir)
+
+    _, model_variables, _, all_data, idx_info, outcomes, complete_rows = prepare_data(test_dir)
+    test_idx = test_set(outcomes, complete_rows, test_percentage)
+    in_test = np.zeros(len(all_data), dtype=bool)
+    in_test[test_idx] = True
+    save_sets(test_filename, train_filename, model_variables, all_data, idx_info, in_test)
+
+"""Saves a batch of training/test sets in the given directory, named training-data-ID.csv and
+testing-data-ID.csv, or only their indices in the splits file
+
+:param dir: directory where to store the sets
+:param ids: ids of the sets
+:param data: cached source data
+:param model_variables: list of model variables
+:param rows: indices in the source data of the selected rows
+:param all_data: selected rows
+:param idx_info: index information of the selected rows
+:param test_idx: matrix with the positions of the test rows of each set, padded with -1
+:param store: csv to save each set as CSV files, index to save only the indices of the rows
+              of all the sets in the splits file
+"""
+def save_batch(dir, ids, data, model_variables, rows, all_data, idx_info, test_idx, store):
+    if store == "index":
+        save_splits(dir, model_variables, rows, idx_info[:, 0].astype(int), ids, test_idx, data["file"])
+        return
+
+    for i in range(0, len(ids)):
+        in_test = np.zeros(len(all_data), dtype=bool)
+        in_test[test_idx[i][test_idx[i] >= 0]] = True
+        test_filename = os.path.join(dir, "testing-data-" + str(ids[i]) + ".csv")
+        train_filename = os.path.join(dir, "training-data-" + str(ids[i]) + ".csv")
+        save_sets(test_filename, train_filename, model_variables, all_data, idx_info, in_test)
+
+"""Creates n training/test sets in the given directory, named training-data-ID.csv and 
+testing-data-ID.csv. The source data is loaded and filtered only once, and all the test
+sets are drawn together. Returns the matrix with the indices of the test rows of each set
+
+:param n: number of training/test sets
+:param test_percentage: percentage of complete rows that will be used in each test set
+:param seed: master seed, the seed of each set is derived from it and the set id, if None it is
+             obtained with master_seed
+:param dir: directory where to store the sets
+:param id_start: id of first set
+:param store: csv to save each set as CSV files, index to save only the indices of the rows
+              of all the sets in the splits file
+:param ids: list of ids of the sets, instead of n sets starting at id_start
+"""
+def makesets_batch(n, test_percentage, seed, dir, id_start=0, store="csv", ids=None):
+    if not os.path.exists(dir):
+        os.makedirs(dir)
+
+    if ids is None: ids = range(id_start, id_start + n)
+    data, model_variables, rows, all_data, idx_info, outcomes, complete_rows = prepare_data(dir)
+    if seed is None: seed = master_seed(dir)
+    test_idx = test_sets(outcomes, complete_rows, test_percentage, seed, ids)
+    save_batch(dir, ids, data, model_variables, rows, all_data, idx_info, test_idx, store)
+    return test_idx
+
+"""Returns a matrix with the fold of each record in the source data (one row per repetition
+of the k-fold partition), or -1 for the records with missing outcome or in the ignore list.
+The folds are stratified by outcome, and only depend on the source data, the outcome, the
+ignore list and the seed, so all the models with the same outcome share them. The matrix
+is saved in the cache folder the first time it is computed
+
+:param data: cached source data
+:param outcome: dependent variable
+:param ignore_records: list of ids of the records to ignore
+:param folds: number of folds
+:param repeats: number of repetitions of the partition
+:param seed: seed of the partitions, the partition r is drawn using [seed, r]
+"""
+def fold_assignment(data, outcome, ignore_records, folds, repeats, seed):
+    key = hashlib.md5(source_stamp(data["file"]) + outcome + "\n" + "\n".join(sorted(ignore_records))).hexdigest()
+    fn = os.path.join(fold_dir, key + "-" + str(folds) + "-" + str(repeats) + "-" + str(seed) + ".npy")
+    if os.path.exists(fn): return np.load(fn)
+
+    idx = data["titles"].index(outcome)
+    eligible = ~data["missing"][:, idx] & ~np.in1d(data["text"][0], ignore_records)
+    out = data["values"][:, idx]
+    assign = np.empty((repeats, len(out)), dtype=np.int16)
+    assign.fill(-1)
+    for r in range(0, repeats):
+        rng = np.random.RandomState([seed, r])
+        offset = 0
+        for value in np.unique(out[eligible]):
+            iv = np.nonzero(eligible & (out == value))[0]
+            # Dealing the records of each class in random order, so every fold gets the same
+            # number of them (within one)
+            assign[r, rng.permutation(iv)] = (np.arange(len(iv)) + offset) % folds
+            offset += len(iv)
+
+    if not os.path.exists(fold_dir): os.makedirs(fold_dir)
+    temp_fn = fn + "-tmp-" + str(os.getpid()) + ".npy"
+    np.save(temp_fn, assign)
+    shutil.move(temp_fn, fn)
+    return assign
+
+"""Creates the training/test sets of a repeated k-fold cross-validation in the given directory.
+The set with id r*folds+k uses as test set the complete rows in the fold k of the repetition
+r, and all the other selected rows as training set. Returns the matrix with the indices of
+the test rows of each set, padded with -1
+
+:param folds: number of folds
+:param repeats: number of repetitions of the k-fold partition
+:param seed: seed of the partitions
+:param dir: directory where to store the sets
+:param id_start: id of first set
+:param n: number of sets, all the remaining ones by default
+:param store: csv to save each set as CSV files, index to save only the indices of the rows
+              of all the sets in the splits file
+:param ids: list of ids of the sets, instead of n sets starting at id_start
+"""
+def makesets_folds(folds, repeats, seed, dir, id_start=0, n=None, store="csv", ids=None):
+    if not os.path.exists(dir):
+        os.makedirs(dir)
+
+    if ids is None:
+        if n is None: n = folds * repeats - id_start
+        ids = range(id_start, id_start + n)
+    if not ids or folds * repeats < max(ids) + 1 or min(ids) < 0:
+        raise Exception("Set ids should be between 0 and " + str(folds * repeats - 1))
+    data, model_variables, rows, all_data, idx_info, outcomes, complete_rows = prepare_data(dir)
+    assign = fold_assignment(data, model_variables[0], load_ignore(), folds, repeats, seed)
+    complete_folds = assign[:, rows[complete_rows]]
+    itest = [complete_rows[complete_folds[id / folds] == id % folds] for id in ids]
+    test_idx = np.empty((len(ids), max([len(t) for t in itest])), dtype=int)
+    test_idx.fill(-1)
+    for i in range(0, len(ids)):
+        test_idx[i, 0:len(itest[i])] = itest[i]
+    save_batch(dir, ids, data, model_variables, rows, all_data, idx_info, test_idx, store)
+    return test_idx
+
+"""Selects rows in order with Knuth's sequential selection (algorithm S): each row is selected
+with probability needed / remaining, so exactly the needed number of rows is selected after
+all the remaining rows are seen, and all the subsets of that size are equally likely. Returns
+a boolean array with the selected rows and the number of rows still needed
+
+:param count: number of rows to select from, the next ones in order
+:param needed: number of rows still to select
+:param remaining: number of rows still to see, including these
+:param rng: random generator
+"""
+def select_sequential(count, needed, remaining, rng):
+    chosen = np.zeros(count, dtype=bool)
+    u = rng.random_sample(count)
+    for i in range(0, count):
+        if u[i] * (remaining - i) < needed:
+            chosen[i] = True
+            needed -= 1
+    return chosen, needed
+
+"""Creates a training/test sets like makesets, but reading the source data in chunks of the
+given number of records, so the memory used depends on the chunk size and not on the size of
+the source data. The first pass over the data counts the complete rows with each outcome, and
+the second draws the same number of test rows as test_set with sequential selection (see
+select_sequential) and writes both sets incrementally. Only the counts of rows are kept in
+memory between chunks
+
+:param test_percentage: percentage of complete rows that will be used in the test set
+:param test_filename: name of file to store test set
+:param train_filename: name of file to store training set
+:param chunk_size: number of records read at once from the source data
+:param rng: random generator used to draw the test rows, the global one by default
+"""
+def makesets_stream(test_percentage, test_filename, train_filename, chunk_size, rng=np.random):
+    test_dir = os.path.split(test_filename)[0]
+    train_dir = os.path.split(train_filename)[0]
+    if test_dir != train_dir:
+        print "Error: testing and training file should be stored in the same directory!"
+        exit(1)
+    if not os.path.exists(test_dir):
+        os.makedirs(test_dir)
+
+    data = load_source()
+    model_variables = load_variables(test_dir)
+    range_variables = load_ranges()
+    ignore_records = load_ignore()
+    model_idx = [data["titles"].index(var) for var in model_variables]
+    values = data["values"]
+    missing = data["missing"]
+    chunks = range(0, values.shape[0], chunk_size)
+
+    # First pass: number of complete rows with each outcome
+    counts = {0:0, 1:0}
+    for start in chunks:
+        rows, complete_rows, _ = select_rows(data, model_variables, range_variables, ignore_records,
+                                             start, start + chunk_size)
+        out = values[rows[complete_rows], model_idx[0]]
+        for value in [0, 1]:
+            counts[value] += np.count_nonzero(out == value)
+
+    # Number of test rows among the complete rows with each outcome
+    f = test_percentage / 100.0
+    needed = dict([(value, int(f * counts[value])) for value in [0, 1]])
+
+    # Second pass: writing the rows to the training or test set
+    files = [open(train_filename, "wb"), open(train_filename.replace("-data", "-index"), "wb"),
+             open(test_filename, "wb"), open(test_filename.replace("-data", "-index"), "wb")]
+    train_writer, train_idx_writer, test_writer, test_idx_writer = [csv.writer(file, delimiter=",", quotechar='"', quoting=csv.QUOTE_MINIMAL) for file in files]
+    train_writer.writerow(model_variables)
+    test_writer.writerow(model_variables)
+    seen = {0:0, 1:0}
+    first_number = 0
+    train_count = 0
+    test_count = 0
+    for start in chunks:
+        rows, complete_rows, numbers = select_rows(data, model_variables, range_variables, ignore_records,
+                                                   start, start + chunk_size)
+        numbers = numbers + first_number
+        first_number += np.count_nonzero(np.logical_not(np.in1d(data["text"][0][start:start + chunk_size], ignore_records)))
+        if not len(rows): continue
+
+        chunk_data = np.where(missing[rows][:, model_idx], "?", source_text(data, rows, model_idx))
+        chunk_info = np.column_stack((numbers, source_text(data, rows, [0, model_idx[0]])))
+        in_test = np.zeros(len(rows), dtype=bool)
+        out = values[rows[complete_rows], model_idx[0]]
+        for value in [0, 1]:
+            iv = complete_rows[out == value]
+            chosen, needed[value] = select_sequential(len(iv), needed[value], counts[value] - seen[value], rng)
+            in_test[iv[chosen]] = True
+            seen[value] += len(iv)
+
+        train_writer.writerows(chunk_data[~in_test].tolist())
+        train_idx_writer.writerows(chunk_info[~in_test].tolist())
+        test_writer.writerows(chunk_data[in_test].tolist())
+        test_idx_writer.writerows(chunk_info[in_test].tolist())
+        train_count += np.sum(~in_test)
+        test_count += np.sum(in_test)
+    for file in files: file.close()
+
+    print "Wrote", train_count, "rows to training set in", train_filename
+    print "Wrote", test_count, "rows to test set in", test_filename
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser()
@@ -175,5 +449,10 @@ if __name__ == "__main__":
                         help="Filename for test set")
     parser.add_argument('-p', '--percentage', type=int, nargs=1, default=[50],
                         help="Percentage of complete data to use in test set")
+    parser.add_argument('-c', '--chunk_size', type=int, nargs=1, default=[0],
+                        help="Number of records read at once from the source data, 0 to read all")
     args = parser.parse_args()
-    makesets(args.percentage[0], args.test[0], args.train[0])
\ No newline at end of file
+    if 0 < args.chunk_size[0]:
+        makesets_stream(args.percentage[0], args.test[0], args.train[0], args.chunk_size[0])
+    else:
+        makesets(args.percentage[0], args.test[0], args.train[0])
\ No newline at end of file
@@ -8,6 +8,7 @@ It should not be used in practice! Just for dev purposes.
 import argparse, csv, os
 import numpy as np
 import pandas as pd
+from imputation import load_variables, write_frames
 
 var_file = "./data/variables.txt"
 
@@ -17,7 +18,7 @@ each column.
 :param in_filename: input file with all the data
 :param out_filename: output file with only complete rows
 """
-def process(in_filename, out_filename):
+def process(in_filename, out_filename, **kwparams):
     print "Imputing missing values in",in_filename
     training = pd.DataFrame.from_csv(in_filename)
     training.reset_index(inplace=True)
@@ -48,7 +49,8 @@ def process(in_filename, out_filename):
         
     training.replace('?', combined_means, inplace=True)
     print "Writing complete data to",out_filename
-    training.to_csv(out_filename, index=False)
+    var_names, var_types = load_variables(in_filename)
+    write_frames(out_filename, [training[var_names].values.astype(np.float64)], var_names, var_types, None)
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser()
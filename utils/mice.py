@@ -9,14 +9,17 @@ http://www.ats.ucla.edu/stat/r/faq/R_pmm_mi.html
 """
 
 import os, argparse
-import rpy2.robjects as robjects
-from imputation import load_variables, load_bounds, aggregate_files
+import rpool
+from imputation import load_variables, load_bounds, load_data, write_frames, temp_prefix, generate_frames
 
 """Creates a complete training set by imputing missing values using MICE
 
 :param in_filename: input file with all the data
 :param out_filename: output file with only complete rows
-:param kwparams: optional arguments for MICE: num_imputed (number of imputed dataframes)
+:param kwparams: optional arguments for MICE: num_imputed (number of imputed dataframes),
+                 seed (seed of R's random generator), debug (also save the imputed
+                 datasets of the first run in a temporary file), and the options of the
+                 adaptive number of imputed dataframes (see imputation.adaptive_options)
 """
 def process(in_filename, out_filename, **kwparams):
     if "num_imputed" in kwparams:
@@ -24,23 +27,40 @@ def process(in_filename, out_filename, **kwparams):
     else:
         num_imputed = 5
 
+    if "debug" in kwparams:
+        debug = True if kwparams["debug"].lower() == "true" else False
+    else:
+        debug = False
+
     var_names, var_types = load_variables(in_filename)
     bounds = load_bounds(in_filename, var_names, var_types)
 
-    dir,_ = os.path.split(in_filename)
-    tmp_filename = os.path.join(dir, "temp-data-mice.csv")
+    tmp_filename = temp_prefix(in_filename, "mice")[:-1] + ".csv"
 
     print "Generating " + str(num_imputed) + " imputed datasets with MICE..."
-    robjects.r('library(mice)') 
-    robjects.r('trdat <- read.table("' + in_filename + '", sep=",", header=TRUE, na.strings="?")')
-    robjects.r('imdat <- mice(trdat, m=' + str(num_imputed) + ')')
-    robjects.r('codat <- complete(imdat, "long")')
-    robjects.r('drops <- c(".imp",".id")')
-    robjects.r('codat <- codat[,!(names(codat) %in% drops)]')
-    robjects.r('write.csv(codat, file="' + tmp_filename + '", row.names=FALSE)')
+    data = load_data(in_filename, var_names)
+
+    # Runs MICE in R and returns the given number of new imputed datasets, each run after the
+    # first one starts from another seed
+    def run_mice(start, count):
+        commands = ['library(mice)']
+        if "seed" in kwparams:
+            commands.append('set.seed(' + str(int(kwparams["seed"]) + start) + ')')
+        commands.append('imdat <- mice(trdat, m=' + str(count) + ')')
+        if debug and start == 0:
+            # All the imputed datasets are stacked in the same file
+            commands.extend(['codat <- complete(imdat, "long")',
+                             'drops <- c(".imp",".id")',
+                             'codat <- codat[,!(names(codat) %in% drops)]',
+                             'write.csv(codat, file="' + tmp_filename + '", row.names=FALSE)'])
+
+        # The training data is passed to R as a data frame, and the imputed datasets are returned
+        # as matrices
+        results = ['data.matrix(complete(imdat, ' + str(i) + '))' for i in range(1, count + 1)]
+        return rpool.run(commands, results, {"trdat":(var_names, data)})
 
-    imp_files = [tmp_filename]
-    aggregate_files(out_filename, imp_files, var_names, var_types, bounds)
+    frames = generate_frames(run_mice, data, num_imputed, kwparams)
+    write_frames(out_filename, frames, var_names, var_types, bounds)
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser()
@@ -50,7 +70,19 @@ if __name__ == "__main__":
                         help="name of output training file afer imputation")
     parser.add_argument("-n", "--num_imputed", type=int, nargs=1, default=[5],
                         help="number of imputed datasets")
+    parser.add_argument("-a", "--adaptive", nargs=1, default=[""],
+                        help="add imputed datasets until this statistic converges: moments or auc")
+    parser.add_argument("-T", "--adaptive_tol", type=float, nargs=1, default=[0.01],
+                        help="maximum change of the statistic in adaptive mode")
+    parser.add_argument("-M", "--max_imputed", type=int, nargs=1, default=[20],
+                        help="maximum number of imputed datasets in adaptive mode")
+    parser.add_argument("-d", "--debug", action="store_true",
+                        help="save the imputed datasets in a temporary file")
 
     args = parser.parse_args()
     process(in_filename=args.input[0], out_filename=args.output[0],
-            num_imputed=str(args.num_imputed[0]))
\ No newline at end of file
+            num_imputed=str(args.num_imputed[0]),
+            adaptive=args.adaptive[0],
+            adaptive_tol=str(args.adaptive_tol[0]),
+            max_imputed=str(args.max_imputed[0]),
+            debug=str(args.debug))
\ No newline at end of file
@@ -5,21 +5,18 @@ This script gives information on the missingness in the input file.
 """
 
 import os, csv, argparse
+from datacache import load_source, source_rows
 
 parser = argparse.ArgumentParser()
 parser.add_argument("-s", "--show_complete", action="store_true",
                     help="show complete data")
 args = parser.parse_args()
 
-src_file = "./data/sources.txt"
 var_file = "./data/variables.txt"
 range_file = "./data/ranges.txt"
 ignore_file = "./data/ignore.txt"
 
-input_file = ""
-with open(src_file, "rb") as sfile:
-    for line in sfile.readlines():
-        input_file = os.path.abspath(line.strip())
+data = load_source()
 
 model_variables = []
 with open(var_file, "rb") as vfile:
@@ -50,51 +47,49 @@ complete_count = 0
 missing_count = [0] * len(model_variables)
 
 complete_data = []
-with open(input_file, "rb") as ifile:
-    reader = csv.reader(ifile)
-    titles = reader.next()
-    model_idx = [titles.index(var) for var in model_variables]
-    r = 0 
-    for row in reader:
-        if row[0] in ignore_records: continue
+titles = data["titles"]
+model_idx = [titles.index(var) for var in model_variables]
+r = 0 
+for row in source_rows(data):
+    if row[0] in ignore_records: continue
 
-        all_missing = True
-        some_missing = False
-        missing_dvar = row[model_idx[0]] == "\\N"
-        for i in range(1, len(model_variables)):
-             var_idx = model_idx[i]
-             if row[var_idx] == "\\N":
-                 some_missing = True
-             else:
-                 all_missing = False
+    all_missing = True
+    some_missing = False
+    missing_dvar = row[model_idx[0]] == "\\N"
+    for i in range(1, len(model_variables)):
+         var_idx = model_idx[i]
+         if row[var_idx] == "\\N":
+             some_missing = True
+         else:
+             all_missing = False
                  
-             inside_range = True
-             for var in range_variables:
-                 idx = titles.index(var["name"])
-                 val = row[idx]
-                 if val == "\\N": continue
-                 vtype = var["type"]
-                 vrang = var["range"]
-                 test = True
-                 if vtype == "category":
-                     test = val in vrang
-                 else:
-                     test = float(vrang[0]) <= float(val) and float(val) < float(vrang[1])
-                 inside_range = inside_range and test
+         inside_range = True
+         for var in range_variables:
+             idx = titles.index(var["name"])
+             val = row[idx]
+             if val == "\\N": continue
+             vtype = var["type"]
+             vrang = var["range"]
+             test = True
+             if vtype == "category":
+                 test = val in vrang
+             else:
+                 test = float(vrang[0]) <= float(val) and float(val) < float(vrang[1])
+             inside_range = inside_range and test
 
-        if not all_missing and not missing_dvar and inside_range:
-            total_count = total_count + 1
-            if not some_missing:
-                complete_row = []
-                for i in range(0, len(model_variables)):
-                    var_idx = model_idx[i]
-                    complete_row.append(row[var_idx])
-                complete_data.append(complete_row)
-                complete_count = complete_count + 1
+    if not all_missing and not missing_dvar and inside_range:
+        total_count = total_count + 1
+        if not some_missing:
+            complete_row = []
             for i in range(0, len(model_variables)):
                 var_idx = model_idx[i]
-                if row[var_idx] == "\\N":
-                    missing_count[i] = missing_count[i] + 1
+                complete_row.append(row[var_idx])
+            complete_data.append(complete_row)
+            complete_count = complete_count + 1
+        for i in range(0, len(model_variables)):
+            var_idx = model_idx[i]
+            if row[var_idx] == "\\N":
+                missing_count[i] = missing_count[i] + 1
 
 print "Total number of data rows   :",total_count
 print "Number of complete data rows:",complete_count
@@ -0,0 +1,112 @@
+"""
+Index of the completed models in the models folder, saved in models/index.csv with the name,
+predictor, variables and score (average F1 in the evaluation report) of each model. In an
+exhaustive sweep, the models of size k are the models of size k-1 plus one variable, so the
+training stage can start the predictor of a model from the parameters of the best model with
+one variable less (see train.py -W), instead of a random initialization. The coefficients of
+the variables shared with that model are copied, and the coefficient of the new variable is
+zero.
+
+@copyright: The Broad Institute of MIT and Harvard 2015
+"""
+
+import os, argparse
+import numpy as np
+from makesets import load_variables
+
+"""Returns the name of the index file
+"""
+def index_file(base_dir):
+    return os.path.join(base_dir, "models", "index.csv")
+
+"""Loads the index, returning a list with a tuple (name, predictor, variables, score) for each
+model, where the score is None if unknown. A model recorded several times keeps its last entry.
+Jobs creating the index at the same time can write the titles more than once, so every line
+with the titles is skipped, as well as the lines that cannot be parsed
+"""
+def load_models(base_dir):
+    fn = index_file(base_dir)
+    if not os.path.exists(fn): return []
+    entries = {}
+    with open(fn, "r") as ifile:
+        for line in ifile.readlines():
+            parts = line.strip().split(",")
+            if len(parts) < 4 or parts[0] == "MODEL": continue
+            try:
+                score = float(parts[3]) if parts[3] else None
+            except ValueError:
+                continue
+            entries[(parts[0], parts[1])] = (parts[0], parts[1], parts[2].split(), score)
+    return entries.values()
+
+"""Adds a model to the index. Each entry is written with a single append, so the jobs sharing
+the models folder can record their models at the same time
+
+:param base_dir: base directory
+:param name: name of the model
+:param predictor: name of the predictor
+:param variables: independent variables of the model
+:param score: score of the model, None if unknown
+"""
+def record_model(base_dir, name, predictor, variables, score=None):
+    fn = index_file(base_dir)
+    line = ",".join([name, predictor, " ".join(variables), "" if score is None else str(score)]) + "\n"
+    if not os.path.exists(fn):
+        line = "MODEL,PREDICTOR,VARIABLES,SCORE\n" + line
+    with open(fn, "a") as ifile:
+        ifile.write(line)
+
+"""Returns the average F1 score in an evaluation report, or None if it cannot be found
+"""
+def report_score(report_filename):
+    if not os.path.exists(report_filename): return None
+    with open(report_filename, "r") as rfile:
+        for line in reversed(rfile.readlines()):
+            if line.startswith("Total,"):
+                try:
+                    return float(line.split(",")[3])
+                except (ValueError, IndexError):
+                    return None
+    return None
+
+"""Returns the name of the model in the index with the highest score among those trained with
+the predictor on all the given variables but one, or None if there is none
+
+:param base_dir: base directory
+:param predictor: name of the predictor
+:param variables: independent variables of the model
+"""
+def find_parent(base_dir, predictor, variables):
+    best = None
+    for name, pred, vars, score in load_models(base_dir):
+        if pred != predictor or len(vars) != len(variables) - 1 or not set(vars) < set(variables): continue
+        if best is None or (score is not None and (best[1] is None or best[1] < score)):
+            best = (name, score)
+    return best[0] if best else None
+
+"""Returns the coefficients of a model with the given variables from the coefficients of the
+model whose parameters are in init_params, which are indexed by its variables in the last
+dimension. The variables are read from the folder of that model, and the outcome position
+holds the coefficient of the bias term. The coefficients of the variables not in that model
+are zero
+
+:param init_params: parameters file of the model with one variable less
+:param coeffs: coefficients of that model
+:param variables: variables of the model, with the outcome first
+"""
+def map_coefficients(init_params, coeffs, variables):
+    init_variables = load_variables(os.path.dirname(os.path.abspath(init_params)))
+    mapped = np.zeros(coeffs.shape[0:-1] + (len(variables),))
+    mapped[..., 0] = coeffs[..., 0]
+    for j in range(1, len(variables)):
+        if variables[j] in init_variables:
+            mapped[..., j] = coeffs[..., init_variables.index(variables[j])]
+    return mapped
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-B', '--base_dir', nargs=1, default=["./"],
+                        help="Base directory")
+    args = parser.parse_args()
+    for name, predictor, variables, score in sorted(load_models(args.base_dir[0])):
+        print name, predictor, ",".join(variables), "" if score is None else score
@@ -0,0 +1,35 @@
+"""
+This script doesn't impute the missing values: the training set is saved as it is, with the
+missing values, for the predictors that handle them directly (gbtree, scikit_milreg). With it,
+the sets of a model are created without running any imputation.
+
+@copyright: The Broad Institute of MIT and Harvard 2015
+"""
+
+import argparse
+import numpy as np
+from imputation import load_variables, load_data, save_frame, write_rows
+
+"""Creates an output file with all the rows in the input file, keeping the missing values
+
+:param in_filename: input file with all the data
+:param out_filename: output file with the same rows
+"""
+def process(in_filename, out_filename, **kwparams):
+    print "Keeping missing values in",in_filename
+    var_names, var_types = load_variables(in_filename)
+    data = load_data(in_filename, var_names)
+
+    print "Writing data to",out_filename
+    save_frame(out_filename, data, var_names, var_types)
+    # There is a single dataset, so all the rows are shared (FRAME -1)
+    write_rows(out_filename, np.arange(len(data)), np.repeat(-1, len(data)))
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-i', '--input', nargs=1, default=["./models/test/training-data.csv"],
+                        help="name of input training file")
+    parser.add_argument('-o', '--output', nargs=1, default=["./models/test/training-data-completed.csv"],
+                        help="name of output training file")
+    args = parser.parse_args()
+    process(args.input[0], args.output[0])
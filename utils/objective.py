@@ -0,0 +1,82 @@
+"""
+Objective functions for the scipy minimizers. The cost and the gradient of a predictor are
+computed together by a single function, and the result for the last parameters is kept, so
+the cost and gradient callbacks of the minimizer, evaluated at the same parameters, share one
+pass over the data. The cost at the end of each iteration is recorded from the kept result,
+without evaluating the function again.
+
+@copyright: The Broad Institute of MIT and Harvard 2015
+"""
+
+import numpy as np
+
+"""Compares the gradient with the central finite differences of the cost, and prints the
+arguments where they differ by more than maxerr
+
+:param cost: function that returns the cost given the parameters and the args
+:param theta: parameters
+:param grad: analytical gradient at theta
+:param args: additional arguments of the cost function
+"""
+def check_gradient(cost, theta, grad, args=(), epsilon=1E-5, maxerr=0.01):
+    ok = True
+    size = theta.shape[0]
+    for i in range(0, size):
+        theta0 = np.copy(theta)
+        theta1 = np.copy(theta)
+
+        theta0[i] = theta0[i] - epsilon
+        theta1[i] = theta1[i] + epsilon
+
+        c0 = cost(theta0, *args)
+        c1 = cost(theta1, *args)
+        diff = abs((c1 - c0) / (2 * epsilon) - grad[i])
+        if maxerr < diff:
+            print "Numerical and analytical gradients differ by",diff,"at argument",i,"/",size
+            ok = False
+    if ok:
+        print "Numerical and analytical gradients coincide within the given precision of",maxerr
+    return ok
+
+"""Objective to minimize, from a function that returns the cost and its gradient. The cost,
+gradient and callback methods are passed to the minimizer, and the costs at the end of each
+iteration are stored in values
+"""
+class Objective:
+    """
+    :param fun: function that returns a tuple with the cost and the gradient, given the
+                parameters and the args
+    :param args: additional arguments of fun
+    :param check: if True, the gradient is checked against finite differences of the cost
+                  every time the function is evaluated
+    """
+    def __init__(self, fun, args=(), check=False):
+        self.fun = fun
+        self.args = args
+        self.check = check
+        self.theta = None
+        self.value = None
+        self.grad = None
+        self.values = []
+
+    def evaluate(self, theta):
+        if self.theta is None or not np.array_equal(theta, self.theta):
+            self.value, self.grad = self.fun(theta, *self.args)
+            # The minimizer can modify its array in place
+            self.theta = np.array(theta, copy=True)
+            if self.check:
+                check_gradient(lambda t, *args: self.fun(t, *args)[0], self.theta, self.grad, self.args)
+
+    def cost(self, theta):
+        self.evaluate(theta)
+        return self.value
+
+    def gradient(self, theta):
+        self.evaluate(theta)
+        return self.grad
+
+    """Adds the cost at the parameters of the current iteration to the values, the
+    minimizers have evaluated it already
+    """
+    def callback(self, theta):
+        self.values.append(self.cost(theta))
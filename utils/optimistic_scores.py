@@ -26,6 +26,7 @@ from sklearn.preprocessing import label_binarize
 from sklearn.metrics import roc_auc_score
 from sklearn.metrics import precision_score, recall_score, f1_score
 import shutil
+from splits import load_stacked
 
 def _num_samples(x):
     """Return number of samples in array-like x."""
@@ -247,10 +248,11 @@ with open(rank_file, "r") as rfile:
 
                 title = []
                 data = []
-                with open(train_file) as tfile:
-                    lines = tfile.readlines()
-                    title = lines[0]
-                    data.extend(lines[1:])
+                # The merged rows of imputed training sets are repeated by their weights, so
+                # the bootstrap samples the rows of all the imputed datasets
+                lines = load_stacked(train_file).to_csv(index=False, na_rep="?").splitlines(True)
+                title = lines[0]
+                data.extend(lines[1:])
                 with open(test_file) as tfile:
                     lines = tfile.readlines()
                     data.extend(lines[1:])
@@ -11,16 +11,13 @@ import argparse
 import sys, csv, os, random
 import numpy as np
 from sklearn.decomposition import PCA
+from datacache import load_source, source_rows
 
-src_file = "./data/sources.txt"
 var_file = "./data/variables.txt"
 range_file = "./data/ranges.txt"
 
 def do_pca(test_filename, train_filename, num_comp):
-    input_file = ""
-    with open(src_file, "rb") as sfile:
-        for line in sfile.readlines():
-            input_file = os.path.abspath(line.strip())
+    data = load_source()
 
     model_variables = []
     with open(var_file, "rb") as vfile:
@@ -42,44 +39,42 @@ def do_pca(test_filename, train_filename, num_comp):
     all_data = []
     idx_info = []
     complete_rows = []
-    with open(input_file, "rb") as ifile:
-        reader = csv.reader(ifile)
-        titles = reader.next()
-        model_idx = [titles.index(var) for var in model_variables]
-        r0 = 0
-        r = 0
-        for row in reader:
-            r0 += 1 # Starts at 1, because of titles
-            all_missing = True
-            some_missing = False
-            missing_dvar = row[model_idx[0]] == "\\N"
-            for i in range(1, len(model_variables)):
-                var_idx = model_idx[i]
-                if row[var_idx] == "\\N":
-                    some_missing = True
-                else:
-                    all_missing = False
-
-            inside_range = True
-            for var in range_variables:
-                idx = titles.index(var["name"])
-                val = row[idx]
-                if val == "\\N": continue
-                vtype = var["type"]
-                vrang = var["range"]
-                test = True
-                if vtype == "category":
-                    test = val in vrang
-                else:
-                    test = float(vrang[0]) <= float(val) and float(val) < float(vrang[1])
-                inside_range = inside_range and test
-
-            if not all_missing and not missing_dvar and inside_range:
-                ids.append(row[0])
-                idx_info.append([r0, row[0], row[model_idx[0]]])
-                all_data.append([row[idx].replace("\\N", "?") for idx in model_idx])
-                if not some_missing: complete_rows.append(r)
-                r += 1
+    titles = data["titles"]
+    model_idx = [titles.index(var) for var in model_variables]
+    r0 = 0
+    r = 0
+    for row in source_rows(data):
+        r0 += 1 # Starts at 1, because of titles
+        all_missing = True
+        some_missing = False
+        missing_dvar = row[model_idx[0]] == "\\N"
+        for i in range(1, len(model_variables)):
+            var_idx = model_idx[i]
+            if row[var_idx] == "\\N":
+                some_missing = True
+            else:
+                all_missing = False
+
+        inside_range = True
+        for var in range_variables:
+            idx = titles.index(var["name"])
+            val = row[idx]
+            if val == "\\N": continue
+            vtype = var["type"]
+            vrang = var["range"]
+            test = True
+            if vtype == "category":
+                test = val in vrang
+            else:
+                test = float(vrang[0]) <= float(val) and float(val) < float(vrang[1])
+            inside_range = inside_range and test
+
+        if not all_missing and not missing_dvar and inside_range:
+            ids.append(row[0])
+            idx_info.append([r0, row[0], row[model_idx[0]]])
+            all_data.append([row[idx].replace("\\N", "?") for idx in model_idx])
+            if not some_missing: complete_rows.append(r)
+            r += 1
 
     ######################################################################################
     # PCA TEST
@@ -110,6 +105,8 @@ def do_pca(test_filename, train_filename, num_comp):
 #     print ttest_data
 
 
+    # Each row is transformed in place, so the weights of the rows of an imputed training set
+    # (training-rows-completed-ID.csv) still apply to the transformed file
     ttrain_data = [title]
     with open(train_filename, "rb") as ifile:
         reader = csv.reader(ifile)
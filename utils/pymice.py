@@ -0,0 +1,231 @@
+"""
+This script imputes the missing values by chained equations (the algorithm of the MICE
+package in R), implemented in NumPy. Each imputed dataset is the result of an independent
+chain: the missing values are initialized with random observed values, and then every
+variable with missing values is imputed in turn from a regression on all the other variables,
+for the given number of iterations. Category variables are imputed with logistic regression
+(one-vs-rest when there are more than two categories), and numerical variables with
+predictive mean matching or Bayesian linear regression.
+
+van Buuren, S., Groothuis-Oudshoorn, K. (2011). mice: Multivariate Imputation by Chained
+Equations in R. Journal of Statistical Software, 45(3), 1-67
+
+@copyright: The Broad Institute of MIT and Harvard 2015
+"""
+
+import argparse
+import numpy as np
+from imputation import load_variables, load_bounds, load_data, write_frames, generate_frames
+
+"""Returns the design matrix to impute the variable j: an intercept, the other variables
+standardized, and indicator columns for the categories of the variables with more than two
+
+:param filled: data matrix without missing values
+:param j: index of the imputed variable
+:param levels: list with the categories of each category variable, None for numerical ones
+"""
+def design_matrix(filled, j, levels):
+    cols = [np.ones(filled.shape[0])]
+    for k in range(0, filled.shape[1]):
+        if k == j: continue
+        x = filled[:, k]
+        if levels[k] is not None and 2 < len(levels[k]):
+            cols.extend([(x == lev).astype(np.float64) for lev in levels[k][1:]])
+        else:
+            sd = x.std()
+            cols.append((x - x.mean()) / sd if 0 < sd else x - x.mean())
+    return np.column_stack(cols)
+
+"""Draws the coefficients of a Bayesian linear regression of y on X. Returns the least
+squares estimate, the drawn coefficients and the drawn residual standard deviation
+
+:param X: design matrix
+:param y: dependent variable
+:param ridge: ridge penalty, relative to the diagonal of X'X
+:param rng: random generator
+"""
+def linear_draw(X, y, ridge, rng):
+    xtx = X.T.dot(X)
+    xtx += ridge * np.diag(np.diag(xtx))
+    v = np.linalg.pinv(xtx)
+    coef = v.dot(X.T.dot(y))
+    res = y - X.dot(coef)
+    df = max(len(y) - X.shape[1], 1)
+    sigma = np.sqrt(res.dot(res) / rng.chisquare(df))
+    w, u = np.linalg.eigh(v)
+    beta = coef + sigma * (u * np.sqrt(np.clip(w, 0, None))).dot(rng.standard_normal(len(coef)))
+    return coef, beta, sigma
+
+"""Fits a logistic regression of the binary variable y on X with iteratively reweighted
+least squares, and draws its coefficients from the normal approximation of the posterior
+
+:param X: design matrix
+:param y: binary dependent variable (0 or 1)
+:param ridge: ridge penalty
+:param rng: random generator
+:param max_iter: maximum number of iterations
+"""
+def logistic_draw(X, y, ridge, rng, max_iter=25):
+    beta = np.zeros(X.shape[1])
+    penalty = ridge * np.eye(X.shape[1])
+    penalty[0, 0] = 0
+    for iter in range(0, max_iter):
+        p = 1.0 / (1.0 + np.exp(-np.clip(X.dot(beta), -30, 30)))
+        w = p * (1 - p)
+        hess = (X * w[:, None]).T.dot(X) + penalty
+        step = np.linalg.pinv(hess).dot(X.T.dot(y - p) - penalty.dot(beta))
+        beta += step
+        if np.abs(step).max() < 1e-6: break
+    cov = np.linalg.pinv(hess)
+    w, u = np.linalg.eigh(cov)
+    return beta + (u * np.sqrt(np.clip(w, 0, None))).dot(rng.standard_normal(len(beta)))
+
+"""Imputes the missing values of a numerical variable
+
+:param X: design matrix
+:param y: current values of the variable
+:param mis: mask of the missing values
+:param method: pmm for predictive mean matching, norm for Bayesian linear regression
+:param donors: number of candidate donors in predictive mean matching
+:param ridge: ridge penalty
+:param rng: random generator
+"""
+def impute_numeric(X, y, mis, method, donors, ridge, rng):
+    obs = ~mis
+    coef, beta, sigma = linear_draw(X[obs], y[obs], ridge, rng)
+    pred_mis = X[mis].dot(beta)
+    if method == "norm":
+        return pred_mis + sigma * rng.standard_normal(len(pred_mis))
+
+    # Each missing value is taken from one of the observed values with the closest
+    # predictions, chosen at random
+    pred_obs = X[obs].dot(coef)
+    y_obs = y[obs]
+    k = min(donors, len(y_obs))
+    dist = np.abs(pred_mis[:, None] - pred_obs[None, :])
+    closest = np.argpartition(dist, k - 1, axis=1)[:, 0:k]
+    choice = closest[np.arange(len(pred_mis)), rng.randint(0, k, len(pred_mis))]
+    return y_obs[choice]
+
+"""Imputes the missing values of a category variable
+
+:param X: design matrix
+:param y: current values of the variable
+:param mis: mask of the missing values
+:param levels: categories of the variable
+:param ridge: ridge penalty
+:param rng: random generator
+"""
+def impute_category(X, y, mis, levels, ridge, rng):
+    obs = ~mis
+    if len(levels) == 1: return np.repeat(levels[0], np.sum(mis))
+    if len(levels) == 2:
+        beta = logistic_draw(X[obs], (y[obs] == levels[1]).astype(np.float64), ridge, rng)
+        p = 1.0 / (1.0 + np.exp(-X[mis].dot(beta)))
+        return np.where(rng.random_sample(len(p)) < p, levels[1], levels[0])
+
+    probs = np.column_stack([1.0 / (1.0 + np.exp(-X[mis].dot(logistic_draw(X[obs], (y[obs] == lev).astype(np.float64), ridge, rng))))
+                             for lev in levels])
+    cum = np.cumsum(probs / probs.sum(axis=1)[:, None], axis=1)
+    idx = (cum < rng.random_sample(len(cum))[:, None]).sum(axis=1)
+    return levels[np.minimum(idx, len(levels) - 1)]
+
+"""Returns the given number of imputed copies of the data
+
+:param data: data matrix, with NaN in the missing values
+:param var_names: list of variable names
+:param var_types: dictionary with the type of each variable
+:param bounds: bounds of each variable, as returned by load_bounds
+:param num_imputed: number of imputed datasets
+:param iterations: number of iterations of each chain
+:param method: pmm or norm, method used to impute numerical variables
+:param donors: number of candidate donors in predictive mean matching
+:param ridge: ridge penalty of the regressions
+:param rng: random generator
+"""
+def impute(data, var_names, var_types, bounds, num_imputed=5, iterations=5, method="pmm",
+           donors=5, ridge=1e-5, rng=np.random):
+    missing = np.isnan(data)
+    p = data.shape[1]
+    levels = [np.unique(data[~missing[:, j], j]) if var_types[var_names[j]] == "category" else None
+              for j in range(0, p)]
+    incomplete = [j for j in range(0, p) if missing[:, j].any()]
+
+    frames = []
+    for m in range(0, num_imputed):
+        filled = data.copy()
+        for j in incomplete:
+            mis = missing[:, j]
+            observed = data[~mis, j]
+            filled[mis, j] = observed[rng.randint(0, len(observed), np.sum(mis))]
+        for iter in range(0, iterations):
+            for j in incomplete:
+                mis = missing[:, j]
+                X = design_matrix(filled, j, levels)
+                if levels[j] is not None:
+                    filled[mis, j] = impute_category(X, filled[:, j], mis, levels[j], ridge, rng)
+                else:
+                    vals = impute_numeric(X, filled[:, j], mis, method, donors, ridge, rng)
+                    filled[mis, j] = np.clip(vals, bounds[j][0], bounds[j][1])
+        frames.append(filled)
+    return frames
+
+"""Creates a complete training set by imputing missing values using chained equations
+
+:param in_filename: input file with all the data
+:param out_filename: output file with only complete rows
+:param kwparams: optional arguments: num_imputed (number of imputed dataframes), iterations
+                 (number of iterations of each chain), method (pmm or norm for numerical
+                 variables), donors (number of donors in pmm), seed (random seed), and the
+                 options of the adaptive number of imputed dataframes (see
+                 imputation.adaptive_options)
+"""
+def process(in_filename, out_filename, **kwparams):
+    num_imputed = int(kwparams["num_imputed"]) if "num_imputed" in kwparams else 5
+    iterations = int(kwparams["iterations"]) if "iterations" in kwparams else 5
+    method = kwparams["method"] if "method" in kwparams else "pmm"
+    donors = int(kwparams["donors"]) if "donors" in kwparams else 5
+    rng = np.random.RandomState(int(kwparams["seed"])) if "seed" in kwparams else np.random
+
+    var_names, var_types = load_variables(in_filename)
+    bounds = load_bounds(in_filename, var_names, var_types)
+    data = load_data(in_filename, var_names)
+
+    print "Generating " + str(num_imputed) + " imputed datasets with chained equations..."
+    frames = generate_frames(lambda start, count: impute(data, var_names, var_types, bounds, count, iterations,
+                                                         method, donors, rng=rng),
+                             data, num_imputed, kwparams)
+    print "Success!"
+    write_frames(out_filename, frames, var_names, var_types, bounds)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-i", "--input", nargs=1, default=["./models/test/training-data.csv"],
+                        help="name of input training file")
+    parser.add_argument("-o", "--output", nargs=1, default=["./models/test/training-data-completed.csv"],
+                        help="name of output training file afer imputation")
+    parser.add_argument("-n", "--num_imputed", type=int, nargs=1, default=[5],
+                        help="number of imputed datasets")
+    parser.add_argument("-a", "--adaptive", nargs=1, default=[""],
+                        help="add imputed datasets until this statistic converges: moments or auc")
+    parser.add_argument("-T", "--adaptive_tol", type=float, nargs=1, default=[0.01],
+                        help="maximum change of the statistic in adaptive mode")
+    parser.add_argument("-M", "--max_imputed", type=int, nargs=1, default=[20],
+                        help="maximum number of imputed datasets in adaptive mode")
+    parser.add_argument("-t", "--iterations", type=int, nargs=1, default=[5],
+                        help="number of iterations")
+    parser.add_argument("-m", "--method", nargs=1, default=["pmm"],
+                        help="imputation of numerical variables: pmm or norm")
+    parser.add_argument("-s", "--seed", type=int, nargs=1, default=[None],
+                        help="random seed")
+
+    args = parser.parse_args()
+    kwparams = {"num_imputed":str(args.num_imputed[0]),
+                "iterations":str(args.iterations[0]),
+                "method":args.method[0]}
+    if args.seed[0] is not None: kwparams["seed"] = str(args.seed[0])
+    if args.adaptive[0]:
+        kwparams.update({"adaptive":args.adaptive[0],
+                         "adaptive_tol":str(args.adaptive_tol[0]),
+                         "max_imputed":str(args.max_imputed[0])})
+    process(in_filename=args.input[0], out_filename=args.output[0], **kwparams)
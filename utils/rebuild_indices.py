@@ -7,8 +7,8 @@ rows in the original data that were used in the sets.
 
 import os, glob, csv
 import pandas as pd
+from datacache import load_source, source_rows
 
-src_file = "./data/sources.txt"
 var_file = "./data/variables.txt"
 
 def load_data(fn, vars):
@@ -62,11 +62,6 @@ def rebuild_indices(data_files):
 test_files = glob.glob("./data/testing-data*.csv")
 train_files = glob.glob("./data/training-data*.csv")
 
-data_file = ""
-with open(src_file, "rb") as sfile:
-    for line in sfile.readlines():
-        data_file = os.path.abspath(line.strip())
-
 var_names = []
 with open(var_file, "rb") as vfile:
     for line in vfile.readlines():
@@ -74,7 +69,9 @@ with open(var_file, "rb") as vfile:
         if not line: continue
         var_names.append(line.split()[0])
 
-idx0, data0 = load_data(data_file, var_names)
+source = load_source()
+idx0 = [source["titles"].index(var) for var in var_names]
+data0 = list(source_rows(source))
 
 rebuild_indices(test_files)
 rebuild_indices(train_files)
\ No newline at end of file
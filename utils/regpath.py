@@ -0,0 +1,59 @@
+"""
+Regularization paths for the logistic regressions. Instead of a single value, inv_reg can be
+given as a log-spaced grid, start:stop:num (for instance inv_reg=0.1:100:20), and the
+regression is fitted for each value in increasing order, starting each fit from the solution
+of the previous one. The path is fitted twice: first without a validation fold of the
+training rows, to compute the validation loss of each value, and then on all the rows, to
+obtain the coefficients stored in the parameters file. The predictor uses the coefficients
+with the lowest validation loss, so the regularization is chosen for each training set
+without training again.
+
+The rows of an imputed training set that come from the same row of the training set (in
+different imputed datasets) are always on the same side of the validation fold.
+
+@copyright: The Broad Institute of MIT and Harvard 2015
+"""
+
+import os
+import numpy as np
+from imputation import rows_filename, load_rows
+from splits import load_frame
+
+"""Returns the values of the inverse regularization coefficient in a path, in increasing
+order, or None if the argument is a single value
+
+:param inv_reg: single value, or start:stop:num for num values from start to stop on a
+                logarithmic grid
+"""
+def path_values(inv_reg):
+    if ":" not in inv_reg: return None
+    parts = inv_reg.split(":")
+    if len(parts) != 3:
+        raise Exception("Invalid regularization path " + inv_reg + ", the format is start:stop:num")
+    start, stop, num = float(parts[0]), float(parts[1]), int(parts[2])
+    if start <= 0 or stop <= 0 or num < 1:
+        raise Exception("Invalid regularization path " + inv_reg + ", the values must be positive")
+    return np.sort(np.logspace(np.log10(start), np.log10(stop), num))
+
+"""Returns a boolean array that selects the rows of the training file in the validation fold
+
+:param train_filename: name of the training file
+:param kwparams: custom arguments of the predictor: valid_frac (fraction of the training rows
+                 in the validation fold, 0.2 by default) and seed
+"""
+def validation_rows(train_filename, kwparams):
+    fraction = float(kwparams["valid_frac"]) if "valid_frac" in kwparams else 0.2
+    rng = np.random.RandomState(int(kwparams["seed"]) if "seed" in kwparams else 0)
+    if os.path.exists(rows_filename(train_filename)):
+        rows = load_rows(train_filename)[0]
+    else:
+        rows = np.arange(len(load_frame(train_filename)))
+    sources = np.unique(rows)
+    valid = sources[rng.permutation(len(sources))[0:max(1, int(round(fraction * len(sources))))]]
+    return np.in1d(rows, valid)
+
+"""Returns the weighted log-loss of the predicted probabilities p of the outcomes y
+"""
+def validation_loss(y, p, w):
+    p = np.clip(p, 1e-12, 1 - 1e-12)
+    return -np.dot(w, y * np.log(p) + (1 - y) * np.log(1 - p)) / w.sum()
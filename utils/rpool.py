@@ -0,0 +1,348 @@
+"""
+Persistent pool of R worker processes. Each worker embeds R through rpy2 and loads the
+packages used by the imputation and statistics scripts only once, so the scripts submit
+their R commands to a running worker instead of starting R every time. The pool is
+started with:
+
+python utils/rpool.py start -w 4
+
+and listens on a local port, which is written together with the authentication key to
+the address file (./cache/rpool.txt, or the file in the RPOOL_FILE environment variable).
+Workers that crash (Amelia segfaults, for instance) are restarted, and the request that
+was running in them fails with an error. The pool applies the limits of the supervisor to the
+workers: core dumps are disabled, the memory of each worker can be limited (-m), and a worker
+is killed and replaced when its request runs longer than the timeout (-t, or the timeout of the
+request), or when the client that sent the request disconnects, for instance because it was
+killed by the supervisor. Data is passed to R as data frames built from
+NumPy arrays, and matrices are returned as NumPy arrays, so no intermediate files are
+needed. If no pool is running, the commands are evaluated by an embedded R in the calling
+process.
+
+@copyright: The Broad Institute of MIT and Harvard 2015
+"""
+
+import os, sys, time, signal, socket, threading, argparse, binascii, Queue
+import numpy as np
+from multiprocessing import Process, Pipe
+from multiprocessing.connection import Listener, Client, AuthenticationError, deliver_challenge, answer_challenge
+from supervisor import limit_resources
+
+address_file = "./cache/rpool.txt"
+# Maximum time in seconds between the connection of a client and its request
+request_wait = 30
+packages = ["Amelia", "Hmisc", "mice", "PredictABEL"]
+
+"""Returns the name of the address file of the pool
+"""
+def pool_file():
+    return os.environ.get("RPOOL_FILE", address_file)
+
+"""Assigns the given NumPy arrays to R data frames, with NA for the NaN values
+
+:param robjects: rpy2 robjects module
+:param frames: dictionary with the name of each data frame in R, and a tuple with the list of
+               its column names and the array with its values
+"""
+def assign_frames(robjects, frames):
+    for name in frames:
+        columns, data = frames[name]
+        data = np.asarray(data, dtype=np.float64)
+        values = robjects.FloatVector(data.ravel(order="F").tolist())
+        robjects.globalenv[name] = robjects.r["matrix"](values, nrow=data.shape[0], ncol=data.shape[1])
+        robjects.r(name + ' <- as.data.frame(' + name + ')')
+        robjects.r(name + '[is.na(' + name + ')] <- NA')
+        robjects.r('colnames(' + name + ') <- c(' + ', '.join(['"' + col + '"' for col in columns]) + ')')
+
+"""Converts an R value into a NumPy array if it is a matrix, or into a list otherwise
+"""
+def convert_value(robjects, value):
+    dims = list(robjects.r('function(x) if (is.null(dim(x))) integer(0) else dim(x)')(value))
+    if len(dims) == 2:
+        return np.array(list(value)).reshape(dims, order="F")
+    return list(value)
+
+"""Evaluates the R commands in order, and returns the values of the result expressions,
+converted to lists, or to NumPy arrays for matrices
+
+:param robjects: rpy2 robjects module
+:param commands: list of R commands
+:param results: list of R expressions to return
+:param frames: data frames to assign before evaluating the commands, see assign_frames
+"""
+def eval_commands(robjects, commands, results, frames={}):
+    assign_frames(robjects, frames)
+    for cmd in commands:
+        robjects.r(cmd)
+    return [convert_value(robjects, robjects.r(expr)) for expr in results]
+
+"""Main loop of a worker process: loads the packages and evaluates the requests received
+through the connection, until it is closed
+
+:param conn: connection with the pool
+:param packages: list of R packages to load
+:param memory: maximum address space of the worker in MB, 0 for no limit
+"""
+def worker_loop(conn, packages, memory=0):
+    limit_resources(memory)
+    import rpy2.robjects as robjects
+    for pkg in packages:
+        try:
+            robjects.r('suppressMessages(library(' + pkg + '))')
+        except Exception:
+            print "Warning: cannot load R package", pkg
+    while True:
+        try:
+            request = conn.recv()
+        except EOFError:
+            break
+        if request is None: break
+        cwd, commands, results, frames = request
+        try:
+            # Requests share nothing, except for the loaded packages
+            robjects.r('graphics.off()')
+            robjects.r('rm(list=ls())')
+            os.chdir(cwd)
+            conn.send(("ok", eval_commands(robjects, commands, results, frames)))
+        except Exception as e:
+            conn.send(("error", str(e)))
+
+"""Starts a new worker process, returning a dictionary with the process and the connection
+to it
+"""
+def start_worker(packages, memory=0):
+    conn, child_conn = Pipe()
+    process = Process(target=worker_loop, args=(child_conn, packages, memory))
+    process.daemon = True
+    process.start()
+    child_conn.close()
+    return {"process":process, "conn":conn, "packages":packages, "memory":memory}
+
+"""Kills the process of a worker, first asking it to terminate, and starts a new worker process
+in its place
+"""
+def restart_worker(worker, grace=5):
+    process = worker["process"]
+    if process.is_alive():
+        process.terminate()
+        process.join(grace)
+        if process.is_alive(): os.kill(process.pid, signal.SIGKILL)
+    process.join()
+    worker["conn"].close()
+    worker.update(start_worker(worker["packages"], worker["memory"]))
+
+"""Sends a request to the worker and waits for the reply. If the worker dies while running
+it, a new worker process replaces it. The worker is also replaced if the request runs longer
+than the timeout, or if the client disconnects before the reply, in which case None is
+returned
+
+:param worker: worker dictionary
+:param request: tuple with the working directory, the commands, the result expressions and
+                the data frames
+:param client: connection with the client that sent the request
+:param timeout: maximum running time of the request in seconds, 0 for no limit
+:param poll: interval in seconds between checks of the client and the timeout
+"""
+def run_worker(worker, request, client, timeout=0, poll=0.5):
+    start = time.time()
+    try:
+        worker["conn"].send(request)
+        while not worker["conn"].poll(poll):
+            # The client sends nothing else, so its connection only becomes readable when closed
+            if client.poll(0):
+                print "Client of R worker", worker["process"].pid, "disconnected, restarting..."
+                restart_worker(worker)
+                return None
+            if 0 < timeout and timeout < time.time() - start:
+                print "R worker", worker["process"].pid, "exceeded the timeout, restarting..."
+                restart_worker(worker)
+                return ("error", "R request killed after exceeding the timeout of " + str(timeout) + " seconds")
+        return worker["conn"].recv()
+    except (EOFError, IOError):
+        worker["process"].join(1)
+        code = worker["process"].exitcode
+        print "R worker", worker["process"].pid, "crashed with exit code", code, "restarting..."
+        worker.update(start_worker(worker["packages"], worker["memory"]))
+        return ("error", "R worker crashed with exit code " + str(code))
+
+"""Runs the pool until a stop request is received
+
+:param num_workers: number of R worker processes
+:param packages: list of R packages to load in each worker
+:param timeout: maximum running time in seconds of the requests that don't give their own,
+                0 for no limit
+:param memory: maximum address space of each worker in MB, 0 for no limit
+"""
+def serve(num_workers, packages, timeout=0, memory=0):
+    key = os.urandom(16)
+    # The clients are authenticated in their own threads (see dispatch), so the listener
+    # doesn't check the key
+    listener = Listener(("localhost", 0))
+    workers = [start_worker(packages, memory) for i in range(0, num_workers)]
+    idle = Queue.Queue()
+    for worker in workers: idle.put(worker)
+
+    def handle(conn, request):
+        worker = idle.get()
+        try:
+            # Requests whose client is already gone are not run
+            reply = None
+            if not conn.poll(0):
+                reply = run_worker(worker, request[0:4], conn, request[4] if 0 < request[4] else timeout)
+        finally:
+            idle.put(worker)
+        if reply is None:
+            conn.close()
+            return
+        try:
+            conn.send(reply)
+            conn.close()
+        except IOError:
+            pass
+
+    stopped = threading.Event()
+
+    def dispatch(conn):
+        try:
+            deliver_challenge(conn, key)
+            answer_challenge(conn, key)
+            # Clients send their request right after connecting
+            if not conn.poll(request_wait):
+                conn.close()
+                return
+            request = conn.recv()
+        except (EOFError, IOError, AuthenticationError):
+            # Clients with the key of another pool, from a stale address file for instance
+            conn.close()
+            return
+        if request[0] == "run":
+            handle(conn, request[1:])
+        elif request[0] == "status":
+            conn.send(("ok", [num_workers, idle.qsize()]))
+            conn.close()
+        elif request[0] == "stop":
+            conn.send(("ok", []))
+            conn.close()
+            stopped.set()
+            # Wakes up the main loop, waiting for connections
+            socket.create_connection(listener.address).close()
+
+    # The address file is written last, when the pool is ready to take requests
+    fn = pool_file()
+    dir = os.path.split(fn)[0]
+    if dir and not os.path.exists(dir): os.makedirs(dir)
+    with open(fn + ".tmp", "w") as afile:
+        afile.write(listener.address[0] + " " + str(listener.address[1]) + " " + binascii.hexlify(key) + "\n")
+    os.rename(fn + ".tmp", fn)
+    print "R pool with", num_workers, "workers listening on port", listener.address[1]
+
+    # Each connection is handled in its own thread, so a client that doesn't complete the
+    # authentication or doesn't send its request doesn't hold the others
+    while not stopped.is_set():
+        try:
+            conn = listener.accept()
+        except (EOFError, IOError):
+            continue
+        if stopped.is_set():
+            conn.close()
+            break
+        thread = threading.Thread(target=dispatch, args=(conn,))
+        thread.daemon = True
+        thread.start()
+
+    if os.path.exists(fn): os.remove(fn)
+    listener.close()
+    for worker in workers:
+        try:
+            worker["conn"].send(None)
+        except IOError:
+            pass
+        worker["process"].join(5)
+        if worker["process"].is_alive(): worker["process"].terminate()
+    print "R pool stopped"
+
+"""Returns a connection to the running pool, or None if there is no pool
+"""
+def connect():
+    fn = pool_file()
+    if not os.path.exists(fn): return None
+    with open(fn, "r") as afile:
+        host, port, key = afile.read().split()
+    try:
+        return Client((host, int(port)), authkey=binascii.unhexlify(key))
+    except Exception:
+        # Stale address file
+        return None
+
+"""Sends a request to the running pool and returns its reply, or None if there is no pool
+"""
+def request(*args):
+    conn = connect()
+    if conn is None: return None
+    conn.send(args)
+    reply = conn.recv()
+    conn.close()
+    return reply
+
+"""Evaluates the R commands in a worker of the pool, or in the embedded R of this process
+if no pool is running. Returns the values of the result expressions as lists, or as NumPy
+arrays for matrices. Raises an exception if any command fails, or if the pool kills the
+worker after the timeout
+
+:param commands: list of R commands
+:param results: list of R expressions whose values are returned
+:param frames: dictionary of data frames assigned in R before running the commands, with the
+               name of each one, and a tuple with its column names and an array with its values
+:param timeout: maximum running time in seconds in the pool, 0 for the timeout of the pool.
+                Without a pool, the time is only limited by the supervisor of the process
+"""
+def run(commands, results=[], frames={}, timeout=0):
+    reply = request("run", os.getcwd(), commands, results, frames, timeout)
+    if reply is None:
+        import rpy2.robjects as robjects
+        return eval_commands(robjects, commands, results, frames)
+    status, value = reply
+    if status != "ok":
+        raise Exception("Error in R: " + value)
+    return value
+
+"""Waits until the pool is ready to take requests, returns False if it is not ready after the
+given number of seconds
+"""
+def wait_ready(timeout):
+    start = time.time()
+    while time.time() - start < timeout:
+        if request("status") is not None: return True
+        time.sleep(0.5)
+    return False
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("action", nargs="?", default="start",
+                        help="start, stop or status")
+    parser.add_argument("-w", "--workers", type=int, nargs=1, default=[2],
+                        help="number of R worker processes")
+    parser.add_argument("-p", "--packages", nargs=1, default=[",".join(packages)],
+                        help="comma-separated list of R packages loaded by the workers")
+    parser.add_argument("-t", "--timeout", type=int, nargs=1, default=[0],
+                        help="maximum running time of each request in seconds, 0 for no limit")
+    parser.add_argument("-m", "--memory", type=int, nargs=1, default=[0],
+                        help="maximum memory of each worker in MB, 0 for no limit")
+    args = parser.parse_args()
+
+    if args.action == "start":
+        if request("status") is not None:
+            print "R pool already running, address in", pool_file()
+            exit(1)
+        serve(args.workers[0], [pkg for pkg in args.packages[0].split(",") if pkg], args.timeout[0], args.memory[0])
+    elif args.action == "stop":
+        if request("stop") is None:
+            print "No R pool running"
+    elif args.action == "status":
+        reply = request("status")
+        if reply is None:
+            print "No R pool running"
+        else:
+            print "R pool running with", reply[1][0], "workers,", reply[1][1], "idle"
+    else:
+        print "Error: unknown action", args.action
+        exit(1)
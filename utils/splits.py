@@ -0,0 +1,381 @@
+"""
+Storage of training/test sets. Sets can be saved as CSV files (training-data-ID.csv,
+testing-data-ID.csv and the corresponding index files), or only as the indices of their
+rows in the cached source data, stored in a single splits.npz file per model. In the latter
+case the data is materialized on demand by load_frame, which accepts the name the CSV file
+would have, so both storage formats can be read in the same way. The export function writes
+the CSV files from the indices, for tools that need them. Imputed training sets saved in the
+binary format (training-data-completed-ID.npz) are read by load_frame in the same way. The
+method that imputed each set, and whether it succeeded, are recorded in imputation-status.csv.
+
+@copyright: The Broad Institute of MIT and Harvard 2015
+"""
+
+import os, re, csv, glob, pickle, argparse
+import numpy as np
+import pandas as pd
+from datacache import load_source, source_stamp, source_text
+from imputation import load_variables, rows_filename, load_rows, write_rows, save_frame
+
+loaded_splits = {}
+
+"""Returns the name of the file storing the indices of the sets in the given directory
+"""
+def splits_file(dir):
+    return os.path.join(dir, "splits.npz")
+
+"""Saves a training or test set as a CSV file, together with its index file
+
+:param filename: name of file to store the set
+:param model_variables: list of model variables
+:param set_data: rows in the set
+:param set_info: index information of the rows in the set
+"""
+def write_set(filename, model_variables, set_data, set_info):
+    with open(filename.replace("-data", "-index"), "wb") as idxfile:
+        writer = csv.writer(idxfile, delimiter=",", quotechar='"', quoting=csv.QUOTE_MINIMAL)
+        writer.writerows(set_info.tolist())
+
+    with open(filename, "wb") as ofile:
+        writer = csv.writer(ofile, delimiter=",", quotechar='"', quoting=csv.QUOTE_MINIMAL)
+        writer.writerow(model_variables)
+        writer.writerows(set_data.tolist())
+
+"""Saves a training/test pair as CSV files, together with the index files
+
+:param test_filename: name of file to store test set
+:param train_filename: name of file to store training set
+:param model_variables: list of model variables
+:param all_data: selected rows
+:param idx_info: index information of the selected rows
+:param in_test: boolean mask with the rows in the test set
+"""
+def save_sets(test_filename, train_filename, model_variables, all_data, idx_info, in_test):
+    write_set(train_filename, model_variables, all_data[~in_test], idx_info[~in_test])
+    print "Wrote", np.sum(~in_test), "rows to training set in", train_filename
+    write_set(test_filename, model_variables, all_data[in_test], idx_info[in_test])
+    print "Wrote", np.sum(in_test), "rows to test set in", test_filename
+
+"""Saves the indices of the given sets in the splits file of the directory. Sets already
+stored in the file with other ids are kept, as long as they were created from the same rows
+
+:param dir: directory of the model
+:param model_variables: list of model variables
+:param rows: indices in the source data of the rows selected for the model
+:param numbers: record numbers of the selected rows, as stored in the index files
+:param ids: ids of the sets
+:param test_idx: matrix with the positions (within rows) of the test rows of each set,
+                 padded with -1 when the sets have different sizes
+:param input_file: source data file
+"""
+def save_splits(dir, model_variables, rows, numbers, ids, test_idx, input_file):
+    ids = np.array(ids)
+    fn = splits_file(dir)
+    if os.path.exists(fn):
+        old = load_splits(dir)
+        if np.array_equal(old["rows"], rows) and list(old["variables"]) == model_variables:
+            keep = np.logical_not(np.in1d(old["ids"], ids))
+            old_idx = old["test"][keep]
+            width = max(old_idx.shape[1], test_idx.shape[1])
+            old_idx = np.pad(old_idx, ((0, 0), (0, width - old_idx.shape[1])), "constant", constant_values=-1)
+            test_idx = np.pad(test_idx, ((0, 0), (0, width - test_idx.shape[1])), "constant", constant_values=-1)
+            ids = np.concatenate((old["ids"][keep], ids))
+            test_idx = np.concatenate((old_idx, test_idx))
+        else:
+            print "Selected rows changed, removing previous sets from", fn
+
+    order = np.argsort(ids)
+    np.savez(fn, variables=np.array(model_variables), rows=rows, numbers=numbers,
+             ids=ids[order], test=test_idx[order], source=np.array(input_file),
+             stamp=np.array(source_stamp(input_file)))
+    loaded_splits.pop(fn, None)
+    print "Saved indices of", len(ids), "training/test sets in", fn
+
+"""Loads the splits file of the given directory, keeping it in memory for later calls
+"""
+def load_splits(dir):
+    fn = splits_file(dir)
+    if not fn in loaded_splits:
+        with np.load(fn) as npz:
+            loaded_splits[fn] = dict((key, npz[key]) for key in npz.files)
+    return loaded_splits[fn]
+
+"""Returns the ids of the sets stored in the splits file of the directory
+"""
+def split_ids(dir):
+    if not os.path.exists(splits_file(dir)): return []
+    return load_splits(dir)["ids"].tolist()
+
+"""Returns the cached source data the sets in the directory were created from, together
+with the positions in the source of the model variables, and a boolean mask for each
+set with the test rows
+"""
+def split_source(dir, id):
+    splits = load_splits(dir)
+    input_file = str(splits["source"])
+    data = load_source(input_file)
+    if source_stamp(input_file) != str(splits["stamp"]):
+        raise Exception("Source data " + input_file + " changed after creating the sets in " + dir)
+    pos = np.nonzero(splits["ids"] == id)[0]
+    if not len(pos):
+        raise Exception("Training/test set " + str(id) + " not found in " + splits_file(dir))
+    in_test = np.zeros(len(splits["rows"]), dtype=bool)
+    test_idx = splits["test"][pos[0]]
+    in_test[test_idx[test_idx >= 0]] = True
+    model_idx = [data["titles"].index(var) for var in splits["variables"]]
+    return data, model_idx, in_test
+
+"""Parses a file name of a training or testing set, returning its directory, kind
+(training or testing), type (data or index) and id. Returns None if the name doesn't
+correspond to a set stored in a splits file
+"""
+def parse_name(filename):
+    dir, name = os.path.split(filename)
+    match = re.match(r"(training|testing)-(data|index)-([0-9]+)\.csv$", name)
+    if not match or not os.path.exists(splits_file(dir)): return None
+    id = int(match.group(3))
+    if not id in split_ids(dir): return None
+    return dir, match.group(1), match.group(2), id
+
+"""Returns the name of the binary file (.npz) storing the data of the given CSV file
+"""
+def binary_file(filename):
+    return os.path.splitext(filename)[0] + ".npz"
+
+"""Returns True if the given training/testing file exists, in CSV or binary format, or can be
+materialized from the stored indices
+"""
+def frame_exists(filename):
+    return os.path.exists(filename) or os.path.exists(binary_file(filename)) or parse_name(filename) is not None
+
+"""Converts the integer columns of a data frame created from an array to int, as if the
+data frame was read from a CSV file
+"""
+def integer_columns(df):
+    for col in df.columns:
+        values = df[col].values
+        if values.dtype.kind != "f": continue
+        if not np.isnan(values).any() and np.array_equal(values, np.round(values)):
+            df[col] = values.astype(np.int64)
+    return df
+
+"""Loads the data in the given training/testing file into a data frame, with NaN for the
+missing values. If the file doesn't exist, the data is materialized from the indices in
+the splits file and the cached source data
+
+:param filename: name of the CSV file
+"""
+def load_frame(filename):
+    if os.path.exists(filename):
+        return pd.read_csv(filename, delimiter=",", na_values="?")
+    if os.path.exists(binary_file(filename)):
+        with np.load(binary_file(filename)) as npz:
+            return integer_columns(pd.DataFrame(npz["data"], columns=npz["variables"].tolist()))
+    parsed = parse_name(filename)
+    if parsed is None:
+        raise IOError("File " + filename + " does not exist")
+    dir, kind, _, id = parsed
+    data, model_idx, in_test = split_source(dir, id)
+    rows = load_splits(dir)["rows"]
+    sel = rows[in_test] if kind == "testing" else rows[~in_test]
+    df = pd.DataFrame(data["values"][sel][:, model_idx], columns=load_splits(dir)["variables"].tolist())
+    # The values of the non-numerical columns are NaN, they are read from the text as in the CSV
+    # file instead
+    for j in range(0, len(model_idx)):
+        if data["numeric"][model_idx[j]]: continue
+        col = data["text"][model_idx[j]][sel].astype(object)
+        col[data["missing"][sel, model_idx[j]]] = np.nan
+        df[df.columns[j]] = pd.to_numeric(col, errors="ignore")
+    # Same column types that would result from reading the CSV file
+    return integer_columns(df)
+
+"""Returns the weight of each row in the given training file, as loaded by load_frame. Rows
+of imputed training sets can stand for several identical rows (see imputation.merge_rows),
+the weights of all the other rows are 1
+
+:param filename: name of the CSV file
+"""
+def load_weights(filename):
+    if os.path.exists(rows_filename(filename)):
+        return load_rows(filename)[2].astype(np.float64)
+    return np.ones(len(load_frame(filename)))
+
+"""Loads the data in the given training file into a data frame as load_frame, repeating each
+row as many times as its weight, so an imputed training set with merged rows reads as the
+plain stack of all its imputed datasets. For the scripts that don't take weights
+
+:param filename: name of the CSV file
+"""
+def load_stacked(filename):
+    df = load_frame(filename)
+    if not os.path.exists(rows_filename(filename)): return df
+    weights = load_rows(filename)[2]
+    return df.iloc[np.repeat(np.arange(len(df)), weights)].reset_index(drop=True)
+
+"""Pools the predictors trained on each imputed dataset into an ensemble that averages their
+predicted probabilities: loads the pickled parameters of each predictor and saves them as a
+list in the parameters file of the ensemble. Returns the number of predictors
+
+:param param_files: parameter files of the predictors trained on the imputed datasets
+:param param_filename: name of file to store the pooled predictors
+"""
+def save_ensemble(param_files, param_filename):
+    predictors = []
+    for fn in param_files:
+        with open(fn, "rb") as pfile:
+            predictors.append(pickle.load(pfile))
+    with open(param_filename, "wb") as pfile:
+        pickle.dump(predictors, pfile)
+    return len(predictors)
+
+"""Saves each imputed dataset in an imputed training file as a separate training file, in
+binary format, including the rows shared by all the datasets (FRAME -1). Returns the names
+of the files, given by the name the CSV file would have
+
+:param filename: name of the imputed training file
+:param prefix: prefix of the names of the files, which must contain -data
+"""
+def split_frames(filename, prefix):
+    df = load_frame(filename)
+    data = df.values.astype(np.float64)
+    var_names = df.columns.tolist()
+    var_types = load_variables(filename)[1]
+    _, frames, weights = load_rows(filename)
+    shared = frames == -1
+    # Each shared row stands for one row in each dataset
+    weights = np.where(shared, 1, weights)
+    ids = np.unique(frames[~shared]).tolist()
+    if not ids: ids = [-1]
+    files = []
+    for k in ids:
+        sel = np.logical_or(shared, frames == k)
+        fn = prefix + str(len(files)) + ".csv"
+        save_frame(binary_file(fn), data[sel], var_names, var_types)
+        write_rows(fn, np.nonzero(sel)[0], frames[sel], weights[sel])
+        files.append(fn)
+    return files
+
+"""Returns the lines of the given index file, or materialized from the splits file. Returns
+None if the index information is not available
+
+:param filename: name of the index file
+"""
+def load_index(filename):
+    if os.path.exists(filename):
+        with open(filename, "r") as idxfile:
+            return idxfile.readlines()
+    parsed = parse_name(filename)
+    if parsed is None: return None
+    dir, kind, _, id = parsed
+    data, model_idx, in_test = split_source(dir, id)
+    splits = load_splits(dir)
+    mask = in_test if kind == "testing" else ~in_test
+    rows = splits["rows"][mask]
+    numbers = splits["numbers"][mask]
+    ids = data["text"][0]
+    outcomes = data["text"][model_idx[0]]
+    return [",".join([str(numbers[i]), ids[rows[i]], outcomes[rows[i]]]) + "\n"
+            for i in range(0, len(rows))]
+
+"""Returns the names of all testing files in the given directory, either existing as CSV
+files or stored in the splits file
+"""
+def testing_files(dir):
+    files = glob.glob(dir + "/testing-data-*.csv")
+    for id in split_ids(dir):
+        fn = dir + "/testing-data-" + str(id) + ".csv"
+        if not fn in files: files.append(fn)
+    return files
+
+"""Returns the names of all the imputed training files in the given directory, saved either
+as CSV or binary files. Binary files are given by the name the CSV file would have
+"""
+def completed_files(dir):
+    files = glob.glob(dir + "/training-data-completed-*.csv")
+    for fn in glob.glob(dir + "/training-data-completed-*.npz"):
+        fn = os.path.splitext(fn)[0] + ".csv"
+        if not fn in files: files.append(fn)
+    return files
+
+"""Returns the name of the file with the imputation status of the sets in the given directory
+"""
+def status_file(dir):
+    return os.path.join(dir, "imputation-status.csv")
+
+"""Returns a dictionary with the imputation method and the status (pending, done or failed) of
+each set recorded in the status file of the given directory, empty if there is no file
+"""
+def load_status(dir):
+    status = {}
+    fn = status_file(dir)
+    if not os.path.exists(fn): return status
+    with open(fn, "rb") as sfile:
+        reader = csv.reader(sfile, delimiter=",", quotechar='"')
+        reader.next()
+        for row in reader:
+            if row: status[int(row[0])] = (row[1], row[2])
+    return status
+
+"""Records the imputation method and status of the given sets in the status file of the
+directory, keeping the entries of the other sets
+
+:param dir: directory of the model
+:param entries: dictionary with a tuple (method, status) for each set id
+"""
+def save_status(dir, entries):
+    status = load_status(dir)
+    status.update(entries)
+    fn = status_file(dir)
+    temp_fn = fn + "-tmp-" + str(os.getpid())
+    with open(temp_fn, "wb") as sfile:
+        writer = csv.writer(sfile, delimiter=",", quotechar='"', quoting=csv.QUOTE_MINIMAL)
+        writer.writerow(["ID", "METHOD", "STATUS"])
+        for id in sorted(status.keys()):
+            writer.writerow([id, status[id][0], status[id][1]])
+    os.rename(temp_fn, fn)
+
+"""Returns the ids of the given sets that are not imputed yet: those without imputed training
+set, or whose last imputation didn't succeed according to the status file. Sets created before
+the status file was introduced count as imputed if their imputed training set exists
+
+:param dir: directory of the model
+:param ids: ids of the sets
+"""
+def pending_sets(dir, ids):
+    status = load_status(dir)
+    return [id for id in ids if status.get(id, ("", "done"))[1] != "done" or
+            not frame_exists(os.path.join(dir, "training-data-completed-" + str(id) + ".csv"))]
+
+"""Writes the training/test sets stored in the splits file as CSV files
+
+:param dir: directory of the model
+:param ids: ids of the sets to export, all by default
+:param kinds: kinds of sets to export, training and/or testing
+"""
+def export_sets(dir, ids=None, kinds=["training", "testing"]):
+    splits = load_splits(dir)
+    if ids is None: ids = splits["ids"].tolist()
+    model_variables = splits["variables"].tolist()
+    rows = splits["rows"]
+    for id in ids:
+        data, model_idx, in_test = split_source(dir, id)
+        all_data = np.where(data["missing"][rows][:, model_idx], "?", source_text(data, rows, model_idx))
+        idx_info = np.column_stack((splits["numbers"], source_text(data, rows, [0, model_idx[0]])))
+        for kind in kinds:
+            mask = in_test if kind == "testing" else ~in_test
+            fn = os.path.join(dir, kind + "-data-" + str(id) + ".csv")
+            write_set(fn, model_variables, all_data[mask], idx_info[mask])
+            print "Wrote", np.sum(mask), "rows to", kind, "set in", fn
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-B', '--base_dir', nargs=1, default=["./"],
+                        help="Base directory")
+    parser.add_argument('-N', '--name', nargs=1, default=["test"],
+                        help="Model name")
+    parser.add_argument('-i', '--ids', nargs=1, default=[""],
+                        help="Comma-separated list of ids of the sets to export, all by default")
+    args = parser.parse_args()
+    model_dir = os.path.join(args.base_dir[0], "models", args.name[0])
+    ids = [int(id) for id in args.ids[0].split(",")] if args.ids[0] else None
+    export_sets(model_dir, ids)
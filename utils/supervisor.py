@@ -0,0 +1,115 @@
+"""
+Runs commands in child processes with a wall-clock timeout, a limit on the memory (address
+space) of each process and core dumps disabled, and reports how they ended: ok, error (non-zero
+exit code), signal (killed by a signal, a crash in R for instance) or timeout. A command that
+runs longer than the timeout is killed together with all the processes it started. The limits
+are inherited by those processes. The R pool workers run outside of them, so the pool applies
+the same limits to its workers, and kills the worker running the request of a process killed
+by the supervisor (see rpool.py).
+Usage:
+
+python utils/supervisor.py -t 3600 -m 4000 python init.py -N test -m amelia
+
+@copyright: The Broad Institute of MIT and Harvard 2015
+"""
+
+import os, sys, time, signal, resource, subprocess, argparse
+
+"""Disables core dumps in the current process, and limits its address space to the given
+number of MB (0 for no limit)
+"""
+def limit_resources(memory=0):
+    resource.setrlimit(resource.RLIMIT_CORE, (0, 0))
+    if 0 < memory:
+        limit = memory * 1024 * 1024
+        resource.setrlimit(resource.RLIMIT_AS, (limit, limit))
+
+"""Returns the exit status of a process as a dictionary with the status (ok, error, signal or
+timeout), the exit code or the name of the signal that killed the process, and the elapsed
+time in seconds
+
+:param returncode: exit code of the process, negative if killed by a signal
+:param elapsed: running time of the process
+:param timed_out: True if the process was killed because it exceeded the timeout
+"""
+def exit_status(returncode, elapsed, timed_out=False):
+    status = {"status":"ok", "code":returncode, "signal":"", "elapsed":elapsed}
+    if timed_out:
+        status["status"] = "timeout"
+    elif returncode is not None and returncode < 0:
+        status["status"] = "signal"
+        names = [name for name in dir(signal) if name.startswith("SIG") and not name.startswith("SIG_") and getattr(signal, name) == -returncode]
+        status["signal"] = names[0] if names else str(-returncode)
+    elif returncode != 0:
+        status["status"] = "error"
+    return status
+
+"""Returns a one-line description of an exit status
+"""
+def describe(status):
+    if status["status"] == "ok": text = "finished"
+    elif status["status"] == "timeout": text = "killed after exceeding the timeout"
+    elif status["status"] == "signal": text = "killed by " + status["signal"]
+    else: text = "failed with exit code " + str(status["code"])
+    return text + " in " + str(int(round(status["elapsed"]))) + " seconds"
+
+"""Kills the process group of a child process started by run, first asking it to terminate
+and then killing all the processes left in the group after the grace period in seconds
+"""
+def kill_group(process, grace=5):
+    try:
+        os.killpg(process.pid, signal.SIGTERM)
+    except OSError:
+        return
+    start = time.time()
+    while process.poll() is None and time.time() - start < grace:
+        time.sleep(0.1)
+    try:
+        os.killpg(process.pid, signal.SIGKILL)
+    except OSError:
+        pass
+
+"""Runs the command in a child process, in its own process group, and returns its exit
+status (see exit_status)
+
+:param command: list with the program and its arguments, or a shell command line
+:param timeout: maximum running time in seconds, 0 for no limit
+:param memory: maximum address space of each process in MB, 0 for no limit
+:param poll: interval in seconds between checks of the child process
+"""
+def run(command, timeout=0, memory=0, poll=0.1):
+    def setup():
+        os.setpgrp()
+        limit_resources(memory)
+
+    start = time.time()
+    process = subprocess.Popen(command, shell=isinstance(command, basestring), preexec_fn=setup)
+    timed_out = False
+    try:
+        while process.poll() is None:
+            if 0 < timeout and timeout < time.time() - start:
+                timed_out = True
+                kill_group(process)
+                process.wait()
+                break
+            time.sleep(poll)
+    finally:
+        # The child processes don't outlive the supervisor
+        if process.poll() is None: kill_group(process, 0)
+    return exit_status(process.returncode, time.time() - start, timed_out)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-t", "--timeout", type=int, nargs=1, default=[0],
+                        help="maximum running time in seconds, 0 for no limit")
+    parser.add_argument("-m", "--memory", type=int, nargs=1, default=[0],
+                        help="maximum memory of each process in MB, 0 for no limit")
+    parser.add_argument("command", nargs=argparse.REMAINDER,
+                        help="command to run")
+    args = parser.parse_args()
+    if not args.command:
+        print "Error: no command given"
+        exit(1)
+    status = run(args.command, args.timeout[0], args.memory[0])
+    print "Command", describe(status)
+    sys.exit(0 if status["status"] == "ok" else 1)
@@ -0,0 +1,118 @@
+"""
+Derives the training/test sets of a model from the imputed sets of a master model, whose
+variables include all the variables of the model. In a sweep over subsets of the master
+variables, the master model is imputed once per set id, and the sets of every other model
+are obtained by projecting the columns and filtering the rows of the master sets:
+
+- the test set contains the rows of the master test set selected for the model
+- the training set contains all the other rows selected for the model
+- the imputed training set contains the imputed rows of the master training set that
+  correspond to rows in the model training set, projected to the model variables
+
+The correspondence between the imputed rows and the rows of the master training set is
+read from the provenance files written by the imputation methods (training-rows-completed-ID.csv).
+The imputed training sets are saved in the same format (CSV or binary) as those of the master.
+
+@copyright: The Broad Institute of MIT and Harvard 2015
+"""
+
+import os, argparse
+import numpy as np
+from datacache import load_source, source_text
+from makesets import load_variables, load_ranges, load_ignore, select_rows
+from splits import load_index, save_sets, save_splits, load_frame, frame_exists
+from imputation import load_variables as variable_types, rows_filename, write_rows, load_rows, merge_rows, save_frame
+
+"""Returns the positions in the source data of the rows in an index file
+
+:param filename: name of the index file
+:param valid_pos: positions in the source data of the records not in the ignore list
+"""
+def index_positions(filename, valid_pos):
+    lines = load_index(filename)
+    if lines is None:
+        raise Exception("Index file " + filename + " does not exist")
+    numbers = np.array([int(line.split(",")[0]) for line in lines], dtype=int)
+    return valid_pos[numbers - 1]
+
+"""Creates the training/test sets and the imputed training sets with the given ids in the
+model directory, from the sets of the master model
+
+:param master_dir: directory of the master model
+:param model_dir: directory of the model
+:param ids: ids of the sets
+:param store: csv to save the training/test sets as CSV files, index to save only the
+              indices of their rows
+"""
+def project_sets(master_dir, model_dir, ids, store="csv"):
+    model_variables = load_variables(model_dir)
+    master_variables = load_variables(master_dir)
+    if model_variables[0] != master_variables[0] or not set(model_variables) <= set(master_variables):
+        raise Exception("Variables of " + model_dir + " are not a subset of the variables of " + master_dir)
+
+    data = load_source()
+    ignore_records = load_ignore()
+    rows, _, numbers = select_rows(data, model_variables, load_ranges(), ignore_records)
+    valid_pos = np.nonzero(np.logical_not(np.in1d(data["text"][0], ignore_records)))[0]
+    model_idx = [data["titles"].index(var) for var in model_variables]
+    all_data = np.where(data["missing"][rows][:, model_idx], "?", source_text(data, rows, model_idx))
+    idx_info = np.column_stack((numbers, source_text(data, rows, [0, model_idx[0]])))
+
+    var_types = variable_types(os.path.join(model_dir, "training-data.csv"))[1]
+    test_idx = []
+    for id in ids:
+        master_completed = os.path.join(master_dir, "training-data-completed-" + str(id) + ".csv")
+        ext = ".csv" if os.path.exists(master_completed) else ".npz"
+        if not frame_exists(master_completed) or not os.path.exists(rows_filename(master_completed)):
+            raise Exception("Imputed training set " + str(id) + " of master model not found in " + master_dir)
+
+        test_pos = index_positions(os.path.join(master_dir, "testing-index-" + str(id) + ".csv"), valid_pos)
+        in_test = np.in1d(rows, test_pos)
+        if store == "index":
+            test_idx.append(np.nonzero(in_test)[0])
+        else:
+            save_sets(os.path.join(model_dir, "testing-data-" + str(id) + ".csv"),
+                      os.path.join(model_dir, "training-data-" + str(id) + ".csv"),
+                      model_variables, all_data, idx_info, in_test)
+
+        # Imputed rows of the master training set, with their positions in the source data
+        master_train = index_positions(os.path.join(master_dir, "training-index-" + str(id) + ".csv"), valid_pos)
+        completed = load_frame(master_completed)[model_variables].values
+        prov_rows, prov_frames, weights = load_rows(master_completed)
+        src = master_train[prov_rows]
+        num_frames = max(weights.max(), prov_frames.max() + 1) if len(weights) else 1
+
+        train_rows = rows[~in_test]
+        keep = np.in1d(src, train_rows)
+        out_filename = os.path.join(model_dir, "training-data-completed-" + str(id) + ext)
+        # Rows that differ only in variables not in the model become identical
+        completed, pos, frames, weights = merge_rows(completed[keep], np.searchsorted(train_rows, src[keep]),
+                                                     prov_frames[keep], weights[keep], num_frames)
+        save_frame(out_filename, completed, model_variables, var_types)
+        write_rows(out_filename, pos, frames, weights)
+        print "Wrote", len(completed), "imputed rows from master model to", out_filename
+
+    if store == "index":
+        width = max([len(t) for t in test_idx])
+        padded = np.empty((len(ids), width), dtype=int)
+        padded.fill(-1)
+        for i in range(0, len(ids)):
+            padded[i, 0:len(test_idx[i])] = test_idx[i]
+        save_splits(model_dir, model_variables, rows, numbers, ids, padded, data["file"])
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-B', '--base_dir', nargs=1, default=["./"],
+                        help="Base directory")
+    parser.add_argument('-M', '--master', nargs=1, default=["master"],
+                        help="Name of master model")
+    parser.add_argument('-N', '--name', nargs=1, default=["test"],
+                        help="Model name")
+    parser.add_argument('-i', '--ids', nargs=1, default=["0"],
+                        help="Comma-separated list of ids of the sets")
+    parser.add_argument('-f', '--store', nargs=1, default=["csv"],
+                        help="Storage of training/test sets: csv (CSV files) or index (row indices only)")
+    args = parser.parse_args()
+    models_dir = os.path.join(args.base_dir[0], "models")
+    project_sets(os.path.join(models_dir, args.master[0]), os.path.join(models_dir, args.name[0]),
+                 [int(id) for id in args.ids[0].split(",")], args.store[0])
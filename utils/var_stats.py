@@ -16,8 +16,8 @@ import pandas as pd
 from pandas.tools.pivot import pivot_table
 from scipy.stats import ttest_ind
 from scipy.stats import fisher_exact
+from datacache import load_source, source_rows
 
-src_file = "./data/sources.txt"
 var_file = "./data/variables.txt"
 range_file = "./data/ranges.txt"
 ignore_file = "./data/ignore.txt"
@@ -25,10 +25,7 @@ ignore_file = "./data/ignore.txt"
 def runtests(var_file, out_file):
     pvalue_lines = []
 
-    input_file = ""
-    with open(src_file, "rb") as sfile:
-        for line in sfile.readlines():
-            input_file = os.path.abspath(line.strip())
+    data = load_source()
 
     model_variables = []
     with open(var_file, "rb") as vfile:
@@ -56,50 +53,48 @@ def runtests(var_file, out_file):
     all_data = {}
     for var in model_variables:
         all_data[var] = []
-    with open(input_file, "rb") as ifile:
-        reader = csv.reader(ifile)
-        titles = reader.next()
-        model_idx = [titles.index(var) for var in model_variables]
-        r0 = 0
-        r = 0
-        for row in reader:
-            if row[0] in ignore_records: continue
-
-            r0 += 1 # Starts at 1, because of titles
-            all_missing = True
-            some_missing = False
-            missing_dvar = row[model_idx[0]] == "\\N"
-            for i in range(1, len(model_variables)):
-                var_idx = model_idx[i]
-                if row[var_idx] == "\\N":
-                    some_missing = True
-                else:
-                    all_missing = False
-
-            inside_range = True
-            for var in range_variables:
-                idx = titles.index(var["name"])
-                val = row[idx]
-                if val == "\\N": continue
-                vtype = var["type"]
-                vrang = var["range"]
-                test = True
-                if vtype == "category":
-                    test = val in vrang
-                else:
-                    test = float(vrang[0]) <= float(val) and float(val) < float(vrang[1])
-                inside_range = inside_range and test
-
-            if not all_missing and not missing_dvar and inside_range:
-                for i in range(0, len(model_variables)):
-                    var = model_variables[i]
-                    idx = model_idx[i]
-                    try:
-                        val = float(row[idx])
-                    except ValueError:
-                        val = np.NaN
-                    all_data[var].append(val)
-                r += 1
+    titles = data["titles"]
+    model_idx = [titles.index(var) for var in model_variables]
+    r0 = 0
+    r = 0
+    for row in source_rows(data):
+        if row[0] in ignore_records: continue
+
+        r0 += 1 # Starts at 1, because of titles
+        all_missing = True
+        some_missing = False
+        missing_dvar = row[model_idx[0]] == "\\N"
+        for i in range(1, len(model_variables)):
+            var_idx = model_idx[i]
+            if row[var_idx] == "\\N":
+                some_missing = True
+            else:
+                all_missing = False
+
+        inside_range = True
+        for var in range_variables:
+            idx = titles.index(var["name"])
+            val = row[idx]
+            if val == "\\N": continue
+            vtype = var["type"]
+            vrang = var["range"]
+            test = True
+            if vtype == "category":
+                test = val in vrang
+            else:
+                test = float(vrang[0]) <= float(val) and float(val) < float(vrang[1])
+            inside_range = inside_range and test
+
+        if not all_missing and not missing_dvar and inside_range:
+            for i in range(0, len(model_variables)):
+                var = model_variables[i]
+                idx = model_idx[i]
+                try:
+                    val = float(row[idx])
+                except ValueError:
+                    val = np.NaN
+                all_data[var].append(val)
+            r += 1
 
     data = pd.DataFrame(all_data)
 